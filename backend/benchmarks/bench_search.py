@@ -0,0 +1,283 @@
+"""
+Микробенчмарки стадий поиска.
+
+Загружает корпус (DATA_DIR или --data-dir) как сервер - через load_snapshot,
+и замеряет каждую стадию отдельно:
+- semantic_search, keyword_search, rerank_with_field_embeddings;
+- apply_filters с каждым типом фильтра и со всеми сразу;
+- run_search_pipeline целиком (без вызова Gemini);
+- compute_filter_options и построители иерархий отраслей/регионов/статей;
+- сериализацию ответов поиска и фильтров.
+
+Результат - JSON (метаданные окружения и корпуса + статистика по стадиям),
+пригодный для сравнения версий: --compare baseline.json печатает отношения медиан.
+
+Запуск (из backend/):
+    python benchmarks/generate_corpus.py --cases 7000 --out /tmp/corpus_7k
+    python benchmarks/bench_search.py --data-dir /tmp/corpus_7k --output bench_7k.json
+    python benchmarks/bench_search.py --data-dir /tmp/corpus_7k --compare bench_7k.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+from index_snapshot import IndexSnapshot, load_snapshot, validate_snapshot  # noqa: E402
+from search_cache import normalize_query  # noqa: E402
+
+RESULTS_FORMAT_VERSION = 1
+
+
+def time_stage(fn: Callable[[int], object], repeat: int, max_seconds: float, warmup: int = 1) -> dict:
+    """
+    Замерить fn(i) repeat раз (i - номер итерации, чтобы менять входные данные).
+    Останавливается раньше, если стадия исчерпала бюджет max_seconds
+    (но не меньше 3 замеров).
+    """
+    for i in range(warmup):
+        fn(i)
+    samples = []
+    budget_start = time.perf_counter()
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - t0)
+        if len(samples) >= 3 and time.perf_counter() - budget_start > max_seconds:
+            break
+    ms = np.array(samples) * 1000
+    return {
+        "runs": len(samples),
+        "mean_ms": round(float(ms.mean()), 4),
+        "median_ms": round(float(np.median(ms)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "min_ms": round(float(ms.min()), 4),
+        "max_ms": round(float(ms.max()), 4),
+        "ops_per_sec": round(float(1000 / ms.mean()), 2) if ms.mean() > 0 else None,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+class SearchBenchmark:
+    """Входные данные для стадий, построенные по корпусу снимка."""
+
+    def __init__(self, snap: IndexSnapshot, n_queries: int, filter_candidates: int, seed: int):
+        self.snap = snap
+        rng = random.Random(seed)
+        cases = snap.cases
+        sample = [cases[rng.randrange(len(cases))] for _ in range(n_queries)]
+
+        # Запросы - начала violation_summary случайных кейсов; векторы запросов -
+        # эмбеддинги этих кейсов с шумом (Gemini не вызывается)
+        self.queries = [normalize_query(' '.join((c.get('violation_summary') or 'реклама').split()[:6])) for c in sample]
+        np_rng = np.random.default_rng(seed)
+        dim = snap.embeddings_fas_args.shape[1]
+        self.query_embeddings = []
+        for case in sample:
+            base = np.asarray(snap.embeddings_fas_args[case['index']], dtype=float)
+            self.query_embeddings.append(base + np_rng.standard_normal(dim) * 0.5 / np.sqrt(dim))
+
+        # Кандидаты для apply_filters - как после объединения поиска, но больше
+        indices = rng.sample(range(len(cases)), min(filter_candidates, len(cases)))
+        self.filter_candidates = [(idx, 1.0) for idx in indices]
+
+        # Значения фильтров каждого типа - из случайных кейсов
+        self.filters = {'year': [], 'region': [], 'industry': [], 'article': []}
+        for case in sample:
+            if case.get('document_date') and case['document_date'][:4].isdigit():
+                self.filters['year'].append([int(case['document_date'][:4])])
+            if case.get('FAS_division'):
+                self.filters['region'].append([case['FAS_division']])
+            if case.get('defendant_industry'):
+                self.filters['industry'].append([case['defendant_industry']])
+            articles = re.findall(r'(?:ч\.\s*\d+\s*)?ст\.\s*\d+', case.get('legal_provisions') or '')
+            if articles:
+                self.filters['article'].append([articles[0]])
+
+        # Входы построителей иерархий - как в compute_filter_options
+        self.regions = set()
+        self.industries = set()
+        self.industry_counts: Dict[str, int] = {}
+        self.articles = set()
+        for case in cases:
+            if case.get('FAS_division'):
+                self.regions.add(case['FAS_division'])
+            if case.get('defendant_industry'):
+                self.industries.add(case['defendant_industry'])
+                self.industry_counts[case['defendant_industry']] = self.industry_counts.get(case['defendant_industry'], 0) + 1
+            if case.get('legal_provisions'):
+                for art in re.findall(r'ст\.\s*\d+|ч\.\s*\d+\s*ст\.\s*\d+', case['legal_provisions'], re.IGNORECASE):
+                    self.articles.add(art.strip())
+
+        self.semantic_candidates = [
+            main.semantic_search(qe, main.SEARCH_TOP_CANDIDATES, snap) for qe in self.query_embeddings
+        ]
+
+    def _query(self, i: int):
+        k = i % len(self.queries)
+        return self.queries[k], self.query_embeddings[k]
+
+    def _filter(self, kind: str, i: int) -> dict:
+        values = self.filters[kind]
+        return {kind: values[i % len(values)]} if values else {}
+
+    def _all_filters(self, i: int) -> dict:
+        filters = {}
+        for kind in self.filters:
+            filters.update(self._filter(kind, i))
+        return filters
+
+    def _hits(self, i: int) -> List[tuple]:
+        query, qe = self._query(i)
+        reranked = main.run_search_pipeline(query, qe, {}, self.snap)
+        return [(r['index'], round(r['score'], 4), r.get('field_scores', {})) for r in reranked[:main.DEFAULT_TOP_K]]
+
+    def stages(self) -> Dict[str, Callable[[int], object]]:
+        snap = self.snap
+        stages = {
+            "semantic_search": lambda i: main.semantic_search(self._query(i)[1], main.SEARCH_TOP_CANDIDATES, snap),
+            "keyword_search": lambda i: main.keyword_search(self._query(i)[0], snap, top_k=main.KEYWORD_TOP_K),
+        }
+        for kind in self.filters:
+            stages[f"apply_filters[{kind}]"] = (
+                lambda i, kind=kind: main.apply_filters(self.filter_candidates, self._filter(kind, i), snap)
+            )
+        stages["apply_filters[all]"] = lambda i: main.apply_filters(self.filter_candidates, self._all_filters(i), snap)
+        stages["rerank_with_field_embeddings"] = lambda i: main.rerank_with_field_embeddings(
+            self.semantic_candidates[i % len(self.semantic_candidates)], self._query(i)[1], snap
+        )
+        stages["run_search_pipeline"] = lambda i: main.run_search_pipeline(*self._query(i), {}, snap)
+        stages["run_search_pipeline[filters]"] = lambda i: main.run_search_pipeline(*self._query(i), self._all_filters(i), snap)
+        stages["compute_filter_options"] = lambda i: main.compute_filter_options(snap.cases)
+        stages["build_industry_hierarchy"] = lambda i: main.build_industry_hierarchy(self.industries)
+        stages["build_industry_hierarchy_from_mapping"] = lambda i: main.build_industry_hierarchy_from_mapping(self.industry_counts)
+        stages["build_region_hierarchy"] = lambda i: main.build_region_hierarchy(self.regions)
+        stages["build_article_hierarchy"] = lambda i: main.build_article_hierarchy(self.articles)
+
+        precomputed_hits = [self._hits(i) for i in range(min(5, len(self.queries)))]
+        stages["serialize_search_response"] = lambda i: main.SearchResponse(
+            query=self._query(i)[0],
+            total_cases=snap.total_cases,
+            results=main.build_case_results(precomputed_hits[i % len(precomputed_hits)], snap),
+        ).model_dump_json()
+        filter_options = main.compute_filter_options(snap.cases)
+        stages["serialize_filter_options"] = lambda i: filter_options.model_dump_json()
+        return stages
+
+
+def print_table(results: dict, baseline: Optional[dict] = None):
+    header = f"{'стадия':<40} {'медиана, мс':>12} {'p95, мс':>10} {'замеров':>8}"
+    if baseline:
+        header += f" {'было, мс':>10} {'x':>7}"
+    print(header)
+    for name, stats in results.items():
+        line = f"{name:<40} {stats['median_ms']:>12.3f} {stats['p95_ms']:>10.3f} {stats['runs']:>8}"
+        old = (baseline or {}).get(name)
+        if old:
+            ratio = stats['median_ms'] / old['median_ms'] if old['median_ms'] else float('nan')
+            line += f" {old['median_ms']:>10.3f} {ratio:>7.2f}"
+        print(line)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Микробенчмарки стадий поиска")
+    parser.add_argument("--data-dir", type=Path, default=None, help="корпус (по умолчанию DATA_DIR)")
+    parser.add_argument("--mmap", choices=["true", "false"], default=None, help="как INDEX_MMAP")
+    parser.add_argument("--repeat", type=int, default=30, help="замеров на стадию")
+    parser.add_argument("--max-seconds", type=float, default=10.0, help="бюджет времени на стадию")
+    parser.add_argument("--queries", type=int, default=20, help="число разных запросов")
+    parser.add_argument("--filter-candidates", type=int, default=1000, help="кандидатов для apply_filters")
+    parser.add_argument("--stages", default=None, help="подстроки имён стадий через запятую")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None, help="записать результаты в JSON")
+    parser.add_argument("--compare", type=Path, default=None, help="JSON предыдущего прогона для сравнения")
+    return parser.parse_args()
+
+
+def main_cli():
+    args = parse_args()
+    data_dir = args.data_dir or main.DATA_DIR
+    mmap = main.Config.INDEX_MMAP if args.mmap is None else args.mmap == "true"
+
+    t0 = time.perf_counter()
+    snap = load_snapshot(data_dir, mmap=mmap)
+    problem = validate_snapshot(snap)
+    if problem:
+        sys.exit(f"Корпус в {data_dir} непригоден: {problem}")
+    load_seconds = time.perf_counter() - t0
+
+    bench = SearchBenchmark(snap, args.queries, args.filter_candidates, args.seed)
+    selected = [s.strip() for s in args.stages.split(",")] if args.stages else None
+
+    results = {}
+    for name, fn in bench.stages().items():
+        if selected and not any(s in name for s in selected):
+            continue
+        results[name] = time_stage(fn, args.repeat, args.max_seconds)
+        print(f"  {name}: {results[name]['median_ms']:.3f} мс")
+
+    emb = snap.embeddings_fas_args
+    report = {
+        "format_version": RESULTS_FORMAT_VERSION,
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "corpus": {
+            "data_dir": str(data_dir),
+            "data_version": snap.version,
+            "cases": snap.total_cases,
+            "dimension": int(emb.shape[1]),
+            "dtype": str(emb.dtype),
+            "mmap": mmap,
+            "load_seconds": round(load_seconds, 3),
+        },
+        "params": {
+            "repeat": args.repeat,
+            "max_seconds": args.max_seconds,
+            "queries": args.queries,
+            "filter_candidates": args.filter_candidates,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("results")
+    print()
+    print_table(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты: {args.output}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,230 @@
+"""
+Генератор синтетического корпуса решений ФАС для бенчмарков.
+
+Пишет в выходную директорию те же файлы, что prepare_data.py:
+cases.json, embeddings_<поле>.npy и valid_<поле>.npy. Корпус масштабируется
+от размера реальной выгрузки (~7 тыс.) до 1 млн кейсов; память генератора
+ограничена размером одной части (--chunk-size).
+
+Реалистичность:
+- длины полей близки к реальным (FAS_arguments с "Ключевой тезис:",
+  violation_summary, ad_description, ad_content_cited);
+- кардинальности фильтров: все УФАС из main.UFAS_TO_REGION, все значения
+  отраслей из INDUSTRY_HIERARCHY, ~40 формулировок статей, годы 2012-2025;
+  частоты распределены по Zipf, как в реальных данных;
+- у каждого кейса есть тема: слова текстов и эмбеддинги (центр темы + шум)
+  согласованы, поэтому семантический и keyword поиск находят похожие кейсы.
+
+Запуск (из backend/):
+    python benchmarks/generate_corpus.py --cases 7000 --out /tmp/corpus_7k
+    python benchmarks/generate_corpus.py --cases 1000000 --dim 256 --dtype float32 --out /tmp/corpus_1m
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import Config  # noqa: E402
+from industry_mapping import get_all_industry_values  # noqa: E402
+from main import UFAS_TO_REGION  # noqa: E402
+from index_snapshot import (  # noqa: E402
+    CASES_FILE, EMBEDDINGS_FAS_ARGS_FILE, EMBEDDINGS_VIOLATION_FILE, EMBEDDINGS_AD_DESC_FILE,
+    VALID_FAS_ARGS_FILE, VALID_VIOLATION_FILE, VALID_AD_DESC_FILE,
+)
+
+# Поле -> (файл эмбеддингов, файл маски)
+FIELD_FILES = {
+    'FAS_arguments': (EMBEDDINGS_FAS_ARGS_FILE, VALID_FAS_ARGS_FILE),
+    'violation_summary': (EMBEDDINGS_VIOLATION_FILE, VALID_VIOLATION_FILE),
+    'ad_description': (EMBEDDINGS_AD_DESC_FILE, VALID_AD_DESC_FILE),
+}
+
+ARTICLES = [
+    "ч. 1 ст. 5", "ч. 2 ст. 5", "п. 1 ч. 2 ст. 5", "п. 4 ч. 2 ст. 5", "ч. 3 ст. 5", "п. 1 ч. 3 ст. 5",
+    "п. 2 ч. 3 ст. 5", "п. 4 ч. 3 ст. 5", "п. 20 ч. 3 ст. 5", "ч. 7 ст. 5", "ст. 5", "ст. 7",
+    "п. 8 ст. 7", "ч. 1 ст. 8", "ст. 8", "ст. 9", "ч. 1 ст. 14.3", "ч. 1 ст. 18", "ч. 2 ст. 18",
+    "ст. 18", "ч. 1 ст. 19", "ч. 2 ст. 20", "ч. 1 ст. 21", "ч. 3 ст. 21", "ст. 21", "ч. 1 ст. 24",
+    "ч. 7 ст. 24", "ст. 24", "ч. 1 ст. 25", "ч. 1 ст. 27", "ч. 1 ст. 28", "ч. 2 ст. 28",
+    "ч. 3 ст. 28", "ч. 13 ст. 28", "ст. 28", "ч. 1 ст. 29", "ст. 30", "ч. 1 ст. 30.1",
+    "ч. 1 ст. 8.1", "ст. 9.1",
+]
+
+TAGS = [
+    "алкоголь", "табак", "финансы", "кредит", "медицина", "БАД", "недостоверность", "сравнение",
+    "азартные игры", "дети", "наружная реклама", "телефонный спам", "SMS-рассылка", "интернет",
+    "телевидение", "радио", "недвижимость", "образование", "оружие", "страхование", "криптовалюта",
+    "инвестиции", "скидки", "гарантии", "превосходство", "лекарства", "косметология", "автомобили",
+    "строительство", "туризм",
+]
+
+VIOLATION_TYPES = [
+    "Недостоверная реклама", "Ненадлежащая реклама", "Реклама без согласия абонента",
+    "Реклама алкогольной продукции", "Реклама финансовых услуг", "Реклама медицинских услуг",
+    "Некорректное сравнение", "Реклама азартных игр",
+]
+
+PLATFORMS = ["Наружная реклама", "Интернет", "Телевидение", "Радио", "SMS", "Телефонный звонок",
+             "Печатные СМИ", "Социальные сети", "Транспорт"]
+
+# Общая лексика рекламных решений; темы берут из неё свои подмножества
+BASE_VOCABULARY = (
+    "реклама рекламодатель рекламораспространитель потребитель товар услуга информация сведения "
+    "недостоверные ненадлежащая нарушение требования закона банк кредит заём процентная ставка "
+    "условия стоимость алкоголь пиво вино табак медицинские услуги лекарственный препарат "
+    "биологически активная добавка гарантия лучший первый единственный скидка акция распродажа "
+    "бесплатно подарок выигрыш лотерея букмекер ставки казино ребёнок несовершеннолетние школа "
+    "образование недвижимость квартира застройщик ипотека страхование инвестиции доходность "
+    "криптовалюта автомобиль салон ремонт строительство туризм путёвка отель телефон звонок "
+    "сообщение согласие абонента рассылка баннер вывеска щит конструкция сайт страница социальная "
+    "сеть видео ролик телеканал радиостанция газета журнал транспорт метро остановка сравнение "
+    "конкурент превосходство преимущество рейтинг исследование экспертиза сертификат лицензия "
+    "врач клиника косметология стоматология оптика аптека доставка магазин ресторан кафе фитнес"
+).split()
+
+LEGAL_TAIL = (
+    "Юридическое обоснование: в соответствии с Федеральным законом от 13.03.2006 N 38-ФЗ "
+    "\"О рекламе\" реклама должна быть добросовестной и достоверной. Комиссия решила признать "
+    "рекламу ненадлежащей и выдать предписание о прекращении нарушения законодательства о рекламе."
+)
+
+
+def zipf_weights(n: int, exponent: float = 1.1) -> np.ndarray:
+    """Частоты значений по закону Zipf - несколько частых и длинный хвост."""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+class CorpusGenerator:
+    """Генерация кейсов и эмбеддингов частями с общими темами."""
+
+    def __init__(self, dim: int, topics: int, seed: int):
+        self.rng = np.random.default_rng(seed)
+        self.dim = dim
+        self.vocabulary = np.array(BASE_VOCABULARY)
+        self.industries = sorted(get_all_industry_values())
+        self.industry_p = zipf_weights(len(self.industries))
+        # УФАС - те же названия, что понимает build_region_hierarchy
+        self.divisions = sorted(UFAS_TO_REGION)
+        self.division_p = zipf_weights(len(self.divisions), 0.8)
+        self.article_p = zipf_weights(len(ARTICLES), 0.9)
+        self.topic_p = zipf_weights(topics, 0.7)
+        # У каждой темы - свои 25 слов и центр в пространстве эмбеддингов
+        self.topic_words = [self.rng.choice(len(self.vocabulary), 25, replace=False) for _ in range(topics)]
+        self.topic_centers = self.rng.standard_normal((topics, dim))
+        self.topic_centers /= np.linalg.norm(self.topic_centers, axis=1, keepdims=True)
+
+    def _text(self, topic: int, min_words: int, max_words: int) -> str:
+        count = int(self.rng.integers(min_words, max_words + 1))
+        # 70% слов - лексика темы, остальное - общая лексика
+        own = self.rng.random(count) < 0.7
+        words = np.where(
+            own,
+            self.topic_words[topic][self.rng.integers(0, 25, count)],
+            self.rng.integers(0, len(self.vocabulary), count),
+        )
+        return " ".join(self.vocabulary[words])
+
+    def _list_literal(self, values) -> str:
+        """Формат списков в CSV ФАС: "['ч. 7 ст. 5', 'ст. 28']"."""
+        return "[" + ", ".join(f"'{v}'" for v in values) + "]"
+
+    def cases(self, start: int, count: int) -> tuple[list, np.ndarray]:
+        """Кейсы [start, start+count) и номера их тем."""
+        topics = self.rng.choice(len(self.topic_p), count, p=self.topic_p)
+        divisions = self.rng.choice(len(self.divisions), count, p=self.division_p)
+        industries = self.rng.choice(len(self.industries), count, p=self.industry_p)
+        years = self.rng.integers(2012, 2026, count)
+        cases = []
+        for i in range(count):
+            topic = int(topics[i])
+            articles = self.rng.choice(len(ARTICLES), int(self.rng.integers(1, 4)), replace=False, p=self.article_p)
+            tags = self.rng.choice(len(TAGS), int(self.rng.integers(1, 4)), replace=False)
+            cases.append({
+                "index": start + i,
+                "docId": f"syn-{start + i}",
+                "Violation_Type": VIOLATION_TYPES[int(self.rng.integers(len(VIOLATION_TYPES)))],
+                "document_date": f"{years[i]}-{int(self.rng.integers(1, 13)):02d}-{int(self.rng.integers(1, 29)):02d}",
+                "FASbd_link": f"https://br.fas.gov.ru/cases/{start + i}/",
+                "FAS_division": self.divisions[divisions[i]],
+                "violation_found": "да" if self.rng.random() < 0.85 else "нет",
+                "defendant_name": f"ООО \"{self._text(topic, 1, 2).title()}\"",
+                "defendant_industry": self.industries[industries[i]] if self.rng.random() < 0.97 else None,
+                "ad_description": self._text(topic, 12, 60) if self.rng.random() < 0.95 else None,
+                "ad_content_cited": self._text(topic, 8, 70) if self.rng.random() < 0.9 else None,
+                "ad_platform": PLATFORMS[int(self.rng.integers(len(PLATFORMS)))],
+                "violation_summary": self._text(topic, 25, 90),
+                "FAS_arguments": f"Ключевой тезис: {self._text(topic, 20, 60)}. {LEGAL_TAIL} {self._text(topic, 40, 250)}",
+                "legal_provisions": self._list_literal(ARTICLES[a] for a in articles),
+                "thematic_tags": self._list_literal(TAGS[t] for t in tags),
+            })
+        return cases, topics
+
+    def embeddings(self, topics: np.ndarray, noise: float) -> np.ndarray:
+        """Эмбеддинги: центр темы + гауссов шум, нормализованные."""
+        vectors = self.topic_centers[topics] + noise * self.rng.standard_normal((len(topics), self.dim)) / np.sqrt(self.dim)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def generate(out_dir: Path, n_cases: int, dim: int, dtype: str, topics: int, chunk_size: int, seed: int):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    generator = CorpusGenerator(dim, topics, seed)
+    started = time.time()
+
+    matrices = {}
+    masks = {}
+    for field_name, (emb_file, valid_file) in FIELD_FILES.items():
+        matrices[field_name] = np.lib.format.open_memmap(out_dir / emb_file, mode="w+", dtype=dtype, shape=(n_cases, dim))
+        masks[field_name] = np.lib.format.open_memmap(out_dir / valid_file, mode="w+", dtype=bool, shape=(n_cases,))
+
+    with open(out_dir / CASES_FILE, "w", encoding="utf-8") as f:
+        f.write("[")
+        for start in range(0, n_cases, chunk_size):
+            count = min(chunk_size, n_cases - start)
+            cases, topics = generator.cases(start, count)
+            for i, case in enumerate(cases):
+                f.write(",\n" if start + i else "\n")
+                f.write(json.dumps(case, ensure_ascii=False))
+
+            for field_name, noise in (('FAS_arguments', 1.0), ('violation_summary', 1.2), ('ad_description', 1.5)):
+                vectors = generator.embeddings(topics, noise)
+                valid = np.array([bool(case[field_name]) for case in cases])
+                # Пустой текст - нулевой вектор, как в prepare_data.py
+                vectors[~valid] = 0
+                matrices[field_name][start:start + count] = vectors
+                masks[field_name][start:start + count] = valid
+
+            print(f"  {start + count}/{n_cases} кейсов ({time.time() - started:.1f} с)")
+        f.write("\n]")
+
+    for field_name in FIELD_FILES:
+        matrices[field_name].flush()
+        masks[field_name].flush()
+    print(f"Корпус готов: {out_dir} ({n_cases} кейсов, dim={dim}, {dtype}) за {time.time() - started:.1f} с")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Синтетический корпус решений ФАС для бенчмарков")
+    parser.add_argument("--cases", type=int, default=7000, help="число кейсов (7000 - размер реальной выгрузки)")
+    parser.add_argument("--out", type=Path, required=True, help="выходная директория (как DATA_DIR)")
+    parser.add_argument("--dim", type=int, default=Config.EMBEDDING_DIMENSION, help="размерность эмбеддингов")
+    parser.add_argument("--dtype", choices=["float64", "float32"], default="float64",
+                        help="float64 - как у prepare_data.py; float32 - для больших корпусов")
+    parser.add_argument("--topics", type=int, default=200, help="число тем")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="кейсов в одной части")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    generate(args.out, args.cases, args.dim, args.dtype, args.topics, args.chunk_size, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Воспроизведение нагрузки на /api/search.
+
+Источник запросов - журнал запросов сервера (QUERY_LOG=true, см. query_log.py)
+или синтетическая смесь, построенная по cases.json корпуса. Запросы
+отправляются с заданной параллельностью и частотой; по ответам
+считается пропускная способность, латентность клиента и латентность
+каждой стадии сервера (из заголовка Server-Timing) - p50/p95/p99.
+
+Запуск (из backend/):
+    python benchmarks/replay.py --url http://127.0.0.1:8000 --log data/query_log.jsonl \
+        --concurrency 8 --rate 20 --requests 2000 --output replay.json
+    python benchmarks/replay.py --url http://127.0.0.1:8000 --synthetic --data-dir /tmp/corpus_7k \
+        --concurrency 16 --rate 0 --duration 60
+--rate 0 - без ограничения частоты (замкнутый цикл: максимум пропускной способности).
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from query_log import read_query_log  # noqa: E402
+from stage_timer import parse_server_timing  # noqa: E402
+
+FILTER_KINDS = ("year", "region", "industry", "article")
+
+
+def log_entries(path: Path) -> List[dict]:
+    """Запросы из журнала в виде тел запросов /api/search."""
+    entries = []
+    for record in read_query_log(path):
+        body = {"query": record["q"], "top_k": record.get("k", 20)}
+        body.update(record.get("f") or {})
+        if record.get("collapse"):
+            body["collapse_duplicates"] = True
+        entries.append(body)
+    return entries
+
+
+def synthetic_entries(data_dir: Optional[Path], count: int, filter_prob: float,
+                      repeat_prob: float, seed: int) -> List[dict]:
+    """
+    Синтетическая смесь: запросы из начала violation_summary кейсов,
+    фильтры с вероятностью filter_prob, повторы прежних запросов
+    с вероятностью repeat_prob (как популярные запросы в реальном трафике).
+    """
+    rng = random.Random(seed)
+    phrases = ["недостоверная реклама кредита", "реклама алкоголя в интернете", "реклама без согласия абонента",
+               "сравнение с конкурентами лучший", "реклама медицинских услуг", "реклама азартных игр"]
+    values = {kind: [] for kind in FILTER_KINDS}
+    if data_dir is not None:
+        with open(data_dir / "cases.json", "r", encoding="utf-8") as f:
+            cases = json.load(f)
+        for case in rng.sample(cases, min(len(cases), 2000)):
+            words = (case.get("violation_summary") or "").split()
+            if words:
+                phrases.append(" ".join(words[:rng.randint(3, 8)]))
+            if case.get("document_date") and case["document_date"][:4].isdigit():
+                values["year"].append(int(case["document_date"][:4]))
+            if case.get("FAS_division"):
+                values["region"].append(case["FAS_division"])
+            if case.get("defendant_industry"):
+                values["industry"].append(case["defendant_industry"])
+        values["article"] = ["ст. 5", "ч. 7 ст. 5", "ст. 18", "ст. 28", "ч. 1 ст. 21", "ст. 24"]
+
+    entries = []
+    for _ in range(count):
+        if entries and rng.random() < repeat_prob:
+            entries.append(dict(rng.choice(entries)))
+            continue
+        body = {"query": rng.choice(phrases), "top_k": 20}
+        for kind in FILTER_KINDS:
+            if values[kind] and rng.random() < filter_prob:
+                body[kind] = [rng.choice(values[kind])]
+        entries.append(body)
+    return entries
+
+
+def percentiles(samples: List[float]) -> dict:
+    if not samples:
+        return {"count": 0}
+    arr = np.array(samples)
+    return {
+        "count": len(samples),
+        "mean_ms": round(float(arr.mean()), 3),
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p95_ms": round(float(np.percentile(arr, 95)), 3),
+        "p99_ms": round(float(np.percentile(arr, 99)), 3),
+        "max_ms": round(float(arr.max()), 3),
+    }
+
+
+class ReplayStats:
+    def __init__(self):
+        self.status = Counter()
+        self.client_ms: List[float] = []
+        self.stage_ms = defaultdict(list)
+        self.labels = defaultdict(Counter)
+        self.max_lag = 0.0
+
+    def add(self, status: int, elapsed_ms: float, server_timing: Optional[str]):
+        self.status[status] += 1
+        if status != 200:
+            return
+        self.client_ms.append(elapsed_ms)
+        if server_timing:
+            for name, value in parse_server_timing(server_timing).items():
+                if isinstance(value, float):
+                    self.stage_ms[name].append(value)
+                else:
+                    self.labels[name][value] += 1
+
+
+async def replay(url: str, entries: Iterator[dict], concurrency: int, rate: float,
+                 duration: Optional[float], timeout: float) -> tuple:
+    stats = ReplayStats()
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def one(client: httpx.AsyncClient, body: dict):
+        try:
+            t0 = time.perf_counter()
+            try:
+                response = await client.post("/api/search", json=body)
+                stats.add(response.status_code, (time.perf_counter() - t0) * 1000,
+                          response.headers.get("server-timing"))
+            except httpx.HTTPError as e:
+                stats.add(type(e).__name__, 0.0, None)
+        finally:
+            semaphore.release()
+
+    loop = asyncio.get_running_loop()
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        tasks = []
+        started = loop.time()
+        for i, body in enumerate(entries):
+            now = loop.time()
+            if duration is not None and now - started >= duration:
+                break
+            if rate > 0:
+                # Открытая модель нагрузки: i-й запрос по расписанию started + i / rate
+                scheduled = started + i / rate
+                if scheduled > now:
+                    await asyncio.sleep(scheduled - now)
+                else:
+                    stats.max_lag = max(stats.max_lag, now - scheduled)
+            await semaphore.acquire()
+            tasks.append(asyncio.create_task(one(client, body)))
+        await asyncio.gather(*tasks)
+        elapsed = loop.time() - started
+    return stats, elapsed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Воспроизведение нагрузки на /api/search")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--log", type=Path, help="журнал запросов (QUERY_LOG)")
+    source.add_argument("--synthetic", action="store_true", help="синтетическая смесь запросов")
+    parser.add_argument("--data-dir", type=Path, default=None, help="корпус для синтетической смеси")
+    parser.add_argument("--filter-prob", type=float, default=0.3, help="вероятность каждого фильтра (синтетика)")
+    parser.add_argument("--repeat-prob", type=float, default=0.2, help="доля повторных запросов (синтетика)")
+    parser.add_argument("--concurrency", type=int, default=8, help="одновременных запросов")
+    parser.add_argument("--rate", type=float, default=10.0, help="запросов в секунду (0 - без ограничения)")
+    parser.add_argument("--requests", type=int, default=None, help="всего запросов (журнал повторяется по кругу)")
+    parser.add_argument("--duration", type=float, default=None, help="ограничение по времени, секунд")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None, help="записать отчёт в JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.log:
+        base = log_entries(args.log)
+    else:
+        base = synthetic_entries(args.data_dir, args.requests or 1000, args.filter_prob, args.repeat_prob, args.seed)
+    if not base:
+        sys.exit("Нет запросов для воспроизведения")
+
+    total = args.requests or (None if args.duration else len(base))
+    entries = itertools.islice(itertools.cycle(base), total) if total else itertools.cycle(base)
+    print(f"Воспроизведение: {args.url}, запросов в источнике: {len(base)}, "
+          f"параллельность {args.concurrency}, частота {args.rate or 'без ограничения'}")
+
+    stats, elapsed = asyncio.run(replay(args.url, entries, args.concurrency, args.rate, args.duration, args.timeout))
+
+    done = sum(stats.status.values())
+    report = {
+        "url": args.url,
+        "source": str(args.log) if args.log else "synthetic",
+        "concurrency": args.concurrency,
+        "target_rate": args.rate,
+        "requests": done,
+        "status": {str(k): v for k, v in stats.status.items()},
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(done / elapsed, 2) if elapsed > 0 else None,
+        "max_schedule_lag_seconds": round(stats.max_lag, 3),
+        "latency": {"client": percentiles(stats.client_ms)},
+        "labels": {name: dict(counter) for name, counter in stats.labels.items()},
+    }
+    for name, samples in stats.stage_ms.items():
+        report["latency"][name] = percentiles(samples)
+
+    print(f"\nЗапросов: {done} за {elapsed:.1f} с, {report['throughput_rps']} запр/с, статусы: {report['status']}")
+    if stats.max_lag > 1:
+        print(f"Внимание: отставание от расписания до {stats.max_lag:.1f} с - сервер не держит частоту {args.rate}")
+    print(f"{'стадия':<14} {'кол-во':>7} {'p50, мс':>10} {'p95, мс':>10} {'p99, мс':>10}")
+    for name, values in report["latency"].items():
+        if values.get("count"):
+            print(f"{name:<14} {values['count']:>7} {values['p50_ms']:>10.2f} {values['p95_ms']:>10.2f} {values['p99_ms']:>10.2f}")
+    for name, counter in report["labels"].items():
+        print(f"{name}: {counter}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nОтчёт: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
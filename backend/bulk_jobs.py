@@ -0,0 +1,428 @@
+"""
+Фоновая проверка больших наборов текстов рекламы (задания /api/jobs).
+
+Загруженный CSV сохраняется в SQLite (DATA_DIR/bulk_jobs.sqlite3): задание
+и по строке на каждый текст. Фоновый поток BulkJobWorker берёт задание,
+обрабатывает тексты батчами (один запрос эмбеддингов к Gemini и один
+пакетный проход поиска на батч, см. main.run_batch_search_pipeline) и
+сохраняет результат каждой строки. Поэтому задания переживают перезапуск:
+после него обработка продолжается с первой необработанной строки.
+
+Задание захватывается воркером с арендой (lease): при serve.py одно задание
+обрабатывает один процесс, а задание упавшего процесса подхватывается
+другим после истечения аренды.
+
+Чтобы не мешать интерактивному поиску, воркер:
+- ждёт, пока в процессе выполняются запросы /api/search и /api/filters;
+- занимает не больше BULK_CPU_SHARE времени (пауза после каждого батча);
+- работает с пониженным приоритетом потока (Linux);
+- расходует квоту Gemini через свой лимит BULK_EMBEDDING_RPM.
+"""
+
+import csv
+import io
+import json
+import os
+import secrets
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+from embedding_pipeline import RetryPolicy, retry_after_seconds
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+RESULT_FORMATS = ("csv", "jsonl")
+
+# Колонки с текстом, которые ищутся, если колонка не указана явно
+TEXT_COLUMNS = ("text", "ad_text", "ad_content", "текст")
+
+# Поля кейса в результатах задания
+RESULT_CASE_FIELDS = ("docId", "Violation_Type", "document_date", "FAS_division", "FASbd_link")
+
+# Аренда задания воркером, секунд
+LEASE_SECONDS = 60.0
+
+
+def read_csv_texts(data: bytes, column: Optional[str] = None, max_rows: int = 0) -> List[str]:
+    """
+    Тексты из CSV с заголовком. Кодировка UTF-8 (с BOM или без) либо cp1251,
+    разделитель - запятая, точка с запятой или табуляция.
+    Колонка: column, иначе одна из TEXT_COLUMNS, иначе единственная колонка файла.
+    """
+    try:
+        content = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        content = data.decode("cp1251")
+    if not content.strip():
+        raise ValueError("Пустой файл")
+    try:
+        dialect = csv.Sniffer().sniff(content[:8192], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(io.StringIO(content), dialect=dialect)
+    header = reader.fieldnames or []
+
+    if column is not None:
+        if column not in header:
+            raise ValueError(f"Нет колонки '{column}'. Колонки файла: {', '.join(header)}")
+        text_column = column
+    else:
+        by_lower = {name.strip().lower(): name for name in header}
+        text_column = next((by_lower[name] for name in TEXT_COLUMNS if name in by_lower), None)
+        if text_column is None:
+            if len(header) != 1:
+                raise ValueError(f"Укажите колонку с текстом (column). Колонки файла: {', '.join(header)}")
+            text_column = header[0]
+
+    texts = []
+    for row in reader:
+        texts.append((row.get(text_column) or "").strip())
+        if max_rows and len(texts) > max_rows:
+            raise ValueError(f"Больше {max_rows} строк в файле")
+    if not texts:
+        raise ValueError("В файле нет строк")
+    return texts
+
+
+class BulkJobStore:
+    """Задания и результаты по строкам в SQLite (общий файл для всех воркеров)."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._conn_local = threading.local()
+        # Соединения SQLite нельзя использовать после fork (serve.py)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_connections)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " filename TEXT,"
+            " params TEXT NOT NULL,"
+            " total INTEGER NOT NULL,"
+            " done INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT,"
+            " owner TEXT,"
+            " lease_until REAL,"
+            " data_version TEXT,"
+            " created_at REAL NOT NULL,"
+            " started_at REAL,"
+            " finished_at REAL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_items ("
+            " job_id TEXT NOT NULL,"
+            " row INTEGER NOT NULL,"
+            " text TEXT NOT NULL,"
+            " result TEXT,"
+            " PRIMARY KEY (job_id, row)) WITHOUT ROWID"
+        )
+
+    def _reset_connections(self):
+        self._conn_local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Соединение с SQLite - своё для каждого потока."""
+        conn = getattr(self._conn_local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._conn_local.conn = conn
+        return conn
+
+    @staticmethod
+    def _job_dict(row: sqlite3.Row) -> dict:
+        job = {key: row[key] for key in ("id", "status", "filename", "total", "done", "error",
+                                          "data_version", "created_at", "started_at", "finished_at")}
+        job["params"] = json.loads(row["params"])
+        job["progress"] = round(row["done"] / row["total"], 4) if row["total"] else 1.0
+        return job
+
+    def create(self, filename: Optional[str], texts: Sequence[str], params: dict) -> dict:
+        job_id = secrets.token_hex(8)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO jobs (id, status, filename, params, total, created_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, filename, json.dumps(params, ensure_ascii=False), len(texts), time.time())
+            )
+            conn.executemany(
+                "INSERT INTO job_items (job_id, row, text) VALUES (?, ?, ?)",
+                ((job_id, row, text) for row, text in enumerate(texts))
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job_dict(row) if row is not None else None
+
+    def delete(self, job_id: str) -> bool:
+        """Удалить задание с результатами (выполняющееся - останавливается)."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            deleted = conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,)).rowcount
+            conn.execute("DELETE FROM job_items WHERE job_id = ?", (job_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return deleted > 0
+
+    def claim(self, owner: str, lease_seconds: float = LEASE_SECONDS) -> Optional[dict]:
+        """Взять самое старое задание в очереди или задание с истёкшей арендой."""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_until < ?)"
+                " ORDER BY created_at LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', owner = ?, lease_until = ?,"
+                    " started_at = COALESCE(started_at, ?) WHERE id = ?",
+                    (owner, now + lease_seconds, now, row["id"])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["id"]) if row is not None else None
+
+    def renew(self, job_id: str, owner: str, lease_seconds: float = LEASE_SECONDS) -> bool:
+        """Продлить аренду; False - задание удалено, отменено или захвачено другим воркером."""
+        return self._connect().execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ? AND status = 'running'",
+            (time.time() + lease_seconds, job_id, owner)
+        ).rowcount == 1
+
+    def pending_rows(self, job_id: str, limit: int) -> List[Tuple[int, str]]:
+        return [
+            (row["row"], row["text"]) for row in self._connect().execute(
+                "SELECT row, text FROM job_items WHERE job_id = ? AND result IS NULL ORDER BY row LIMIT ?",
+                (job_id, limit)
+            )
+        ]
+
+    def save_results(self, job_id: str, owner: str, results: List[Tuple[int, list]], data_version: str,
+                     lease_seconds: float = LEASE_SECONDS) -> bool:
+        """Сохранить результаты строк; False - задание больше не принадлежит воркеру."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            updated = conn.execute(
+                "UPDATE jobs SET done = done + ?, data_version = ?, lease_until = ?"
+                " WHERE id = ? AND owner = ? AND status = 'running'",
+                (len(results), data_version, time.time() + lease_seconds, job_id, owner)
+            ).rowcount
+            if updated != 1:
+                conn.execute("ROLLBACK")
+                return False
+            conn.executemany(
+                "UPDATE job_items SET result = ? WHERE job_id = ? AND row = ?",
+                ((json.dumps(result, ensure_ascii=False), job_id, row) for row, result in results)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return True
+
+    def finish(self, job_id: str, owner: str, status: str, error: Optional[str] = None):
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ?, lease_until = NULL"
+            " WHERE id = ? AND owner = ? AND status = 'running'",
+            (status, error, time.time(), job_id, owner)
+        )
+
+    def iter_results(self, job_id: str, page_size: int = 1000) -> Iterator[Tuple[int, str, list]]:
+        """Обработанные строки задания по порядку: (номер строки, текст, результаты)."""
+        last_row = -1
+        while True:
+            rows = self._connect().execute(
+                "SELECT row, text, result FROM job_items"
+                " WHERE job_id = ? AND row > ? AND result IS NOT NULL ORDER BY row LIMIT ?",
+                (job_id, last_row, page_size)
+            ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row["row"], row["text"], json.loads(row["result"])
+            last_row = rows[-1]["row"]
+
+    def stats(self) -> dict:
+        counts = dict(self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in JOB_STATUSES}
+
+
+def stream_results(store: BulkJobStore, job_id: str, fmt: str) -> Iterator[str]:
+    """
+    Результаты задания по частям.
+    csv - строка на каждое найденное решение (rank с 1; у текста без результатов - пустые поля);
+    jsonl - объект на каждый текст: {"row", "text", "results": [...]}.
+    """
+    if fmt == "jsonl":
+        for row, text, results in store.iter_results(job_id):
+            yield json.dumps({"row": row, "text": text, "results": results}, ensure_ascii=False) + "\n"
+        return
+
+    columns = ["row", "text", "rank", "score", "index", *RESULT_CASE_FIELDS]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row, text, results in store.iter_results(job_id):
+        if not results:
+            writer.writerow([row, text] + [""] * (len(columns) - 2))
+        for rank, result in enumerate(results, 1):
+            writer.writerow([row, text, rank, result["score"], result["index"],
+                             *(result.get(name) or "" for name in RESULT_CASE_FIELDS)])
+        if buffer.tell() > 65536:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def lower_thread_priority(increment: int = 10):
+    """Понизить приоритет текущего потока (Linux: nice действует на отдельный поток)."""
+    if not sys.platform.startswith("linux"):
+        return
+    try:
+        tid = threading.get_native_id()
+        os.setpriority(os.PRIO_PROCESS, tid, min(19, os.getpriority(os.PRIO_PROCESS, tid) + increment))
+    except OSError as e:
+        print(f"Приоритет потока заданий не понижен: {e}")
+
+
+class BulkJobWorker:
+    """
+    Фоновый поток обработки заданий.
+    process_batch(job, texts) -> (результаты по текстам, версия данных);
+    should_wait() -> True, пока обработку нужно отложить (идут интерактивные
+    запросы или индекс не готов).
+    """
+
+    def __init__(self, store: BulkJobStore,
+                 process_batch: Callable[[dict, List[str]], Tuple[List[list], str]],
+                 should_wait: Callable[[], bool],
+                 batch_size: int = 50, cpu_share: float = 0.5,
+                 poll_interval: float = 2.0, wait_interval: float = 0.05,
+                 retry: Optional[RetryPolicy] = None):
+        self.store = store
+        self.process_batch = process_batch
+        self.should_wait = should_wait
+        self.batch_size = batch_size
+        self.cpu_share = min(1.0, max(0.01, cpu_share))
+        self.poll_interval = poll_interval
+        self.wait_interval = wait_interval
+        self.retry = retry or RetryPolicy()
+        self.current_job: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+        self._thread_pid: Optional[int] = None
+        self._stop = threading.Event()
+
+    @property
+    def owner(self) -> str:
+        return f"{os.getpid()}:{id(self)}"
+
+    def ensure_started(self):
+        """Запустить поток в текущем процессе (после fork поток родителя не наследуется)."""
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bulk-jobs", daemon=True)
+        self._thread_pid = os.getpid()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        lower_thread_priority()
+        while not self._stop.is_set():
+            try:
+                job = self.store.claim(self.owner)
+            except Exception as e:
+                print(f"Ошибка очереди заданий: {e}")
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self.current_job = job["id"]
+            try:
+                self._process(job)
+            except Exception as e:
+                print(f"Задание {job['id']} прервано ошибкой: {e}")
+                self.store.finish(job["id"], self.owner, "failed", str(e)[:500])
+            finally:
+                self.current_job = None
+
+    def _process(self, job: dict):
+        job_id = job["id"]
+        attempt = 0
+        renewed_at = time.monotonic()
+        print(f"Задание {job_id}: {job['total']} строк, обработано {job['done']}")
+        while not self._stop.is_set():
+            # Пока идут интерактивные запросы - ждём, продлевая аренду
+            if self.should_wait():
+                if time.monotonic() - renewed_at > LEASE_SECONDS / 3:
+                    if not self.store.renew(job_id, self.owner):
+                        return
+                    renewed_at = time.monotonic()
+                self._stop.wait(self.wait_interval)
+                continue
+
+            rows = self.store.pending_rows(job_id, self.batch_size)
+            if not rows:
+                self.store.finish(job_id, self.owner, "done")
+                print(f"Задание {job_id} завершено")
+                return
+
+            started = time.monotonic()
+            try:
+                results, data_version = self.process_batch(job, [text for _, text in rows])
+            except Exception as e:
+                attempt += 1
+                if attempt > self.retry.max_retries:
+                    self.store.finish(job_id, self.owner, "failed", str(e)[:500])
+                    print(f"Задание {job_id} не выполнено: {e}")
+                    return
+                delay = retry_after_seconds(e) or self.retry.backoff(attempt)
+                print(f"Задание {job_id}: ошибка батча ({str(e)[:80]}), повтор через {delay:.1f} с")
+                if not self.store.renew(job_id, self.owner):
+                    return
+                renewed_at = time.monotonic()
+                self._stop.wait(delay)
+                continue
+            attempt = 0
+
+            if not self.store.save_results(job_id, self.owner, list(zip((row for row, _ in rows), results)),
+                                           data_version):
+                # Задание удалено или перехвачено - результаты батча не нужны
+                return
+            renewed_at = time.monotonic()
+            # Доля времени работы не больше cpu_share
+            elapsed = renewed_at - started
+            self._stop.wait(elapsed * (1 / self.cpu_share - 1))
+
+    def stats(self) -> dict:
+        """Состояние воркера (без запросов к очереди - для /api/health)."""
+        return {
+            "running": self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid(),
+            "current_job": self.current_job,
+        }
@@ -16,6 +16,11 @@ class Config:
     # Google API - Gemini Embedding (новый SDK google-genai)
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     
+    # Адрес Gemini API. По умолчанию - официальный; для офлайн-тестов
+    # и нагрузочных замеров можно указать локальную заглушку fake_gemini.py,
+    # например GEMINI_BASE_URL=http://127.0.0.1:8765
+    GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+    
     # Параметры эмбеддингов - Gemini Embedding 001
     # По умолчанию 3072, но можно переопределить через output_dimensionality
     EMBEDDING_MODEL = "gemini-embedding-001"
@@ -32,6 +37,93 @@ class Config:
         'ad_description': 0.4
     }
     
+    # Генерация эмбеддингов в prepare_data.py (лимиты квоты Gemini)
+    # EMBEDDING_WORKERS - параллельных запросов
+    # EMBEDDING_RPM - запросов (батчей) в минуту, 0 - без ограничения
+    # EMBEDDING_TEXTS_PER_MINUTE - текстов в минуту, 0 - без ограничения
+    EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "4"))
+    EMBEDDING_RPM = float(os.getenv("EMBEDDING_RPM", "100"))
+    EMBEDDING_TEXTS_PER_MINUTE = float(os.getenv("EMBEDDING_TEXTS_PER_MINUTE", "0"))
+    EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))
+    # Кэш векторов по содержимому текста (SQLite в DATA_DIR): одинаковые
+    # тексты во всех полях и запусках отправляются в API один раз
+    EMBEDDING_CACHE = os.getenv("EMBEDDING_CACHE", "True").lower() == "true"
+    
+    # Чтение CSV в prepare_data.py частями по CSV_CHUNK_SIZE строк
+    # (память не зависит от размера выгрузки)
+    CSV_CHUNK_SIZE = int(os.getenv("CSV_CHUNK_SIZE", "5000"))
+    
+    # Граф ближайших соседей (knn_graph.py), строится в prepare_data.py:
+    # KNN_K - соседей на кейс в каждом поле (0 - не строить);
+    # KNN_MEMORY_MB - память под блок матрицы сходств при расчёте
+    KNN_K = int(os.getenv("KNN_K", "100"))
+    KNN_MEMORY_MB = float(os.getenv("KNN_MEMORY_MB", "256"))
+    
+    # Кластеры почти одинаковых решений (near_duplicates.py, prepare_data.py):
+    # порог оценки сходства Жаккара текстов ad_content_cited + FAS_arguments (0 - не строить)
+    DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+    
+    # Кэш результатов поиска
+    # SEARCH_CACHE_SIZE - число запросов в LRU-кэше процесса (0 - отключить)
+    # SEARCH_CACHE_SHARED - общий кэш для всех воркеров (SQLite в DATA_DIR)
+    SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+    SEARCH_CACHE_SHARED = os.getenv("SEARCH_CACHE_SHARED", "False").lower() == "true"
+
+    # Журнал поисковых запросов (JSONL) для воспроизведения нагрузки
+    # QUERY_LOG - включить запись; QUERY_LOG_PATH - файл (по умолчанию DATA_DIR/query_log.jsonl)
+    QUERY_LOG = os.getenv("QUERY_LOG", "False").lower() == "true"
+    QUERY_LOG_PATH = os.getenv("QUERY_LOG_PATH")
+
+    # Журнал событий поиска (JSON-строки в stdout): доля запросов, попадающих в журнал
+    # (1 - каждый запрос, 0 - только ошибки)
+    SEARCH_LOG_SAMPLE_RATE = float(os.getenv("SEARCH_LOG_SAMPLE_RATE", "0.1"))
+
+    # Метрики Prometheus (/metrics). METRICS_DIR - общая директория для обмена
+    # метриками между воркерами serve.py (без неё /metrics отдаёт только ответивший воркер)
+    METRICS_DIR = os.getenv("METRICS_DIR")
+
+    # Горячая перезагрузка индекса
+    # Интервал проверки изменений файлов в DATA_DIR, секунд (0 - отключить).
+    # При serve.py файлы проверяет родительский процесс и заменяет воркеры
+    INDEX_RELOAD_INTERVAL = float(os.getenv("INDEX_RELOAD_INTERVAL", "60"))
+    
+    # Отображать файлы эмбеддингов в память (np.load mmap_mode="r") вместо чтения.
+    # Все воркеры на машине разделяют одни и те же страницы page cache
+    INDEX_MMAP = os.getenv("INDEX_MMAP", "True").lower() == "true"
+    
+    # Токен для служебных эндпоинтов /api/admin/* и /api/jobs* (заголовок X-Admin-Token).
+    # Если не задан - служебные эндпоинты отключены
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+    
+    # Процессы для keyword-поиска (индекс в разделяемой памяти, keyword_index.py):
+    # запрос делится на SEARCH_PROCESSES частей корпуса. 0 - в потоке запроса
+    SEARCH_PROCESSES = int(os.getenv("SEARCH_PROCESSES", "0"))
+    # Директория файлов индекса keyword-поиска. По умолчанию /dev/shm, если в нём
+    # не хватает места - временная директория системы
+    KEYWORD_INDEX_DIR = os.getenv("KEYWORD_INDEX_DIR")
+    
+    # Задания массовой проверки (/api/jobs): BULK_JOBS_ENABLED - обрабатывать задания
+    # в этом процессе (нужен и ADMIN_TOKEN - без него эндпоинты заданий отключены); BULK_JOBS_DB - файл очереди (по умолчанию DATA_DIR/bulk_jobs.sqlite3);
+    # BULK_CPU_SHARE - доля времени, которую может занимать обработка;
+    # BULK_EMBEDDING_RPM - запросов к Gemini в минуту для заданий
+    BULK_JOBS_ENABLED = os.getenv("BULK_JOBS_ENABLED", "False").lower() == "true"
+    BULK_JOBS_DB = os.getenv("BULK_JOBS_DB")
+    BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "50"))
+    BULK_CPU_SHARE = float(os.getenv("BULK_CPU_SHARE", "0.5"))
+    BULK_EMBEDDING_RPM = float(os.getenv("BULK_EMBEDDING_RPM", "30"))
+    BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "100000"))
+    
+    # Распределённый поиск: SHARD_URLS - адреса серверов шардов через запятую (shard_server.py);
+    # если задан, сервер работает координатором и не загружает индекс сам
+    SHARD_URLS = os.getenv("SHARD_URLS")
+    SHARD_TIMEOUT = float(os.getenv("SHARD_TIMEOUT", "10"))
+    
+    # Профилирование: PROFILE_DIR - куда сохранять профили запросов (по умолчанию DATA_DIR/profiles);
+    # SAMPLER_ENABLED - фоновая выборка стеков с запуска (переключается /api/admin/sampler)
+    PROFILE_DIR = os.getenv("PROFILE_DIR")
+    SAMPLER_ENABLED = os.getenv("SAMPLER_ENABLED", "False").lower() == "true"
+    SAMPLER_INTERVAL_MS = float(os.getenv("SAMPLER_INTERVAL_MS", "10"))
+    
     # Параметры базы данных
     DATABASE_URL = os.getenv("DATABASE_URL")
     
@@ -70,6 +162,19 @@ class Config:
         if not cls.GEMINI_API_KEY:
             cls.validate()
         return cls.GEMINI_API_KEY
+    
+    @classmethod
+    def create_genai_client(cls, api_key: str = None):
+        """
+        Создать клиент google-genai с учётом GEMINI_BASE_URL.
+        Единая точка для main.py, prepare_data.py и embeddings.py.
+        """
+        # Импорт тяжёлый - только при создании клиента
+        from google import genai
+        from google.genai import types
+        
+        http_options = types.HttpOptions(base_url=cls.GEMINI_BASE_URL) if cls.GEMINI_BASE_URL else None
+        return genai.Client(api_key=api_key or cls.get_api_key(), http_options=http_options)
 
 
 # Валидация при импорте - отключена, проверка будет при первом вызове
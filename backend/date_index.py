@@ -0,0 +1,76 @@
+"""
+Даты решений: номера дней и сортировка.
+
+document_date каждого кейса разбирается один раз при загрузке снимка в
+номер дня (int32, дни от 1970-01-01). Кейсы упорядочены по дате
+(перестановка argsort), у каждого кейса известно место в этом порядке.
+Диапазон дат - два бинарных поиска по отсортированным дням, то есть
+отрезок мест [lo, hi); кандидат проходит, если его место в отрезке.
+Кейсы без даты стоят в конце порядка и в диапазоны не попадают.
+
+Год решения (первые 4 символа document_date, как раньше в фильтре year)
+тоже хранится массивом, чтобы фильтр по году не разбирал строки.
+"""
+
+from datetime import date
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# День кейса без даты: больше любого настоящего, в сортировке - в конце
+NO_DAY = np.iinfo(np.int32).max
+NO_YEAR = -1
+
+_EPOCH = date(1970, 1, 1).toordinal()
+
+
+def parse_day(value) -> Optional[int]:
+    """Номер дня даты "YYYY-MM-DD..." (или date); None - не дата."""
+    if isinstance(value, date):
+        return value.toordinal() - _EPOCH
+    if not isinstance(value, str):
+        return None
+    try:
+        return date.fromisoformat(value[:10]).toordinal() - _EPOCH
+    except ValueError:
+        return None
+
+
+def format_day(day: int) -> str:
+    """Дата ISO по номеру дня."""
+    return date.fromordinal(int(day) + _EPOCH).isoformat()
+
+
+class DateIndex:
+    """Дни кейсов, их порядок по дате и место каждого кейса в порядке."""
+
+    def __init__(self, dates: Sequence[Optional[str]]):
+        days = [parse_day(value) for value in dates]
+        self.days = np.array([NO_DAY if day is None else day for day in days], dtype=np.int32)
+        self.years = np.array(
+            [int(value[:4]) if isinstance(value, str) and value[:4].isdigit() else NO_YEAR for value in dates],
+            dtype=np.int32,
+        )
+        self.order = np.argsort(self.days, kind="stable").astype(np.int32)
+        self.sorted_days = self.days[self.order]
+        self.positions = np.empty(len(self.days), dtype=np.int32)
+        self.positions[self.order] = np.arange(len(self.days), dtype=np.int32)
+        self.dated = int(np.searchsorted(self.sorted_days, NO_DAY))
+
+    def span(self, day_from: Optional[int], day_to: Optional[int]) -> Tuple[int, int]:
+        """Отрезок мест [lo, hi) кейсов с днём от day_from до day_to включительно."""
+        lo = 0 if day_from is None else int(np.searchsorted(self.sorted_days[:self.dated], day_from, side="left"))
+        hi = self.dated if day_to is None else int(np.searchsorted(self.sorted_days[:self.dated], day_to, side="right"))
+        return lo, max(lo, hi)
+
+    def in_range(self, ids: Sequence[int], day_from: Optional[int], day_to: Optional[int]) -> np.ndarray:
+        """Попадают ли кейсы ids в диапазон дат."""
+        lo, hi = self.span(day_from, day_to)
+        positions = self.positions[np.asarray(ids, dtype=np.int64)]
+        return (positions >= lo) & (positions < hi)
+
+    def in_years(self, ids: Sequence[int], years: List[int]) -> np.ndarray:
+        """Относятся ли кейсы ids к одному из годов years."""
+        case_years = self.years[np.asarray(ids, dtype=np.int64)]
+        return np.isin(case_years, years) & (case_years != NO_YEAR)
+
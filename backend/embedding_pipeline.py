@@ -0,0 +1,223 @@
+"""
+Конвейер генерации эмбеддингов с учётом лимитов API.
+
+- Пул потоков: батчи всех заданий (полей) обрабатываются параллельно.
+- Token bucket: не превышаем квоту Gemini по запросам и текстам в минуту.
+- Повторы с экспоненциальной задержкой и jitter; Retry-After / retryDelay
+  из ответа 429 соблюдается и приостанавливает все потоки сразу.
+"""
+
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Callable, List, Optional, Sequence
+
+
+class TokenBucket:
+    """
+    Потокобезопасный token bucket.
+    rate_per_minute - скорость пополнения, capacity - допустимый всплеск.
+    rate_per_minute <= 0 отключает ограничение.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_minute / 60.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float):
+        """Приостановить выдачу токенов всем потокам (например, по Retry-After)."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+    def acquire(self, tokens: float = 1.0):
+        """Дождаться и забрать tokens токенов."""
+        # Запрос больше ёмкости иначе никогда не выполнится
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.rate <= 0:
+                    return
+                else:
+                    self._refill(now)
+                    if self.tokens >= tokens:
+                        self.tokens -= tokens
+                        return
+                    wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Забрать токены без ожидания; False, если их сейчас недостаточно."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return False
+            if self.rate <= 0:
+                return True
+            self._refill(now)
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+
+@dataclass
+class RetryPolicy:
+    """Параметры повторов: экспоненциальная задержка с полным jitter."""
+    max_retries: int = 6
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+def _error_code(exc: Exception) -> Optional[int]:
+    """HTTP-код ошибки SDK (google.genai.errors.APIError.code) или ответа."""
+    code = getattr(exc, "code", None)
+    if isinstance(code, int):
+        return code
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(exc: Exception) -> bool:
+    """Повторяем перегрузку, квоту, ошибки сервера и сети; 4xx запроса - нет."""
+    code = _error_code(exc)
+    if code is None:
+        return True
+    return code in (408, 429) or code >= 500
+
+
+def is_quota_error(exc: Exception) -> bool:
+    message = str(exc).lower()
+    return _error_code(exc) == 429 or "resource_exhausted" in message or "quota" in message
+
+
+def retry_after_seconds(exc: Exception) -> Optional[float]:
+    """
+    Задержка, которую просит сервер: заголовок Retry-After (секунды или дата)
+    или поле retryDelay ("37s") из google.rpc.RetryInfo в теле ошибки.
+    """
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        value = headers.get("Retry-After") or headers.get("retry-after")
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                try:
+                    return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+    text = f"{exc} {getattr(exc, 'details', '')}"
+    match = re.search(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", text)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+@dataclass
+class EmbeddingJob:
+    """
+    Задание эмбеддинга: тексты и матрица результата (np.ndarray или np.memmap).
+    done - номера уже готовых батчей (с 1), on_batch_done вызывается после
+    записи каждого успешного батча (например, для чекпоинта).
+    """
+    name: str
+    texts: Sequence[str]
+    output: object
+    batch_size: int = 100
+    done: set = field(default_factory=set)
+    on_batch_done: Optional[Callable[[int], None]] = None
+    failed_batches: List[int] = field(default_factory=list)
+
+    @property
+    def total_batches(self) -> int:
+        return (len(self.texts) + self.batch_size - 1) // self.batch_size
+
+
+def run_embedding_jobs(jobs: List[EmbeddingJob], embed_fn: Callable[[List[str]], List[List[float]]],
+                       workers: int = 4, request_limiter: Optional[TokenBucket] = None,
+                       text_limiter: Optional[TokenBucket] = None,
+                       retry: Optional[RetryPolicy] = None):
+    """
+    Выполнить задания в общем пуле потоков с общими лимитерами.
+    Батч, не получившийся после всех повторов, остаётся нулевым и попадает
+    в job.failed_batches.
+    """
+    retry = retry or RetryPolicy()
+    progress_lock = threading.Lock()
+    completed = {job.name: len(job.done) for job in jobs}
+
+    def process(job: EmbeddingJob, batch_num: int):
+        start = (batch_num - 1) * job.batch_size
+        batch = list(job.texts[start:start + job.batch_size])
+        attempt = 0
+        while True:
+            if request_limiter is not None:
+                request_limiter.acquire(1)
+            if text_limiter is not None:
+                text_limiter.acquire(len(batch))
+            try:
+                vectors = embed_fn(batch)
+                job.output[start:start + len(batch)] = vectors
+                if job.on_batch_done is not None:
+                    job.on_batch_done(batch_num)
+                break
+            except Exception as e:
+                delay = retry_after_seconds(e)
+                if not is_retryable(e) or attempt >= retry.max_retries:
+                    print(f"  [{job.name}] батч {batch_num} не удался: {str(e)[:80]}...")
+                    job.output[start:start + len(batch)] = 0
+                    with progress_lock:
+                        job.failed_batches.append(batch_num)
+                    return
+                if delay is None:
+                    delay = retry.backoff(attempt)
+                elif request_limiter is not None:
+                    # Сервер явно попросил подождать - останавливаем все потоки
+                    request_limiter.pause(delay)
+                if is_quota_error(e):
+                    print(f"  [{job.name}] квота, повтор батча {batch_num} через {delay:.1f} с")
+                attempt += 1
+                time.sleep(delay)
+
+        with progress_lock:
+            completed[job.name] += 1
+            count = completed[job.name]
+            if count % 5 == 0 or count == job.total_batches:
+                print(f"  [{job.name}] батч {count}/{job.total_batches}")
+                sys.stdout.flush()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="embed") as pool:
+        futures = []
+        # Чередуем батчи заданий, чтобы все поля продвигались одновременно
+        max_batches = max((job.total_batches for job in jobs), default=0)
+        for batch_num in range(1, max_batches + 1):
+            for job in jobs:
+                if batch_num <= job.total_batches and batch_num not in job.done:
+                    futures.append(pool.submit(process, job, batch_num))
+        for future in as_completed(futures):
+            future.result()
+
+    for job in jobs:
+        job.failed_batches.sort()
@@ -6,8 +6,7 @@
 import numpy as np
 from typing import List, Optional
 
-# Новый SDK google-genai
-from google import genai
+# Новый SDK google-genai (клиент создаётся в Config.create_genai_client)
 from google.genai import types
 
 from config import Config
@@ -27,7 +26,7 @@ class EmbeddingService:
         self.api_key = api_key or Config.get_api_key()
         
         # Инициализация клиента
-        self.client = genai.Client(api_key=self.api_key)
+        self.client = Config.create_genai_client(self.api_key)
         
         # Модель gemini-embedding-001
         self.model_name = "gemini-embedding-001"
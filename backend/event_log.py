@@ -0,0 +1,42 @@
+"""
+Структурированный журнал событий сервера (JSON-строки в stdout).
+
+Заменяет print на горячем пути запроса: событие кладётся в очередь и
+выводится фоновым потоком (см. QueryLog), рутинные события - выборочно
+с долей SEARCH_LOG_SAMPLE_RATE. Ошибки пишутся всегда.
+"""
+
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+from query_log import QueryLog
+
+
+class EventLog(QueryLog):
+    """Асинхронный выборочный журнал событий в stdout."""
+
+    thread_name = "event-log"
+
+    def __init__(self, sample_rate: float = 1.0, max_queue: int = 10000):
+        super().__init__(Path("<stdout>"), max_queue=max_queue)
+        self.sample_rate = sample_rate
+
+    def _open(self) -> int:
+        return sys.stdout.fileno()
+
+    def _close_fd(self, fd: int):
+        pass
+
+    def event(self, name: str, level: str = "info", **fields):
+        """
+        Записать событие. События уровня info проходят с вероятностью
+        sample_rate (доля попавших в журнал - в поле sample_rate).
+        """
+        if level == "info":
+            if self.sample_rate <= 0 or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+                return
+            fields["sample_rate"] = self.sample_rate
+        self.record({"ts": round(time.time(), 3), "level": level, "event": name, "pid": os.getpid(), **fields})
@@ -0,0 +1,210 @@
+"""
+Локальная заглушка Gemini Embedding API для офлайн-тестов и нагрузочных замеров.
+
+Реализует те же REST-методы, что вызывает SDK google-genai:
+- POST /v1beta/models/{model}:batchEmbedContents (client.models.embed_content)
+- POST /v1beta/models/{model}:embedContent
+
+Векторы детерминированные: хэширование слов текста в EMBEDDING_DIMENSION
+координат (feature hashing), поэтому тексты с общими словами близки
+и поиск даёт осмысленный порядок. Задержки, ошибки сервера, ответы 429
+с retryDelay и лимит размера батча настраиваются.
+
+Запуск:
+    python fake_gemini.py --port 8765 --latency-ms 120 --latency-dist lognormal \
+        --error-rate 0.01 --quota-rate 0.02 --rpm 1500
+
+Подключение (main.py, prepare_data.py, embeddings.py):
+    GEMINI_BASE_URL=http://127.0.0.1:8765 GEMINI_API_KEY=fake python prepare_data.py
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from config import Config
+from embedding_pipeline import TokenBucket
+
+
+@dataclass
+class FakeSettings:
+    """Поведение заглушки (задаётся аргументами командной строки)."""
+    dimension: int = Config.EMBEDDING_DIMENSION
+    latency_ms: float = 0.0
+    latency_dist: str = "fixed"  # fixed | uniform | exponential | lognormal
+    latency_sigma: float = 0.5
+    latency_per_text_ms: float = 0.0
+    error_rate: float = 0.0
+    quota_rate: float = 0.0
+    retry_delay: float = 1.0
+    rpm: float = 0.0
+    max_batch: int = 100
+    seed: Optional[int] = None
+
+
+settings = FakeSettings()
+stats = Counter()
+_stats_lock = threading.Lock()
+_rng = random.Random()
+_rpm_bucket: Optional[TokenBucket] = None
+
+app = FastAPI(title="Fake Gemini Embedding API")
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fake_embedding(text: str, dimension: int) -> list[float]:
+    """
+    Детерминированный вектор текста: каждое слово добавляет +-1 в координату,
+    выбранную по его хэшу. Результат нормализован.
+    """
+    vector = np.zeros(dimension)
+    tokens = TOKEN_RE.findall(text.lower()) or [text]
+    for token in tokens:
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        vector[value % dimension] += 1.0 if (value >> 63) else -1.0
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector.tolist()
+
+
+def sample_latency(texts: int) -> float:
+    """Задержка ответа в секундах по выбранному распределению."""
+    mean = settings.latency_ms / 1000.0
+    if mean <= 0:
+        base = 0.0
+    elif settings.latency_dist == "uniform":
+        base = _rng.uniform(0, 2 * mean)
+    elif settings.latency_dist == "exponential":
+        base = _rng.expovariate(1.0 / mean)
+    elif settings.latency_dist == "lognormal":
+        # Параметр mu подобран так, чтобы среднее равнялось latency_ms
+        sigma = settings.latency_sigma
+        base = _rng.lognormvariate(np.log(mean) - sigma ** 2 / 2, sigma)
+    else:
+        base = mean
+    return base + texts * settings.latency_per_text_ms / 1000.0
+
+
+def _count(**values):
+    with _stats_lock:
+        stats.update(values)
+
+
+def error_response(code: int, status: str, message: str, retry_delay: Optional[float] = None) -> JSONResponse:
+    """Ошибка в формате Google API (google.rpc.Status)."""
+    error = {"code": code, "message": message, "status": status}
+    if retry_delay is not None:
+        # Как у Gemini: задержка только в теле ответа, без заголовка Retry-After
+        error["details"] = [{
+            "@type": "type.googleapis.com/google.rpc.RetryInfo",
+            "retryDelay": f"{retry_delay:g}s",
+        }]
+    _count(**{f"errors_{code}": 1})
+    return JSONResponse(status_code=code, content={"error": error})
+
+
+def _request_text(request: dict) -> str:
+    parts = (request.get("content") or {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts)
+
+
+async def _embed(requests: list[dict]):
+    """Общая логика обоих методов: инъекция сбоев, задержка, векторы."""
+    _count(requests=1)
+    if len(requests) > settings.max_batch:
+        return None, error_response(
+            400, "INVALID_ARGUMENT",
+            f"* BatchEmbedContentsRequest.requests: at most {settings.max_batch} requests can be in one batch"
+        )
+    if _rpm_bucket is not None and not _rpm_bucket.try_acquire():
+        return None, error_response(
+            429, "RESOURCE_EXHAUSTED", "Quota exceeded for metric: embed_content requests per minute",
+            retry_delay=settings.retry_delay
+        )
+    roll = _rng.random()
+    if roll < settings.quota_rate:
+        return None, error_response(
+            429, "RESOURCE_EXHAUSTED", "Resource has been exhausted (e.g. check quota).",
+            retry_delay=settings.retry_delay
+        )
+    if roll < settings.quota_rate + settings.error_rate:
+        return None, error_response(503, "UNAVAILABLE", "The model is overloaded. Please try again later.")
+
+    await asyncio.sleep(sample_latency(len(requests)))
+    embeddings = [
+        {"values": fake_embedding(_request_text(r), int(r.get("outputDimensionality") or settings.dimension))}
+        for r in requests
+    ]
+    _count(texts=len(requests))
+    return embeddings, None
+
+
+@app.post("/{api_version}/models/{model}:batchEmbedContents")
+async def batch_embed_contents(api_version: str, model: str, request: Request):
+    body = await request.json()
+    embeddings, error = await _embed(body.get("requests") or [])
+    return error or {"embeddings": embeddings}
+
+
+@app.post("/{api_version}/models/{model}:embedContent")
+async def embed_content(api_version: str, model: str, request: Request):
+    body = await request.json()
+    embeddings, error = await _embed([body])
+    return error or {"embedding": embeddings[0]}
+
+
+@app.get("/stats")
+async def get_stats():
+    """Счётчики запросов, текстов и ошибок - для сверки с клиентом."""
+    with _stats_lock:
+        return dict(stats)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Локальная заглушка Gemini Embedding API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--dimension", type=int, default=Config.EMBEDDING_DIMENSION,
+                        help="размерность, если в запросе не указан outputDimensionality")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="средняя задержка ответа")
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "exponential", "lognormal"], default="fixed")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="sigma для lognormal")
+    parser.add_argument("--latency-per-text-ms", type=float, default=0.0, help="добавка за каждый текст батча")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 503")
+    parser.add_argument("--quota-rate", type=float, default=0.0, help="доля случайных ответов 429")
+    parser.add_argument("--retry-delay", type=float, default=1.0, help="retryDelay в ответах 429, секунд")
+    parser.add_argument("--rpm", type=float, default=0.0, help="квота запросов в минуту (0 - без квоты)")
+    parser.add_argument("--max-batch", type=int, default=100, help="максимум текстов в batchEmbedContents")
+    parser.add_argument("--seed", type=int, default=None, help="seed для воспроизводимых сбоев и задержек")
+    return parser.parse_args()
+
+
+def main():
+    global _rpm_bucket
+    args = parse_args()
+    for name in FakeSettings.__dataclass_fields__:
+        setattr(settings, name, getattr(args, name))
+    _rng.seed(args.seed)
+    if args.rpm > 0:
+        # Квота без всплесков сверх минутного лимита, как у настоящего API
+        _rpm_bucket = TokenBucket(args.rpm, capacity=args.rpm)
+    print(f"Fake Gemini: http://{args.host}:{args.port} {settings}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Снимок индекса поиска.
+
+IndexSnapshot - неизменяемый набор данных, с которым работает поиск:
+эмбеддинги полей и кейсы. Снимок собирается целиком и подменяется
+одной операцией присваивания, поэтому запрос никогда не видит
+"наполовину загруженное" состояние: начатые запросы дорабатывают
+на старом снимке, новые получают новый.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, Callable
+
+import numpy as np
+
+from knn_graph import KNN_FILES, load_knn_graph
+from near_duplicates import DUPLICATE_CLUSTERS_FILE
+
+# Файлы индекса в DATA_DIR
+EMBEDDINGS_FAS_ARGS_FILE = "embeddings_FAS_arguments.npy"
+EMBEDDINGS_VIOLATION_FILE = "embeddings_violation_summary.npy"
+EMBEDDINGS_AD_DESC_FILE = "embeddings_ad_description.npy"
+CASES_FILE = "cases.json"
+
+# Маски валидности эмбеддингов (prepare_data.py): False - у строки нет
+# настоящего вектора (пустой текст или ошибка API). Необязательны:
+# для старых данных маска выводится из ненулевых строк
+VALID_FAS_ARGS_FILE = "valid_FAS_arguments.npy"
+VALID_VIOLATION_FILE = "valid_violation_summary.npy"
+VALID_AD_DESC_FILE = "valid_ad_description.npy"
+
+INDEX_FILES = [
+    EMBEDDINGS_FAS_ARGS_FILE,
+    EMBEDDINGS_VIOLATION_FILE,
+    EMBEDDINGS_AD_DESC_FILE,
+    CASES_FILE,
+]
+
+VALIDITY_FILES = [
+    VALID_FAS_ARGS_FILE,
+    VALID_VIOLATION_FILE,
+    VALID_AD_DESC_FILE,
+]
+
+# Необязательные файлы, которые prepare_data.py строит по эмбеддингам и текстам:
+# граф соседей и кластеры почти одинаковых решений
+DERIVED_FILES = KNN_FILES + [DUPLICATE_CLUSTERS_FILE]
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """Неизменяемый снимок данных индекса."""
+    version: str
+    cases: Optional[tuple] = None
+    embeddings_fas_args: Optional[np.ndarray] = None
+    embeddings_violation: Optional[np.ndarray] = None
+    embeddings_ad_desc: Optional[np.ndarray] = None
+    valid_fas_args: Optional[np.ndarray] = None
+    valid_violation: Optional[np.ndarray] = None
+    valid_ad_desc: Optional[np.ndarray] = None
+    # Граф соседей: {поле: (ids [N, K], scores [N, K])}, пустой - графа нет
+    knn_graph: dict = field(default_factory=dict, repr=False, compare=False)
+    # Номер кластера почти одинаковых решений для каждого кейса (near_duplicates.py)
+    duplicate_clusters: Optional[np.ndarray] = None
+    loaded_at: float = field(default_factory=time.time)
+    # Производные структуры, вычисляемые по снимку один раз (опции фильтров и т.п.).
+    # Живут и умирают вместе со снимком
+    derived: dict = field(default_factory=dict, repr=False, compare=False)
+
+    @property
+    def is_ready(self) -> bool:
+        """Снимок пригоден для поиска."""
+        return self.embeddings_fas_args is not None and self.cases is not None
+
+    @property
+    def total_cases(self) -> int:
+        return len(self.cases) if self.cases else 0
+
+
+def compute_data_version(data_dir: Path) -> str:
+    """
+    Вычислить версию данных по отпечатку файлов индекса (имя, размер, mtime).
+    Меняется при любой перегенерации эмбеддингов или cases.json.
+    """
+    h = hashlib.sha256()
+    for filename in INDEX_FILES + VALIDITY_FILES + DERIVED_FILES:
+        path = data_dir / filename
+        if path.exists():
+            stat = path.stat()
+            h.update(f"{filename}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+        else:
+            h.update(f"{filename}:missing;".encode())
+    return h.hexdigest()[:16]
+
+
+def _load_embeddings(path: Path, label: str, mmap: bool = False) -> Optional[np.ndarray]:
+    """
+    Загрузить матрицу эмбеддингов и сделать её только для чтения.
+    При mmap=True файл отображается в память: страницы берутся из page cache
+    и разделяются всеми процессами, читающими тот же файл.
+    """
+    if not path.exists():
+        print(f"  ВНИМАНИЕ: Файл {path} не найден!")
+        return None
+    embeddings = np.load(path, mmap_mode="r" if mmap else None)
+    embeddings.flags.writeable = False
+    print(f"  {label} эмбеддинги: {embeddings.shape}{' (mmap)' if mmap else ''}")
+    return embeddings
+
+
+def _load_validity(path: Path, embeddings: Optional[np.ndarray], label: str) -> Optional[np.ndarray]:
+    """
+    Загрузить маску валидности строк матрицы эмбеддингов.
+    Если файла нет, валидными считаются ненулевые строки.
+    """
+    if embeddings is None:
+        return None
+    if path.exists():
+        valid = np.load(path).astype(bool, copy=False)
+    else:
+        valid = np.any(embeddings != 0, axis=1)
+    valid.flags.writeable = False
+    invalid = int(valid.size - np.count_nonzero(valid))
+    if invalid:
+        print(f"  {label}: без эмбеддинга {invalid} строк (исключены из оценки)")
+    return valid
+
+
+def _load_clusters(path: Path, cases: Optional[tuple]) -> Optional[np.ndarray]:
+    """Номера кластеров почти одинаковых решений; None - файла нет или он от других кейсов."""
+    if cases is None or not path.exists():
+        return None
+    clusters = np.load(path)
+    if clusters.shape != (len(cases),):
+        print(f"  ВНИМАНИЕ: {path.name}: форма {clusters.shape}, кейсов {len(cases)} - пропуск")
+        return None
+    clusters.flags.writeable = False
+    repeated = len(clusters) - len(np.unique(clusters))
+    print(f"  Кластеры почти одинаковых решений: {repeated} повторов")
+    return clusters
+
+
+def load_snapshot(data_dir: Path, mmap: bool = False) -> IndexSnapshot:
+    """
+    Собрать новый снимок из файлов в data_dir.
+    Версия вычисляется до чтения файлов: если файлы поменяются во время
+    загрузки, следующая проверка увидит новую версию и перезагрузит снимок.
+    
+    При mmap=True файлы эмбеддингов нельзя перезаписывать на месте -
+    только атомарной заменой (см. prepare_data.save_npy_atomic), иначе
+    процессы со старым отображением получат SIGBUS.
+    """
+    version = compute_data_version(data_dir)
+
+    embeddings_fas_args = _load_embeddings(data_dir / EMBEDDINGS_FAS_ARGS_FILE, "FAS_arguments (первичный поиск)", mmap)
+    embeddings_violation = _load_embeddings(data_dir / EMBEDDINGS_VIOLATION_FILE, "violation_summary", mmap)
+    embeddings_ad_desc = _load_embeddings(data_dir / EMBEDDINGS_AD_DESC_FILE, "ad_description", mmap)
+    valid_fas_args = _load_validity(data_dir / VALID_FAS_ARGS_FILE, embeddings_fas_args, "FAS_arguments")
+    valid_violation = _load_validity(data_dir / VALID_VIOLATION_FILE, embeddings_violation, "violation_summary")
+    valid_ad_desc = _load_validity(data_dir / VALID_AD_DESC_FILE, embeddings_ad_desc, "ad_description")
+
+    cases = None
+    cases_path = data_dir / CASES_FILE
+    if cases_path.exists():
+        with open(cases_path, "r", encoding="utf-8") as f:
+            cases = tuple(json.load(f))
+        print(f"  Кейсов загружено: {len(cases)}")
+    else:
+        print(f"  ВНИМАНИЕ: Файл {cases_path} не найден!")
+    knn_graph = load_knn_graph(data_dir, len(cases), mmap) if cases is not None else {}
+    duplicate_clusters = _load_clusters(data_dir / DUPLICATE_CLUSTERS_FILE, cases)
+
+    return IndexSnapshot(
+        version=version,
+        cases=cases,
+        embeddings_fas_args=embeddings_fas_args,
+        embeddings_violation=embeddings_violation,
+        embeddings_ad_desc=embeddings_ad_desc,
+        valid_fas_args=valid_fas_args,
+        valid_violation=valid_violation,
+        valid_ad_desc=valid_ad_desc,
+        knn_graph=knn_graph,
+        duplicate_clusters=duplicate_clusters,
+    )
+
+
+def validate_snapshot(snapshot: IndexSnapshot) -> Optional[str]:
+    """
+    Проверить согласованность снимка.
+    Возвращает описание проблемы или None, если снимок корректен.
+    """
+    if not snapshot.is_ready:
+        return "нет эмбеддингов FAS_arguments или cases.json"
+    n = len(snapshot.cases)
+    for name, emb, valid in (
+        ("FAS_arguments", snapshot.embeddings_fas_args, snapshot.valid_fas_args),
+        ("violation_summary", snapshot.embeddings_violation, snapshot.valid_violation),
+        ("ad_description", snapshot.embeddings_ad_desc, snapshot.valid_ad_desc),
+    ):
+        if emb is not None and emb.shape[0] != n:
+            return f"эмбеддинги {name}: {emb.shape[0]} строк, кейсов: {n}"
+        if valid is not None and valid.shape != (n,):
+            return f"маска валидности {name}: форма {valid.shape}, кейсов: {n}"
+    return None
+
+
+class SnapshotWatcher(threading.Thread):
+    """
+    Фоновый поток, следящий за изменением файлов в DATA_DIR.
+    Перезагрузка запускается только когда версия стабильна два опроса подряд,
+    чтобы не подхватить файлы, которые ещё дописываются.
+    Если reload вернул {"status": "rejected"}, эта версия данных больше не
+    загружается - до следующего изменения файлов.
+    serve.py не запускает поток, а вызывает poll() из цикла родительского процесса.
+    """
+
+    def __init__(self, data_dir: Path, get_version: Callable[[], Optional[str]],
+                 reload: Callable[[], Optional[dict]], interval: float):
+        super().__init__(name="index-snapshot-watcher", daemon=True)
+        self.data_dir = data_dir
+        self.get_version = get_version
+        self.reload = reload
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._pending_version: Optional[str] = None
+        self._rejected_version: Optional[str] = None
+
+    def poll(self):
+        """Одна проверка версии данных."""
+        version = compute_data_version(self.data_dir)
+        if version == self.get_version() or version == self._rejected_version:
+            self._pending_version = None
+        elif version == self._pending_version:
+            print(f"Обнаружены новые данные в {self.data_dir}, перезагрузка индекса...")
+            result = self.reload()
+            if result and result.get("status") == "rejected":
+                self._rejected_version = version
+                print(f"Версия данных {version} пропускается до следующего изменения файлов")
+            self._pending_version = None
+        else:
+            self._pending_version = version
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Ошибка проверки обновления данных: {e}")
+
+    def stop(self):
+        self._stop_event.set()
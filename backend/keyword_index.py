@@ -0,0 +1,228 @@
+"""
+Индекс keyword-поиска в разделяемой памяти.
+
+Тексты полей кейсов приводятся к нижнему регистру один раз при загрузке
+снимка (а не на каждый запрос) и складываются в один UTF-8 буфер;
+границы полей - в массиве смещений. Оба лежат в файлах, отображаемых в
+память (KEYWORD_INDEX_DIR, иначе /dev/shm, если есть): процессы пула
+(SEARCH_PROCESSES) читают одни и те же страницы без копирования и без
+pickling кейсов. Если в /dev/shm не хватает места (в Docker по умолчанию
+64 МБ), индекс строится во временной директории системы.
+
+Поиск термина - mmap.find по диапазону буфера (цикл в C, а не перебор
+на Python); попадание переводится в (кейс, поле) по смещениям. mmap.find
+не отпускает GIL, поэтому потоки одного процесса ищут по очереди -
+параллельно поиск идёт только в пуле процессов (SEARCH_PROCESSES).
+Для UTF-8 вхождение подстроки в байтах равносильно вхождению в строке,
+поэтому оценки совпадают с прямым перебором в main.keyword_search.
+"""
+
+import bisect
+import errno
+import mmap
+import os
+import re
+import tempfile
+import threading
+import weakref
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Оценки как в исходном переборе: вхождение всего запроса в поле +10,
+# каждого слова длиннее 3 символов +1
+PHRASE_WEIGHT = 10
+WORD_WEIGHT = 1
+MIN_WORD_LENGTH = 4
+
+
+def query_terms(query: str) -> List[Tuple[bytes, int]]:
+    """Термины запроса с весами (в UTF-8, в нижнем регистре)."""
+    query_lower = query.lower()
+    terms = [(query_lower.encode("utf-8"), PHRASE_WEIGHT)]
+    for word in set(re.findall(r'\b\w+\b', query_lower)):
+        if len(word) >= MIN_WORD_LENGTH:
+            terms.append((word.encode("utf-8"), WORD_WEIGHT))
+    return terms
+
+
+def _shared_dir() -> Optional[str]:
+    return "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+
+
+def _remove_directory(directory: Path):
+    for name in ("texts.bin", "offsets.npy"):
+        try:
+            (directory / name).unlink()
+        except OSError:
+            pass
+    try:
+        directory.rmdir()
+    except OSError:
+        pass
+
+
+class KeywordIndex:
+    """Тексты полей всех кейсов снимка в отображаемом в память буфере."""
+
+    def __init__(self, cases: Sequence[dict], fields: Sequence[str], directory: Optional[str] = None):
+        """directory - где создать файлы индекса (по умолчанию /dev/shm или временная директория)."""
+        self.fields = tuple(fields)
+        self.total_cases = len(cases)
+        self._owner_pid = os.getpid()
+
+        parent = directory or _shared_dir()
+        try:
+            index_dir = self._write(cases, parent)
+        except OSError as e:
+            if e.errno != errno.ENOSPC or parent is None:
+                raise
+            print(f"⚠️ Нет места для индекса keyword-поиска в {parent}, используется {tempfile.gettempdir()}")
+            index_dir = self._write(cases, None)
+
+        self.offsets = np.load(self.offsets_path, mmap_mode="r")
+        # Файлы удаляются, когда снимок с индексом больше не используется
+        # (только в создавшем процессе - воркеры serve.py получают индекс через fork)
+        self._finalizer = weakref.finalize(self, _remove_files, index_dir, self._owner_pid)
+
+    def _write(self, cases: Sequence[dict], parent: Optional[str]) -> Path:
+        """Записать тексты и смещения в новую директорию внутри parent (None - временная директория)."""
+        directory = Path(tempfile.mkdtemp(prefix="fas_keyword_", dir=parent))
+        self.text_path = str(directory / "texts.bin")
+        self.offsets_path = str(directory / "offsets.npy")
+
+        n_slots = len(cases) * len(self.fields)
+        offsets = np.empty(n_slots + 1, dtype=np.int64)
+        offsets[0] = 0
+        position = 0
+        slot = 0
+        try:
+            with open(self.text_path, "wb") as f:
+                for case in cases:
+                    for field in self.fields:
+                        data = (case.get(field, '') or '').lower().encode("utf-8")
+                        f.write(data)
+                        position += len(data)
+                        slot += 1
+                        offsets[slot] = position
+            np.save(self.offsets_path, offsets)
+        except OSError:
+            _remove_directory(directory)
+            raise
+        self.nbytes = position
+        return directory
+
+    def search(self, query: str, top_k: int, executor: Optional[Executor] = None,
+               chunks: int = 1) -> List[Tuple[int, int]]:
+        """
+        [(индекс кейса, оценка)] по убыванию оценки (при равенстве - по индексу).
+        С executor поиск делится на chunks диапазонов кейсов, выполняемых параллельно.
+        """
+        return self.search_many([query], top_k, executor, chunks)[0]
+
+    def search_many(self, queries: Sequence[str], top_k: int, executor: Optional[Executor] = None,
+                    chunks: int = 1) -> List[List[Tuple[int, int]]]:
+        """
+        Поиск для батча запросов: каждый термин просматривается один раз
+        на весь батч, оценки запросов складываются из числа полей с термином.
+        """
+        query_term_lists = [query_terms(query) for query in queries]
+        unique_terms = sorted({term for terms in query_term_lists for term, _ in terms if term})
+        counts = self._count_terms(unique_terms, executor, chunks)
+
+        results = []
+        for terms in query_term_lists:
+            scores: Dict[int, int] = {}
+            for term, weight in terms:
+                if not term:
+                    # Пустая подстрока входит в любое поле
+                    for idx in range(self.total_cases):
+                        scores[idx] = scores.get(idx, 0) + weight * len(self.fields)
+                    continue
+                for idx, fields in counts[term].items():
+                    scores[idx] = scores.get(idx, 0) + weight * fields
+            ranked = sorted(scores.items())
+            ranked.sort(key=lambda x: x[1], reverse=True)
+            results.append(ranked[:top_k])
+        return results
+
+    def _count_terms(self, terms: List[bytes], executor: Optional[Executor], chunks: int) -> Dict[bytes, Dict[int, int]]:
+        if not terms:
+            return {}
+        args = (self.text_path, self.offsets_path, len(self.fields))
+        if executor is None or chunks <= 1 or self.total_cases < chunks:
+            parts = [count_terms(*args, 0, self.total_cases, terms)]
+        else:
+            bounds = np.linspace(0, self.total_cases, chunks + 1).astype(int)
+            futures = [
+                executor.submit(count_terms, *args, int(start), int(end), terms)
+                for start, end in zip(bounds[:-1], bounds[1:]) if end > start
+            ]
+            parts = [future.result() for future in futures]
+        counts = {}
+        for i, term in enumerate(terms):
+            merged = {}
+            for part in parts:
+                merged.update(part[i])
+            counts[term] = merged
+        return counts
+
+
+def _remove_files(directory: Path, owner_pid: int):
+    if os.getpid() != owner_pid:
+        return
+    _remove_directory(directory)
+
+
+# Открытые отображения процесса: путь -> (mmap, смещения).
+# Хранятся два последних индекса (текущий снимок и предыдущий на время перезагрузки)
+_open_indexes: Dict[str, tuple] = {}
+_open_lock = threading.Lock()
+MAX_OPEN_INDEXES = 2
+
+
+def _open_index(text_path: str, offsets_path: str) -> tuple:
+    with _open_lock:
+        opened = _open_indexes.get(text_path)
+        if opened is None:
+            with open(text_path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                buffer = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) if size else b""
+            opened = (buffer, np.load(offsets_path, mmap_mode="r"))
+            while len(_open_indexes) >= MAX_OPEN_INDEXES:
+                _open_indexes.pop(next(iter(_open_indexes)))
+            _open_indexes[text_path] = opened
+        return opened
+
+
+def count_terms(text_path: str, offsets_path: str, n_fields: int, start: int, end: int,
+                terms: List[bytes]) -> List[Dict[int, int]]:
+    """
+    Для каждого (непустого) термина - {индекс кейса: число полей с термином}
+    по кейсам [start, end). Выполняется в процессе пула или в текущем потоке.
+    """
+    buffer, offsets = _open_index(text_path, offsets_path)
+    # Границы полей диапазона - обычный список: bisect и индексирование быстрее, чем у memmap
+    bounds = offsets[start * n_fields:end * n_fields + 1].tolist()
+    lo, hi = bounds[0], bounds[-1]
+
+    result = []
+    for term in terms:
+        counts: Dict[int, int] = {}
+        size = len(term)
+        pos = buffer.find(term, lo, hi)
+        while pos != -1:
+            slot = bisect.bisect_right(bounds, pos) - 1
+            field_end = bounds[slot + 1]
+            if pos + size <= field_end:
+                idx = start + slot // n_fields
+                counts[idx] = counts.get(idx, 0) + 1
+                # В одном поле термин засчитывается один раз
+                pos = buffer.find(term, field_end, hi)
+            else:
+                # Совпадение через границу полей - не вхождение
+                pos = buffer.find(term, pos + 1, hi)
+        result.append(counts)
+    return result
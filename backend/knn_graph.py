@@ -0,0 +1,175 @@
+"""
+Граф ближайших соседей кейсов.
+
+Для каждого кейса и каждого поля с эмбеддингами хранится список K
+ближайших кейсов (номера строк и оценки) - prepare_data.py считает его
+при подготовке данных, сервер читает строку матрицы вместо перебора
+всего индекса (страница решения, "похожие решения").
+
+Оценка соседа j для кейса i - как в semantic_search с вектором кейса
+в роли запроса: dot(E[j], E[i] / |E[i]|). Сам кейс и строки без
+эмбеддинга (маска валидности) в списки не входят; недостающие места
+заполняются номером -1.
+
+Сходства считаются блоками строк: в памяти одновременно только блок
+block_rows x N, размер блока подбирается по KNN_MEMORY_MB.
+"""
+
+from pathlib import Path
+from typing import Callable, Dict, Sequence, Tuple
+
+import numpy as np
+
+# Поля, для которых строится граф (те же, что в prepare_data.EMBEDDING_FIELDS)
+KNN_FIELDS = ("FAS_arguments", "violation_summary", "ad_description")
+
+MISSING = -1
+
+
+def knn_ids_file(field_name: str) -> str:
+    return f"knn_{field_name}_ids.npy"
+
+
+def knn_scores_file(field_name: str) -> str:
+    return f"knn_{field_name}_scores.npy"
+
+
+KNN_FILES = [name for field_name in KNN_FIELDS for name in (knn_ids_file(field_name), knn_scores_file(field_name))]
+
+
+def block_rows_for(n_columns: int, memory_mb: float) -> int:
+    """Число строк блока, при котором матрица сходств блока (float32) укладывается в memory_mb."""
+    return max(1, int(memory_mb * 1024 * 1024) // (4 * max(n_columns, 1)))
+
+
+def _prepare(embeddings: np.ndarray, valid: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Матрица в float32 (невалидные строки обнулены) и её нормированная копия."""
+    matrix = np.asarray(embeddings, dtype=np.float32).copy()
+    matrix[~valid] = 0
+    norms = np.linalg.norm(matrix, axis=1)
+    normalized = np.divide(matrix, norms[:, None], out=np.zeros_like(matrix), where=norms[:, None] != 0)
+    return matrix, normalized
+
+
+def _top_k(similarities: np.ndarray, column_ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Лучшие k столбцов каждой строки блока: (номера, оценки) по убыванию оценки,
+    при равенстве - по номеру. column_ids - номера столбцов (общие или свои
+    для каждой строки). Столбцы с -inf заменяются на MISSING.
+    """
+    rows, columns = similarities.shape
+    ids = np.full((rows, k), MISSING, dtype=np.int32)
+    scores = np.zeros((rows, k), dtype=np.float32)
+    if columns == 0 or k == 0:
+        return ids, scores
+    take = min(k, columns)
+    if take < columns:
+        part = np.argpartition(-similarities, take - 1, axis=1)[:, :take]
+    else:
+        part = np.broadcast_to(np.arange(columns), (rows, columns))
+    part_scores = np.take_along_axis(similarities, part, axis=1)
+    part_ids = column_ids[part] if column_ids.ndim == 1 else np.take_along_axis(column_ids, part, axis=1)
+    order = np.lexsort((part_ids, -part_scores), axis=1)
+    part_ids = np.take_along_axis(part_ids, order, axis=1)
+    part_scores = np.take_along_axis(part_scores, order, axis=1)
+    found = np.isfinite(part_scores)
+    ids[:, :take] = np.where(found, part_ids, MISSING)
+    scores[:, :take] = np.where(found, part_scores, 0)
+    return ids, scores
+
+
+def _neighbours(rows: np.ndarray, matrix: np.ndarray, normalized: np.ndarray, valid: np.ndarray,
+                columns: np.ndarray, k: int, block_rows: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Лучшие k среди columns (отсортированных) для каждой строки rows
+    без самой строки и невалидных столбцов.
+    """
+    ids = np.full((len(rows), k), MISSING, dtype=np.int32)
+    scores = np.zeros((len(rows), k), dtype=np.float32)
+    if len(columns) == 0:
+        return ids, scores
+    # columns без повторов: полный набор - сама матрица, без копии
+    column_matrix = matrix if len(columns) == len(matrix) else matrix[columns]
+    column_invalid = ~valid[columns]
+    for start in range(0, len(rows), block_rows):
+        block = rows[start:start + block_rows]
+        similarities = normalized[block] @ column_matrix.T
+        similarities[:, column_invalid] = -np.inf
+        similarities[~valid[block]] = -np.inf
+        # Сам кейс - не сосед (columns отсортированы)
+        positions = np.minimum(np.searchsorted(columns, block), len(columns) - 1)
+        own = columns[positions] == block
+        similarities[np.flatnonzero(own), positions[own]] = -np.inf
+        ids[start:start + len(block)], scores[start:start + len(block)] = _top_k(similarities, columns, k)
+    return ids, scores
+
+
+def build_knn(embeddings: np.ndarray, valid: np.ndarray, k: int, block_rows: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Полный граф: (ids int32 [N, k], scores float32 [N, k])."""
+    matrix, normalized = _prepare(embeddings, valid)
+    everything = np.arange(len(matrix))
+    return _neighbours(everything, matrix, normalized, valid, everything, k, block_rows)
+
+
+def update_knn(embeddings: np.ndarray, valid: np.ndarray, old_ids: np.ndarray, old_scores: np.ndarray,
+               changed_rows: Sequence[int], k: int, block_rows: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Инкрементальное обновление графа, построенного для первых len(old_ids) строк.
+    changed_rows - строки, которых не было в старом графе: дописанные в конец
+    и те, у которых раньше не было эмбеддинга. Остальные строки должны быть
+    неизменны. Списки changed_rows считаются заново против всех строк;
+    у остальных строк к старому списку добавляются кандидаты из changed_rows.
+    """
+    matrix, normalized = _prepare(embeddings, valid)
+    n = len(matrix)
+    old_n = len(old_ids)
+    changed = np.union1d(np.asarray(changed_rows, dtype=np.int64), np.arange(old_n, n))
+
+    ids = np.full((n, k), MISSING, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    ids[:old_n] = old_ids
+    scores[:old_n] = old_scores
+    if len(changed) == 0:
+        return ids, scores
+
+    ids[changed], scores[changed] = _neighbours(changed, matrix, normalized, valid, np.arange(n), k, block_rows)
+
+    rest = np.setdiff1d(np.arange(old_n), changed)
+    new_ids, new_scores = _neighbours(rest, matrix, normalized, valid, changed, k, block_rows)
+    merged_ids = np.concatenate([ids[rest], new_ids], axis=1)
+    merged_scores = np.concatenate([scores[rest], new_scores], axis=1)
+    merged_scores = np.where(merged_ids == MISSING, -np.inf, merged_scores)
+    ids[rest], scores[rest] = _top_k(merged_scores, merged_ids, k)
+    return ids, scores
+
+
+def load_knn_graph(data_dir: Path, total_cases: int, mmap: bool = False) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Графы полей из data_dir: {поле: (ids, scores)}, только согласованные
+    с числом кейсов. Матрицы - только для чтения (при mmap - отображение файла).
+    """
+    graph = {}
+    for field_name in KNN_FIELDS:
+        ids_path = data_dir / knn_ids_file(field_name)
+        scores_path = data_dir / knn_scores_file(field_name)
+        if not ids_path.exists() or not scores_path.exists():
+            continue
+        ids = np.load(ids_path, mmap_mode="r" if mmap else None)
+        scores = np.load(scores_path, mmap_mode="r" if mmap else None)
+        if ids.shape != scores.shape or ids.ndim != 2 or ids.shape[0] != total_cases:
+            print(f"  ВНИМАНИЕ: граф соседей {field_name} не согласован с кейсами ({ids.shape}), пропуск")
+            continue
+        ids.flags.writeable = False
+        scores.flags.writeable = False
+        graph[field_name] = (ids, scores)
+    if graph:
+        k = next(iter(graph.values()))[0].shape[1]
+        print(f"  Граф соседей: поля {', '.join(graph)}, K={k}{' (mmap)' if mmap else ''}")
+    return graph
+
+
+def save_knn_graph(data_dir: Path, field_name: str, ids: np.ndarray, scores: np.ndarray,
+                   save_npy: Callable[[Path, np.ndarray], None]):
+    """Сохранить граф поля (save_npy - атомарная запись, см. prepare_data.save_npy_atomic)."""
+    save_npy(data_dir / knn_ids_file(field_name), ids)
+    save_npy(data_dir / knn_scores_file(field_name), scores)
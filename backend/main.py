@@ -8,27 +8,56 @@ FastAPI сервер для гибридного поиска по решени
 Поддержка развертывания:
 - При наличии переменной DATA_DIR - ищет файлы там (для Render)
 - Иначе использует локальную папку data/
-- При первом запуске копирует файлы из репозитория в DATA_DIR если нужно
+- При первом запуске связывает файлы из репозитория с DATA_DIR (symlink) если нужно
+
+Запуск поэтапный и не блокирует сервер: загрузка данных, настройка Gemini
+и прогрев идут в фоне, готовность отражает /api/ready.
 """
 
 import json
+import multiprocessing
 import re
+import secrets
 import shutil
+import signal
+import threading
+import time
 import os
 import numpy as np
+from datetime import date
 from pathlib import Path
-from typing import Optional, List, Dict
-
-from fastapi import FastAPI, HTTPException
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Tuple
+
+from fastapi import FastAPI, HTTPException, Header, Depends, Query, Response, UploadFile, File, Form
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 
-# Новый SDK google-genai
-from google import genai
-from google.genai import types
-
 from config import Config
 from industry_mapping import INDUSTRY_HIERARCHY, expand_filter_categories
+from search_cache import SearchResultCache, make_cache_key, normalize_query
+from stage_timer import StageTimer
+from query_log import QueryLog
+from event_log import EventLog
+import metrics
+from profiling import PROFILE_MODES, StackSampler, profile_call, save_profile
+from memory_usage import array_info, deep_sizeof, mapped_files, process_memory
+from shard_coordinator import ShardCoordinator, ShardError
+from keyword_index import KeywordIndex
+from near_duplicates import collapse_duplicates
+from suggest_index import MAX_SUGGESTIONS, SuggestIndex
+from tag_index import TAG_MODES, TagIndex
+from date_index import DateIndex, format_day, parse_day
+from bulk_jobs import RESULT_CASE_FIELDS, RESULT_FORMATS, BulkJobStore, BulkJobWorker, read_csv_texts, stream_results
+from embedding_pipeline import TokenBucket
+from index_snapshot import (
+    IndexSnapshot, SnapshotWatcher, INDEX_FILES,
+    load_snapshot, validate_snapshot, compute_data_version,
+)
 
 # Конфигурация
 BASE_DIR = Path(__file__).parent
@@ -36,12 +65,6 @@ BASE_DIR = Path(__file__).parent
 # Используем Config.get_data_dir() для поддержки DATA_DIR
 DATA_DIR = Config.get_data_dir()
 
-# Пути к файлам эмбеддингов (по новой архитектуре)
-EMBEDDINGS_FAS_ARGS_PATH = DATA_DIR / "embeddings_FAS_arguments.npy"
-EMBEDDINGS_VIOLATION_PATH = DATA_DIR / "embeddings_violation_summary.npy"
-EMBEDDINGS_AD_DESC_PATH = DATA_DIR / "embeddings_ad_description.npy"
-CASES_PATH = DATA_DIR / "cases.json"
-
 # Путь к исходным файлам в репозитории (для копирования при первом запуске)
 REPO_DATA_DIR = BASE_DIR / "data"
 
@@ -60,6 +83,17 @@ FIELD_WEIGHTS = {
 # Количество кандидатов для первичного отбора
 SEARCH_TOP_CANDIDATES = 100
 
+# Количество результатов по умолчанию (как в SearchRequest)
+DEFAULT_TOP_K = 20
+
+# Параметры объединения семантического и keyword поиска
+SEMANTIC_WEIGHT = 0.7
+KEYWORD_WEIGHT = 0.3
+KEYWORD_TOP_K = 50
+
+# Поля keyword-поиска
+KEYWORD_SEARCH_FIELDS = ['violation_summary', 'ad_description', 'FAS_arguments', 'ad_content_cited', 'legal_provisions']
+
 # Иерархия регионов по федеральным округам
 REGION_HIERARCHY = {
     "1. Центральный федеральный округ": [
@@ -142,6 +176,9 @@ def get_embedding(text: str, task_type: str = "retrieval_query") -> Optional[np.
     if not text or not text.strip():
         return np.zeros(EMBEDDING_DIMENSION)
     
+    # Импорт ленивый: google.genai уже загружен в configure_gemini()
+    from google.genai import types
+    
     # task_type это просто строка в новом SDK
     try:
         result = Config._genai_client.models.embed_content(
@@ -155,35 +192,179 @@ def get_embedding(text: str, task_type: str = "retrieval_query") -> Optional[np.
         return np.array(result.embeddings[0].values)
     except Exception as e:
         error_msg = str(e)
-        if "quota" in error_msg.lower() or "exceeded" in error_msg.lower():
+        kind = gemini_error_kind(error_msg)
+        if kind == "quota":
             print(f"⚠️ Квота Gemini API исчерпана!")
-        elif "location" in error_msg.lower() or "not supported" in error_msg.lower():
+        elif kind == "location":
             print(f"⚠️ Gemini API недоступен в вашем регионе!")
         else:
             print(f"Ошибка Gemini: {error_msg[:80]}...")
+        GEMINI_ERRORS.inc(kind=kind)
+        event_log.event("gemini_error", level="error", kind=kind, detail=error_msg[:200])
         return None
 
 
+def gemini_error_kind(error_msg: str) -> str:
+    """Тип ошибки Gemini для метрик: quota, location или other."""
+    if "quota" in error_msg.lower() or "exceeded" in error_msg.lower():
+        return "quota"
+    if "location" in error_msg.lower() or "not supported" in error_msg.lower():
+        return "location"
+    return "other"
+
+
+def get_embeddings_batch(texts: List[str], task_type: str = "retrieval_query") -> np.ndarray:
+    """
+    Эмбеддинги батча текстов одним запросом к Gemini (задания /api/jobs).
+    Пустые тексты - нулевые векторы. Ошибки API пробрасываются: повторами
+    управляет воркер заданий.
+    """
+    from google.genai import types
+    
+    embeddings = np.zeros((len(texts), EMBEDDING_DIMENSION))
+    rows = [i for i, text in enumerate(texts) if text and text.strip()]
+    if not rows:
+        return embeddings
+    GEMINI_REQUESTS.inc()
+    try:
+        result = Config._genai_client.models.embed_content(
+            model=MODEL_NAME,
+            contents=[texts[i] for i in rows],
+            config=types.EmbedContentConfig(
+                task_type=task_type,
+                output_dimensionality=EMBEDDING_DIMENSION
+            )
+        )
+    except Exception as e:
+        GEMINI_ERRORS.inc(kind=gemini_error_kind(str(e)))
+        raise
+    for i, embedding in zip(rows, result.embeddings):
+        embeddings[i] = embedding.values
+    return embeddings
+
+
 # Глобальные переменные
 api_configured: bool = False
 use_gemini: bool = True  # Флаг - использовать Gemini или локальные эмбеддинги
 
-# Эмбеддинги для полей
-embeddings_fas_args: Optional[np.ndarray] = None
-embeddings_violation: Optional[np.ndarray] = None
-embeddings_ad_desc: Optional[np.ndarray] = None
+# Текущий снимок индекса (эмбеддинги полей + кейсы).
+# Подменяется целиком при перезагрузке - см. reload_index()
+snapshot: IndexSnapshot = IndexSnapshot(version="")
+_reload_lock = threading.Lock()
+_snapshot_watcher: Optional[SnapshotWatcher] = None
+
+# serve.py: снимок держит и перезагружает родительский процесс (pid), воркеры
+# только передают ему /api/admin/reload сигналом. None - процесс сам владеет снимком
+index_owner_pid: Optional[int] = None
+RELOAD_SIGNAL = signal.SIGHUP
+RELOAD_FORCE_SIGNAL = signal.SIGUSR1
+
+# Состояние поэтапного запуска (для /api/ready).
+# Этапы: starting -> loading_data -> configuring_gemini -> warmup -> ready (или failed)
+startup_state = {
+    "stage": "starting",
+    "ready": False,
+    "error": None,
+    "started_at": time.time(),
+    "ready_at": None,
+    "stage_seconds": {},
+}
 
-cases: Optional[list[dict]] = None
+# Кэш итоговых результатов поиска
+search_cache = SearchResultCache(
+    max_size=Config.SEARCH_CACHE_SIZE,
+    shared_path=DATA_DIR / "search_cache.sqlite3" if Config.SEARCH_CACHE_SHARED else None
+)
+
+# Журнал запросов /api/search (QUERY_LOG=true)
+query_log: Optional[QueryLog] = (
+    QueryLog(Path(Config.QUERY_LOG_PATH) if Config.QUERY_LOG_PATH else DATA_DIR / "query_log.jsonl")
+    if Config.QUERY_LOG else None
+)
+
+# Журнал событий (stdout, выборочно) и метрики Prometheus (/metrics)
+event_log = EventLog(sample_rate=Config.SEARCH_LOG_SAMPLE_RATE)
+
+METRICS = metrics.Registry()
+SEARCH_REQUESTS = METRICS.counter(
+    "fas_search_requests_total", "Запросы /api/search по результату обращения к кэшу", ["cache"])
+SEARCH_DURATION = METRICS.histogram(
+    "fas_search_duration_seconds", "Полное время обработки /api/search")
+SEARCH_STAGE_DURATION = METRICS.histogram(
+    "fas_search_stage_duration_seconds", "Время стадий /api/search", ["stage"])
+SEARCH_CANDIDATES = METRICS.histogram(
+    "fas_search_candidates", "Число кандидатов после стадий поиска", ["stage"], buckets=metrics.COUNT_BUCKETS)
+FILTER_SELECTIVITY = METRICS.histogram(
+    "fas_search_filter_selectivity", "Доля кандидатов, прошедших фильтры", ["filters"],
+    buckets=metrics.RATIO_BUCKETS)
+GEMINI_REQUESTS = METRICS.counter(
+    "fas_gemini_embedding_requests_total", "Запросы эмбеддингов к Gemini API")
+GEMINI_ERRORS = METRICS.counter(
+    "fas_gemini_embedding_errors_total", "Ошибки Gemini API по типу", ["kind"])
+BULK_ROWS = METRICS.counter(
+    "fas_bulk_rows_total", "Строки заданий /api/jobs, обработанные воркером")
+INDEX_CASES = METRICS.gauge(
+    "fas_index_cases", "Число кейсов в текущем снимке индекса")
+SEARCH_CACHE_ENTRIES = METRICS.gauge(
+    "fas_search_cache_entries", "Записей в кэше результатов процесса")
+# Режим координатора: индекс разбит на шарды (shard_index.py), каждый обслуживает
+# свой процесс (shard_server.py); локальный снимок не загружается
+shard_coordinator: Optional[ShardCoordinator] = (
+    ShardCoordinator([url.strip() for url in Config.SHARD_URLS.split(",") if url.strip()],
+                     timeout=Config.SHARD_TIMEOUT)
+    if Config.SHARD_URLS else None
+)
+
+# Профили запросов (X-Profile) и фоновая выборка стеков (/api/admin/sampler)
+PROFILE_DIR = Path(Config.PROFILE_DIR) if Config.PROFILE_DIR else DATA_DIR / "profiles"
+stack_sampler = StackSampler(interval=Config.SAMPLER_INTERVAL_MS / 1000)
+
+metrics_dir: Optional[metrics.MetricsDirectory] = (
+    metrics.MetricsDirectory(METRICS, Path(Config.METRICS_DIR)) if Config.METRICS_DIR else None
+)
+
+# Пул процессов keyword-поиска (SEARCH_PROCESSES > 0). Создаётся при первом
+# запросе в каждом воркере; процессы запускаются через spawn (fork процесса
+# с потоками uvicorn небезопасен) и читают индекс из разделяемой памяти
+_search_pool: Optional[ProcessPoolExecutor] = None
+_search_pool_pid: Optional[int] = None
+_search_pool_lock = threading.Lock()
+_derived_lock = threading.Lock()
+
+# Задания массовой проверки (/api/jobs): очередь в SQLite, фоновый поток воркера.
+# Интерактивные запросы учитываются, чтобы задания ждали их завершения
+_bulk_store: Optional[BulkJobStore] = None
+bulk_worker: Optional[BulkJobWorker] = None
+bulk_embedding_limiter = TokenBucket(Config.BULK_EMBEDDING_RPM)
+_interactive_requests = 0
+_interactive_lock = threading.Lock()
+
+
+# Допустимые значения tags_mode (any, all)
+TAG_MODES_PATTERN = f"^({'|'.join(TAG_MODES)})$"
 
 
 # Pydantic модели
 class SearchRequest(BaseModel):
     query: str = Field(..., min_length=1, max_length=5000, description="Поисковый запрос")
-    top_k: int = Field(default=20, ge=1, le=50, description="Количество результатов")
+    top_k: int = Field(default=DEFAULT_TOP_K, ge=1, le=50, description="Количество результатов")
     year: Optional[List[int]] = Field(default=None, description="Фильтр по году")
     region: Optional[List[str]] = Field(default=None, description="Фильтр по региону")
     industry: Optional[List[str]] = Field(default=None, description="Фильтр по отрасли")
     article: Optional[List[str]] = Field(default=None, description="Фильтр по статье закона")
+    tags: Optional[List[str]] = Field(default=None, description="Фильтр по тематическим тегам")
+    tags_mode: str = Field(default="any", pattern=TAG_MODES_PATTERN,
+                           description="any - хотя бы один из тегов, all - все теги")
+    date_from: Optional[date] = Field(default=None, description="Дата решения не раньше (YYYY-MM-DD)")
+    date_to: Optional[date] = Field(default=None, description="Дата решения не позже (YYYY-MM-DD)")
+    collapse_duplicates: bool = Field(
+        default=False, description="Оставить из каждого кластера почти одинаковых решений лучший результат"
+    )
+
+
+# Фильтры SearchRequest - все поля, кроме запроса и параметров выдачи
+# (их же принимают задания /api/jobs)
+SEARCH_FILTER_FIELDS = frozenset(SearchRequest.model_fields) - {"query", "top_k", "collapse_duplicates"}
 
 
 class CaseResult(BaseModel):
@@ -248,6 +429,24 @@ class ArticleGroup(BaseModel):
     parts: List[ArticlePart] = []
 
 
+class TagOption(BaseModel):
+    """Тематический тег"""
+    name: str
+    count: int
+
+
+class Suggestion(BaseModel):
+    text: str
+    kind: str  # tag, violation_type, article, industry, defendant
+    count: int  # Число дел с этим значением
+
+
+class SuggestResponse(BaseModel):
+    query: str
+    replace_words: int  # Сколько последних слов запроса заменяет подсказка
+    suggestions: List[Suggestion]
+
+
 class FilterOptions(BaseModel):
     years: List[int]
     regions: List[str]
@@ -256,6 +455,9 @@ class FilterOptions(BaseModel):
     industry_groups: List[IndustryGroup] = []  # Иерархия отраслей
     articles: List[str]
     article_groups: List[ArticleGroup] = []  # Иерархия статей
+    tags: List[TagOption] = []  # Тематические теги с числом дел
+    date_min: Optional[str] = None  # Самая ранняя дата решения
+    date_max: Optional[str] = None  # Самая поздняя дата решения
 
 
 # FastAPI приложение
@@ -283,15 +485,21 @@ def configure_gemini():
     """Настройка Gemini API."""
     global api_configured
     api_key = Config.get_api_key()
-    Config._genai_client = genai.Client(api_key=api_key)
+    # Клиент google-genai (SDK импортируется внутри create_genai_client)
+    Config._genai_client = Config.create_genai_client()
     api_configured = True
     print(f"Gemini API настроен с ключом: {api_key[:10]}...")
+    if Config.GEMINI_BASE_URL:
+        print(f"Адрес Gemini API: {Config.GEMINI_BASE_URL}")
 
 
 def init_data_dir():
     """
     Инициализация директории данных.
-    Если DATA_DIR отличается от REPO_DATA_DIR и файлов там нет - копирует из репозитория.
+    Если DATA_DIR отличается от REPO_DATA_DIR и файлов там нет - создаёт
+    в DATA_DIR символические ссылки на файлы репозитория. Копирование
+    сотен мегабайт при холодном старте не нужно: файлы всё равно
+    отображаются в память (INDEX_MMAP). Если ссылку создать нельзя - копирует.
     """
     # Проверяем, нужно ли копирование
     if DATA_DIR == REPO_DATA_DIR:
@@ -301,12 +509,7 @@ def init_data_dir():
     DATA_DIR.mkdir(parents=True, exist_ok=True)
     
     # Проверяем, есть ли уже файлы в DATA_DIR
-    required_files = [
-        "embeddings_FAS_arguments.npy",
-        "embeddings_violation_summary.npy", 
-        "embeddings_ad_description.npy",
-        "cases.json"
-    ]
+    required_files = INDEX_FILES
     
     all_files_exist = all((DATA_DIR / f).exists() for f in required_files)
     
@@ -314,63 +517,128 @@ def init_data_dir():
         print(f"Данные уже есть в {DATA_DIR}")
         return
     
-    # Копируем файлы из репозитория
-    print(f"Инициализация данных: копирование из {REPO_DATA_DIR} в {DATA_DIR}")
+    # Связываем файлы из репозитория
+    print(f"Инициализация данных: {REPO_DATA_DIR} -> {DATA_DIR}")
     for filename in required_files:
         src = REPO_DATA_DIR / filename
         dst = DATA_DIR / filename
         if src.exists():
-            shutil.copy2(src, dst)
-            print(f"  Скопирован: {filename}")
+            if dst.exists() or dst.is_symlink():
+                dst.unlink()
+            try:
+                os.symlink(src.resolve(), dst)
+                print(f"  Связан: {filename}")
+            except OSError:
+                shutil.copy2(src, dst)
+                print(f"  Скопирован: {filename}")
         else:
             print(f"  ВНИМАНИЕ: Файл {filename} не найден в репозитории!")
 
 
+def swap_snapshot(new_snapshot: IndexSnapshot):
+    """Атомарно подменить снимок индекса и сбросить кэш результатов."""
+    global snapshot
+    search_cache.set_data_version(new_snapshot.version)
+    snapshot = new_snapshot
+    INDEX_CASES.set(new_snapshot.total_cases)
+    print(f"  Версия данных: {new_snapshot.version}")
+
+
+def reload_index(force: bool = False) -> dict:
+    """
+    Перезагрузка индекса без остановки сервиса.
+    Новый снимок собирается рядом со старым и подменяется только
+    если он согласован; иначе продолжаем работать на старом.
+    """
+    if not _reload_lock.acquire(blocking=False):
+        return {"status": "in_progress", "version": snapshot.version}
+    try:
+        version = compute_data_version(DATA_DIR)
+        if not force and version == snapshot.version:
+            return {"status": "unchanged", "version": version}
+        
+        new_snapshot = load_snapshot(DATA_DIR, mmap=Config.INDEX_MMAP)
+        problem = validate_snapshot(new_snapshot)
+        if problem:
+            print(f"⚠️ Новый снимок индекса отклонён: {problem}")
+            return {"status": "rejected", "version": snapshot.version, "detail": problem}
+        
+        # Прогреваем новый снимок до подмены - первые запросы после неё не медленнее обычных
+        warmup_snapshot(new_snapshot)
+        
+        old_version = snapshot.version
+        swap_snapshot(new_snapshot)
+        return {"status": "reloaded", "previous_version": old_version, "version": new_snapshot.version}
+    finally:
+        _reload_lock.release()
+
+
+def check_startup_snapshot(snap: IndexSnapshot):
+    """
+    Проверка снимка при запуске - как при перезагрузке (validate_snapshot).
+    Несогласованный снимок (число строк эмбеддингов не совпадает с cases.json)
+    не подменяется: запуск завершается ошибкой. Пустой снимок (данных ещё нет)
+    допустим - его заменит перезагрузка, когда файлы появятся.
+    """
+    problem = validate_snapshot(snap) if snap.is_ready else None
+    if problem:
+        raise RuntimeError(f"Снимок индекса в {DATA_DIR} не согласован: {problem}")
+
+
+def preload_index():
+    """
+    Загрузить снимок индекса без настройки Gemini и фоновых потоков.
+    Используется serve.py в родительском процессе до форка воркеров:
+    воркеры получают уже загруженный индекс в общих страницах памяти.
+    В режиме координатора (SHARD_URLS) индекс держат шарды - загружать нечего.
+    """
+    if shard_coordinator is not None:
+        return
+    init_data_dir()
+    print(f"Директория данных: {DATA_DIR}")
+    new_snapshot = load_snapshot(DATA_DIR, mmap=Config.INDEX_MMAP)
+    check_startup_snapshot(new_snapshot)
+    swap_snapshot(new_snapshot)
+    # Производные структуры снимка тоже создаются до fork и разделяются воркерами
+    warmup_snapshot(snapshot)
+    # Пул процессов, запущенный прогревом, воркерам не достаётся - у каждого свой
+    shutdown_search_pool()
+
+
 def load_data():
     """Загрузка всех данных при старте."""
-    global embeddings_fas_args, embeddings_violation, embeddings_ad_desc, cases, use_gemini
+    global use_gemini
     
     print("=" * 50)
     print("ЗАГРУЗКА ДАННЫХ")
     print("=" * 50)
     
-    # Инициализируем директорию данных (копируем файлы если нужно)
-    init_data_dir()
-    
-    print(f"Директория данных: {DATA_DIR}")
+    # Эмбеддинги полей и кейсы - одним снимком.
+    # Если индекс уже предзагружен родительским процессом (serve.py) - не грузим повторно
+    _set_startup_stage("loading_data")
+    if shard_coordinator is not None:
+        print(f"Режим координатора, шарды: {', '.join(shard_coordinator.urls)}")
+        for state in shard_coordinator.wait_ready():
+            print(f"  {state['name']}: {state['total_cases']} кейсов, версия {state['version']}")
+        search_cache.set_data_version(shard_coordinator.version)
+    elif snapshot.is_ready:
+        print(f"Индекс предзагружен родительским процессом: {snapshot.total_cases} кейсов")
+    else:
+        # Инициализируем директорию данных (связываем файлы если нужно)
+        init_data_dir()
+        print(f"Директория данных: {DATA_DIR}")
+        new_snapshot = load_snapshot(DATA_DIR, mmap=Config.INDEX_MMAP)
+        check_startup_snapshot(new_snapshot)
+        swap_snapshot(new_snapshot)
     
     # Пробуем настроить Gemini API
+    _set_startup_stage("configuring_gemini")
     try:
         configure_gemini()
     except Exception as e:
         print(f"Не удалось настроить Gemini: {e}")
         use_gemini = False
     
-    # Эмбеддинги FAS_arguments (для первичного поиска)
-    if EMBEDDINGS_FAS_ARGS_PATH.exists():
-        embeddings_fas_args = np.load(EMBEDDINGS_FAS_ARGS_PATH)
-        print(f"  FAS_arguments эмбеддинги (первичный поиск): {embeddings_fas_args.shape}")
-    else:
-        print(f"  ВНИМАНИЕ: Файл {EMBEDDINGS_FAS_ARGS_PATH} не найден!")
-    
-    # Эмбеддинги violation_summary (для переранжирования)
-    if EMBEDDINGS_VIOLATION_PATH.exists():
-        embeddings_violation = np.load(EMBEDDINGS_VIOLATION_PATH)
-        print(f"  violation_summary эмбеддинги: {embeddings_violation.shape}")
-    
-    # Эмбеддинги ad_description (для переранжирования)
-    if EMBEDDINGS_AD_DESC_PATH.exists():
-        embeddings_ad_desc = np.load(EMBEDDINGS_AD_DESC_PATH)
-        print(f"  ad_description эмбеддинги: {embeddings_ad_desc.shape}")
-    
-    # Загрузка кейсов
-    if CASES_PATH.exists():
-        with open(CASES_PATH, "r", encoding="utf-8") as f:
-            cases = json.load(f)
-        print(f"  Кейсов загружено: {len(cases)}")
-    else:
-        print(f"  ВНИМАНИЕ: Файл {CASES_PATH} не найден!")
-    
     print("=" * 50)
     if use_gemini:
         print(f"Режим: Gemini API (gemini-embedding-001)")
@@ -380,34 +648,125 @@ def load_data():
     print("=" * 50)
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Загрузка данных при старте."""
+def _set_startup_stage(stage: str):
+    """Перейти к следующему этапу запуска, записав длительность предыдущего."""
+    now = time.time()
+    previous = startup_state["stage"]
+    started = startup_state.get("_stage_started_at", startup_state["started_at"])
+    startup_state["stage_seconds"][previous] = round(now - started, 3)
+    startup_state["_stage_started_at"] = now
+    startup_state["stage"] = stage
+
+
+def run_startup():
+    """
+    Поэтапный запуск в фоновом потоке:
+    данные -> Gemini -> прогрев -> готовность.
+    До завершения /api/ready отвечает 503, /api/health - ok.
+    """
+    global _snapshot_watcher
     try:
         load_data()
+        
+        _set_startup_stage("warmup")
+        warmup_snapshot(snapshot)
+        
+        # Фоновое слежение за обновлением файлов в DATA_DIR (в режиме координатора данные у шардов)
+        if Config.INDEX_RELOAD_INTERVAL > 0 and _snapshot_watcher is None and shard_coordinator is None:
+            _snapshot_watcher = SnapshotWatcher(
+                DATA_DIR,
+                get_version=lambda: snapshot.version,
+                reload=reload_index,
+                interval=Config.INDEX_RELOAD_INTERVAL
+            )
+            _snapshot_watcher.start()
+        
+        _set_startup_stage("ready")
+        startup_state["ready"] = snapshot.is_ready or shard_coordinator is not None
+        startup_state["ready_at"] = time.time()
+        total = startup_state["ready_at"] - startup_state["started_at"]
+        print(f"Сервер готов за {total:.2f} с: {startup_state['stage_seconds']}")
     except Exception as e:
         print(f"ОШИБКА ЗАГРУЗКИ: {e}")
-        raise
+        startup_state["error"] = str(e)
+        _set_startup_stage("failed")
+
 
+@app.on_event("startup")
+async def startup_event():
+    """
+    Запуск загрузки данных в фоне - сервер сразу принимает соединения.
+    Воркер serve.py выполняет run_startup до начала приёма соединений.
+    """
+    if startup_state["stage"] == "starting":
+        threading.Thread(target=run_startup, name="startup", daemon=True).start()
+    if metrics_dir is not None:
+        metrics_dir.ensure_started()
+    if Config.SAMPLER_ENABLED:
+        stack_sampler.start()
+    # Без ADMIN_TOKEN эндпоинты заданий отключены - обрабатывать нечего
+    if Config.BULK_JOBS_ENABLED and Config.ADMIN_TOKEN:
+        start_bulk_worker()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Дописать журнал запросов перед остановкой."""
+    if query_log is not None:
+        query_log.close()
+    event_log.close()
+    shutdown_search_pool()
+    if bulk_worker is not None:
+        bulk_worker.stop()
+
+
+def parse_list_field(raw) -> list:
+    """
+    Значение поля-списка кейса (legal_provisions, thematic_tags).
+    В CSV это строка вида "['п. 1 ч. 2 ст. 5', ...]"; если она не
+    разбирается как JSON-массив - одно значение целиком.
+    """
+    if isinstance(raw, str):
+        try:
+            # Пробуем распарсить как JSON массив
+            return json.loads(raw.replace("'", '"'))
+        except:
+            # Если не парсится, используем как есть
+            return [raw]
+    elif isinstance(raw, list):
+        return raw
+    else:
+        return [str(raw)]
 
-def apply_filters(candidates: List[tuple], filters: dict) -> List[tuple]:
+
+def apply_filters(candidates: List[tuple], filters: dict, snap: IndexSnapshot) -> List[tuple]:
     """Применение фильтров к результатам поиска."""
-    if not filters or not cases:
+    if not filters or not snap.cases:
         return candidates
     
+    if filters.get('tags') and candidates:
+        # Теги - по битовым множествам индекса тегов, без разбора строк
+        tag_index = get_tag_index(snap)
+        mode = "all" if filters.get('tags_mode') == "all" else "any"
+        passed = TagIndex.contains(tag_index.mask(filters['tags'], mode), [idx for idx, _ in candidates])
+        candidates = [candidate for candidate, ok in zip(candidates, passed) if ok]
+    
+    if (filters.get('year') or filters.get('date_from') or filters.get('date_to')) and candidates:
+        # Год и диапазон дат - по индексу дат (даты разобраны при загрузке снимка)
+        date_index = get_date_index(snap)
+        ids = [idx for idx, _ in candidates]
+        passed = np.ones(len(ids), dtype=bool)
+        if filters.get('year'):
+            passed &= date_index.in_years(ids, filters['year'])
+        if filters.get('date_from') or filters.get('date_to'):
+            day_from = parse_day(filters['date_from']) if filters.get('date_from') else None
+            day_to = parse_day(filters['date_to']) if filters.get('date_to') else None
+            passed &= date_index.in_range(ids, day_from, day_to)
+        candidates = [candidate for candidate, ok in zip(candidates, passed) if ok]
+    
     filtered = []
     for idx, score in candidates:
-        case = cases[idx]
-        
-        if filters.get('year'):
-            if not case.get('document_date'):
-                continue
-            try:
-                case_year = int(case['document_date'][:4])
-                if case_year not in filters['year']:
-                    continue
-            except:
-                continue
+        case = snap.cases[idx]
         
         if filters.get('region'):
             if not case.get('FAS_division') or case['FAS_division'] not in filters['region']:
@@ -422,21 +781,7 @@ def apply_filters(candidates: List[tuple], filters: dict) -> List[tuple]:
         if filters.get('article'):
             if not case.get('legal_provisions'):
                 continue
-            legal_raw = case['legal_provisions']
-            
-            # Парсим JSON массив если это строка типа "['п. 1 ч. 2 ст. 5', ...]"
-            legal_provisions = []
-            if isinstance(legal_raw, str):
-                try:
-                    # Пробуем распарсить как JSON массив
-                    legal_provisions = json.loads(legal_raw.replace("'", '"'))
-                except:
-                    # Если не парсится, используем как есть
-                    legal_provisions = [legal_raw]
-            elif isinstance(legal_raw, list):
-                legal_provisions = legal_raw
-            else:
-                legal_provisions = [str(legal_raw)]
+            legal_provisions = parse_list_field(case['legal_provisions'])
             
             # Проверяем, есть ли в legal_provisions хотя бы один выбранный фильтр
             found = False
@@ -535,44 +880,104 @@ def apply_filters(candidates: List[tuple], filters: dict) -> List[tuple]:
     return filtered
 
 
-def keyword_search(query: str, top_k: int = 200) -> List[tuple]:
-    """Поиск по ключевым словам в текстовых полях."""
-    if not cases:
+def case_tags(case: dict) -> list:
+    """Тематические теги кейса (строки)."""
+    if not case.get('thematic_tags'):
         return []
-    
-    # Ищем в полях для переранжирования
-    search_fields = ['violation_summary', 'ad_description', 'FAS_arguments', 'ad_content_cited', 'legal_provisions']
-    
-    query_lower = query.lower()
-    query_words = set(re.findall(r'\b\w+\b', query_lower))
-    
-    scores = []
-    for idx, case in enumerate(cases):
-        score = 0
-        for field in search_fields:
-            text = case.get(field, '') or ''
-            text_lower = text.lower()
-            
-            if query_lower in text_lower:
-                score += 10
-            
-            for word in query_words:
-                if len(word) > 3 and word in text_lower:
-                    score += 1
-        
-        if score > 0:
-            scores.append((idx, score))
-    
-    scores.sort(key=lambda x: x[1], reverse=True)
-    return scores[:top_k]
+    return [tag for tag in parse_list_field(case['thematic_tags']) if isinstance(tag, str)]
+
+
+def get_tag_index(snap: IndexSnapshot) -> TagIndex:
+    """Индекс тегов снимка - теги разбираются один раз (при прогреве) и хранятся в снимке."""
+    index = snap.derived.get('tag_index')
+    if index is None:
+        with _derived_lock:
+            index = snap.derived.get('tag_index')
+            if index is None:
+                index = TagIndex([case_tags(case) for case in snap.cases])
+                snap.derived['tag_index'] = index
+    return index
+
+
+def get_date_index(snap: IndexSnapshot) -> DateIndex:
+    """Индекс дат снимка - document_date разбирается один раз (при прогреве)."""
+    index = snap.derived.get('date_index')
+    if index is None:
+        with _derived_lock:
+            index = snap.derived.get('date_index')
+            if index is None:
+                index = DateIndex([case.get('document_date') for case in snap.cases])
+                snap.derived['date_index'] = index
+    return index
+
+
+def get_search_pool() -> Optional[ProcessPoolExecutor]:
+    """Пул процессов keyword-поиска текущего процесса (None при SEARCH_PROCESSES=0)."""
+    global _search_pool, _search_pool_pid
+    if Config.SEARCH_PROCESSES <= 0:
+        return None
+    with _search_pool_lock:
+        # Пул, унаследованный через fork (serve.py), воркеру не принадлежит
+        if _search_pool is None or _search_pool_pid != os.getpid():
+            _search_pool = ProcessPoolExecutor(
+                max_workers=Config.SEARCH_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _search_pool_pid = os.getpid()
+        return _search_pool
 
 
-def semantic_search(query_embedding: np.ndarray, top_k: int) -> List[tuple]:
+def shutdown_search_pool():
+    """Остановить пул процессов keyword-поиска, созданный этим процессом."""
+    global _search_pool
+    with _search_pool_lock:
+        if _search_pool is not None and _search_pool_pid == os.getpid():
+            _search_pool.shutdown(wait=False, cancel_futures=True)
+        _search_pool = None
+
+
+def get_keyword_index(snap: IndexSnapshot) -> KeywordIndex:
+    """Индекс keyword-поиска снимка - строится один раз (при прогреве) и хранится в снимке."""
+    index = snap.derived.get('keyword_index')
+    if index is None:
+        with _derived_lock:
+            index = snap.derived.get('keyword_index')
+            if index is None:
+                index = KeywordIndex(snap.cases, KEYWORD_SEARCH_FIELDS, Config.KEYWORD_INDEX_DIR)
+                snap.derived['keyword_index'] = index
+    return index
+
+
+def keyword_search(query: str, snap: IndexSnapshot, top_k: int = 200) -> List[tuple]:
+    """
+    Поиск по ключевым словам в текстовых полях.
+    Вхождение запроса в поле +10, каждого слова длиннее 3 символов +1.
+    При SEARCH_PROCESSES > 0 части корпуса просматриваются параллельно в пуле процессов.
+    """
+    return keyword_search_batch([query], snap, top_k)[0]
+
+
+def keyword_search_batch(queries: List[str], snap: IndexSnapshot, top_k: int = 200) -> List[List[tuple]]:
+    """keyword_search для батча запросов: общие термины просматриваются один раз."""
+    if not snap.cases:
+        return [[] for _ in queries]
+    index = get_keyword_index(snap)
+    try:
+        return index.search_many(queries, top_k, get_search_pool(), Config.SEARCH_PROCESSES)
+    except BrokenProcessPool as e:
+        # Процесс пула упал - пул пересоздаётся при следующем запросе, этот выполняется в потоке
+        event_log.event("search_pool_failed", level="error", detail=str(e))
+        shutdown_search_pool()
+        return index.search_many(queries, top_k)
+
+
+def semantic_search(query_embedding: np.ndarray, top_k: int, snap: IndexSnapshot) -> List[tuple]:
     """
     Семантический поиск по косинусному сходству.
     Использует embeddings_FAS_arguments для первичного отбора.
+    Строки без эмбеддинга (маска валидности) в результат не попадают.
     """
-    if embeddings_fas_args is None:
+    if snap.embeddings_fas_args is None:
         return []
     
     # Нормализация с защитой от деления на ноль
@@ -583,23 +988,50 @@ def semantic_search(query_embedding: np.ndarray, top_k: int) -> List[tuple]:
     query_norm = query_embedding / norm
     
     # Поиск по FAS_arguments
-    similarities = np.dot(embeddings_fas_args, query_norm)
+    similarities = np.dot(snap.embeddings_fas_args, query_norm)
+    valid = snap.valid_fas_args
+    if valid is not None:
+        similarities = np.where(valid, similarities, -np.inf)
     top_indices = np.argsort(similarities)[::-1][:top_k]
-    return [(int(idx), float(similarities[idx])) for idx in top_indices]
+    return [(int(idx), float(similarities[idx])) for idx in top_indices if np.isfinite(similarities[idx])]
 
 
-def rerank_with_field_embeddings(candidates: List[tuple], query_embedding: np.ndarray, use_keyword_scores: bool = False) -> List[dict]:
+def candidate_field_scores(idx: int, query_norm: np.ndarray, snap: IndexSnapshot) -> Dict[str, float]:
     """
-    Переранжирование кандидатов с использованием эмбеддингов полей.
+    Оценки полей кандидата для переранжирования.
     FAS_arguments уже НЕ используется - он был для первичного поиска.
+    Строка без эмбеддинга по маске валидности получает 0.
     """
-    if not cases:
-        return []
-    
-    # Нормализация с защитой от деления на ноль
-    norm = np.linalg.norm(query_embedding)
-    is_zero_embedding = (norm == 0)
+    field_scores = {}
+    
+    # violation_summary - для переранжирования
+    embeddings_violation = snap.embeddings_violation
+    if embeddings_violation is not None and idx < len(embeddings_violation) and snap.valid_violation[idx]:
+        viol_emb = embeddings_violation[idx]
+        r = np.dot(query_norm, viol_emb / np.linalg.norm(viol_emb))
+        field_scores['violation_summary'] = normalize_score(r)
+    else:
+        field_scores['violation_summary'] = 0.0
+    
+    # ad_description - для переранжирования
+    embeddings_ad_desc = snap.embeddings_ad_desc
+    if embeddings_ad_desc is not None and idx < len(embeddings_ad_desc) and snap.valid_ad_desc[idx]:
+        ad_emb = embeddings_ad_desc[idx]
+        r = np.dot(query_norm, ad_emb / np.linalg.norm(ad_emb))
+        field_scores['ad_description'] = normalize_score(r)
+    else:
+        field_scores['ad_description'] = 0.0
     
+    return field_scores
+
+
+def rerank_candidates(candidates: List[tuple], is_zero_embedding: bool, use_keyword_scores: bool,
+                      get_field_scores, get_case) -> List[dict]:
+    """
+    Итоговые оценки кандидатов по оценкам полей.
+    get_field_scores(idx) и get_case(idx) дают оценки полей и данные кейса -
+    из локального снимка или из ответов шардов (см. shard_coordinator.py).
+    """
     # Если эмбеддинг нулевой и нет семантических результатов - используем только keyword scores
     if is_zero_embedding and use_keyword_scores:
         if not candidates:
@@ -611,7 +1043,6 @@ def rerank_with_field_embeddings(candidates: List[tuple], query_embedding: np.nd
         
         results = []
         for idx, keyword_score in candidates:
-            case = cases[idx]
             normalized_score = keyword_score / max_keyword_score
             
             results.append({
@@ -621,7 +1052,7 @@ def rerank_with_field_embeddings(candidates: List[tuple], query_embedding: np.nd
                 'field_scores': {
                     'keyword': normalized_score
                 },
-                'case': case
+                'case': get_case(idx)
             })
         results.sort(key=lambda x: x['score'], reverse=True)
         return results
@@ -630,49 +1061,21 @@ def rerank_with_field_embeddings(candidates: List[tuple], query_embedding: np.nd
     if is_zero_embedding:
         results = []
         for idx, base_score in candidates:
-            case = cases[idx]
             results.append({
                 'index': idx,
                 'score': 0.0,
                 'base_score': base_score,
                 'field_scores': {},
-                'case': case
+                'case': get_case(idx)
             })
         results.sort(key=lambda x: x['score'], reverse=True)
         return results
     
-    query_norm = query_embedding / norm
-    
     results = []
     max_weight_sum = sum(FIELD_WEIGHTS.values())
     
     for idx, base_score in candidates:
-        case = cases[idx]
-        field_scores = {}
-        
-        # violation_summary - для переранжирования
-        if embeddings_violation is not None and idx < len(embeddings_violation):
-            viol_emb = embeddings_violation[idx]
-            viol_norm = viol_emb / np.linalg.norm(viol_emb)
-            if np.any(viol_emb):
-                r = np.dot(query_norm, viol_norm)
-                field_scores['violation_summary'] = normalize_score(r)
-            else:
-                field_scores['violation_summary'] = 0.0
-        else:
-            field_scores['violation_summary'] = 0.0
-        
-        # ad_description - для переранжирования
-        if embeddings_ad_desc is not None and idx < len(embeddings_ad_desc):
-            ad_emb = embeddings_ad_desc[idx]
-            ad_norm = ad_emb / np.linalg.norm(ad_emb)
-            if np.any(ad_emb):
-                r = np.dot(query_norm, ad_norm)
-                field_scores['ad_description'] = normalize_score(r)
-            else:
-                field_scores['ad_description'] = 0.0
-        else:
-            field_scores['ad_description'] = 0.0
+        field_scores = get_field_scores(idx)
         
         # Взвешенная сумма (FAS_arguments уже не участвует!)
         weighted_sum = sum(
@@ -687,94 +1090,621 @@ def rerank_with_field_embeddings(candidates: List[tuple], query_embedding: np.nd
             'score': final_score,
             'base_score': base_score,
             'field_scores': field_scores,
-            'case': case
+            'case': get_case(idx)
         })
     
     results.sort(key=lambda x: x['score'], reverse=True)
     return results
 
 
-@app.post("/api/search", response_model=SearchResponse)
-async def search(request: SearchRequest):
-    """Гибридный поиск по решениям ФАС."""
-    global use_gemini, embeddings_fas_args, cases
+def rerank_with_field_embeddings(candidates: List[tuple], query_embedding: np.ndarray, snap: IndexSnapshot,
+                                 use_keyword_scores: bool = False) -> List[dict]:
+    """Переранжирование кандидатов с использованием эмбеддингов полей."""
+    if not snap.cases:
+        return []
     
-    if embeddings_fas_args is None or cases is None:
-        raise HTTPException(
-            status_code=503, 
-            detail="Сервер не готов. Данные не загружены."
-        )
+    # Нормализация с защитой от деления на ноль
+    norm = np.linalg.norm(query_embedding)
+    is_zero_embedding = (norm == 0)
+    query_norm = query_embedding / norm if not is_zero_embedding else None
     
-    filters = {}
-    if request.year:
-        filters['year'] = request.year
-    if request.region:
-        filters['region'] = request.region
-    if request.industry:
-        filters['industry'] = request.industry
-    if request.article:
-        filters['article'] = request.article
+    return rerank_candidates(
+        candidates, is_zero_embedding, use_keyword_scores,
+        get_field_scores=lambda idx: candidate_field_scores(idx, query_norm, snap),
+        get_case=lambda idx: snap.cases[idx],
+    )
+
+
+def get_ranking_config() -> dict:
+    """Параметры ранжирования, влияющие на результат (входят в ключ кэша)."""
+    return {
+        'field_weights': FIELD_WEIGHTS,
+        'top_candidates': SEARCH_TOP_CANDIDATES,
+        'semantic_weight': SEMANTIC_WEIGHT,
+        'keyword_weight': KEYWORD_WEIGHT,
+        'keyword_top_k': KEYWORD_TOP_K,
+        'embedding_model': MODEL_NAME if use_gemini else "local-embeddings",
+        'dimension': EMBEDDING_DIMENSION,
+    }
+
+
+def fuse_results(semantic_results: List[tuple], keyword_results: List[tuple]) -> List[tuple]:
+    """Взвешенное объединение семантических и keyword оценок, лучшие SEARCH_TOP_CANDIDATES."""
+    combined_scores = {}
+    for idx, score in semantic_results:
+        combined_scores[idx] = combined_scores.get(idx, 0) + score * SEMANTIC_WEIGHT
     
-    # Создаем эмбеддинг запроса
-    if use_gemini:
-        print(f"Создание эмбеддинга для запроса: {request.query[:50]}...")
-        query_embedding = get_embedding(request.query, task_type="retrieval_query")
-        
-        if query_embedding is None:
-            # Gemini недоступен - используем zero-vector
-            print("⚠️ Gemini недоступен, используем нулевой эмбеддинг")
-            query_embedding = np.zeros(EMBEDDING_DIMENSION)
-            use_gemini = False
-    else:
-        # Используем нулевой эмбеддинг - будет работать только keyword search
-        query_embedding = np.zeros(EMBEDDING_DIMENSION)
+    for idx, score in keyword_results:
+        combined_scores[idx] = combined_scores.get(idx, 0) + score * KEYWORD_WEIGHT
+    
+    return sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)[:SEARCH_TOP_CANDIDATES]
+
+
+def run_search_pipeline(query: str, query_embedding: np.ndarray, filters: dict, snap: IndexSnapshot,
+                        timer: Optional[StageTimer] = None, collapse: bool = False) -> List[dict]:
+    """
+    Все стадии поиска до формирования ответа:
+    семантический + keyword поиск, объединение, фильтры, переранжирование.
+    collapse - оставить из каждого кластера почти одинаковых решений лучший результат.
+    Если передан timer - в нём отмечаются длительности стадий и число кандидатов.
+    """
+    timer = timer or StageTimer()
     
     # Семантический поиск по FAS_arguments (первичный отбор)
-    semantic_results = semantic_search(query_embedding, SEARCH_TOP_CANDIDATES)
+    with timer.stage("semantic"):
+        semantic_results = semantic_search(query_embedding, SEARCH_TOP_CANDIDATES, snap)
     
     # Keyword search - работает всегда
-    keyword_results = keyword_search(request.query, top_k=50)
+    with timer.stage("keyword"):
+        keyword_results = keyword_search(query, snap, top_k=KEYWORD_TOP_K)
     
     # Объединение результатов
-    combined_scores = {}
-    for idx, score in semantic_results:
-        combined_scores[idx] = combined_scores.get(idx, 0) + score * 0.7
-    
-    for idx, score in keyword_results:
-        combined_scores[idx] = combined_scores.get(idx, 0) + score * 0.3
-    
-    sorted_candidates = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)[:SEARCH_TOP_CANDIDATES]
+    with timer.stage("fusion"):
+        sorted_candidates = fuse_results(semantic_results, keyword_results)
     
     # Применение фильтров
     if filters:
-        filtered_candidates = apply_filters(sorted_candidates, filters)
+        with timer.stage("filters"):
+            filtered_candidates = apply_filters(sorted_candidates, filters, snap)
     else:
         filtered_candidates = sorted_candidates
     
+    timer.count("semantic_candidates", len(semantic_results))
+    timer.count("keyword_candidates", len(keyword_results))
+    timer.count("fused_candidates", len(sorted_candidates))
+    timer.count("filtered_candidates", len(filtered_candidates))
+    
     # Определяем, использовать ли keyword scores для оценок
     use_keyword = len(semantic_results) == 0 and len(keyword_results) > 0
     
     # Переранжирование - передаем флаг use_keyword_scores
-    reranked = rerank_with_field_embeddings(filtered_candidates, query_embedding, use_keyword_scores=use_keyword)
-    final_results = reranked[:request.top_k]
+    with timer.stage("rerank"):
+        reranked = rerank_with_field_embeddings(filtered_candidates, query_embedding, snap, use_keyword_scores=use_keyword)
     
-    # Формирование ответа
+    if collapse and snap.duplicate_clusters is not None:
+        clusters = snap.duplicate_clusters
+        with timer.stage("collapse"):
+            reranked = collapse_duplicates(reranked, lambda idx: int(clusters[idx]))
+        timer.count("collapsed_candidates", len(reranked))
+    return reranked
+
+
+# Предел размера матрицы сходств батча (строк индекса × запросов), float64
+BATCH_SIMILARITY_CELLS = 32 * 1024 * 1024
+
+
+def semantic_search_batch(query_embeddings: np.ndarray, top_k: int, snap: IndexSnapshot) -> List[List[tuple]]:
+    """
+    Семантический поиск для батча запросов: матрица FAS_arguments умножается
+    на матрицу запросов (один проход по индексу на группу запросов вместо
+    прохода на каждый). Результат для каждого запроса - как у semantic_search.
+    """
+    results = [[] for _ in range(len(query_embeddings))]
+    embeddings = snap.embeddings_fas_args
+    if embeddings is None or len(embeddings) == 0:
+        return results
+    
+    norms = np.linalg.norm(query_embeddings, axis=1)
+    active = np.flatnonzero(norms != 0)
+    k = min(top_k, len(embeddings))
+    group_size = max(1, BATCH_SIMILARITY_CELLS // len(embeddings))
+    for start in range(0, len(active), group_size):
+        group = active[start:start + group_size]
+        similarities = embeddings @ (query_embeddings[group] / norms[group, None]).T
+        if snap.valid_fas_args is not None:
+            similarities[~snap.valid_fas_args] = -np.inf
+        top = np.argpartition(-similarities, k - 1, axis=0)[:k]
+        for column, query_idx in enumerate(group):
+            scores = similarities[top[:, column], column]
+            order = np.argsort(-scores, kind="stable")
+            results[query_idx] = [
+                (int(top[i, column]), float(scores[i])) for i in order if np.isfinite(scores[i])
+            ]
+    return results
+
+
+def batch_field_scores(ids: List[int], query_norm: np.ndarray, snap: IndexSnapshot,
+                       field_queries: Optional[Dict[str, np.ndarray]] = None) -> Dict[int, Dict[str, float]]:
+    """
+    Оценки полей кандидатов (как candidate_field_scores) - одним умножением на поле.
+    field_queries - свой нормированный вектор запроса для поля (иначе query_norm).
+    """
+    field_queries = field_queries or {}
+    scores = {idx: {} for idx in ids}
+    rows = np.asarray(ids, dtype=np.int64)
+    for field, embeddings, valid in (
+        ('violation_summary', snap.embeddings_violation, snap.valid_violation),
+        ('ad_description', snap.embeddings_ad_desc, snap.valid_ad_desc),
+    ):
+        usable = np.zeros(len(rows), dtype=bool)
+        similarities = np.zeros(len(rows))
+        if embeddings is not None and len(rows):
+            in_range = rows < len(embeddings)
+            usable[in_range] = valid[rows[in_range]]
+            if usable.any():
+                vectors = np.asarray(embeddings[rows[usable]], dtype=float)
+                field_query = field_queries.get(field, query_norm)
+                similarities[usable] = (vectors @ field_query) / np.linalg.norm(vectors, axis=1)
+        for i, idx in enumerate(ids):
+            scores[idx][field] = normalize_score(float(similarities[i])) if usable[i] else 0.0
+    return scores
+
+
+def run_batch_search_pipeline(queries: List[str], query_embeddings: np.ndarray, filters: dict,
+                              snap: IndexSnapshot) -> List[List[dict]]:
+    """
+    Пакетный вариант run_search_pipeline (задания /api/jobs): семантический и
+    keyword поиск - на весь батч сразу, оценки полей - на всех кандидатов
+    запроса сразу; объединение, фильтры и переранжирование - те же.
+    """
+    semantic_lists = semantic_search_batch(query_embeddings, SEARCH_TOP_CANDIDATES, snap)
+    keyword_lists = keyword_search_batch(queries, snap, top_k=KEYWORD_TOP_K)
+    norms = np.linalg.norm(query_embeddings, axis=1)
+    results = []
+    for semantic_results, keyword_results, query_embedding, norm in zip(
+        semantic_lists, keyword_lists, query_embeddings, norms
+    ):
+        candidates = fuse_results(semantic_results, keyword_results)
+        if filters:
+            candidates = apply_filters(candidates, filters, snap)
+        use_keyword = len(semantic_results) == 0 and len(keyword_results) > 0
+        field_scores = (
+            batch_field_scores([idx for idx, _ in candidates], query_embedding / norm, snap) if norm != 0 else {}
+        )
+        results.append(rerank_candidates(
+            candidates, norm == 0, use_keyword,
+            get_field_scores=field_scores.__getitem__,
+            get_case=lambda idx: snap.cases[idx],
+        ))
+    return results
+
+
+def case_query_vectors(idx: int, snap: IndexSnapshot) -> Dict[str, np.ndarray]:
+    """Нормированные эмбеддинги полей кейса (только валидные строки по маскам)."""
+    vectors = {}
+    for field, embeddings, valid in (
+        ('FAS_arguments', snap.embeddings_fas_args, snap.valid_fas_args),
+        ('violation_summary', snap.embeddings_violation, snap.valid_violation),
+        ('ad_description', snap.embeddings_ad_desc, snap.valid_ad_desc),
+    ):
+        if embeddings is None or idx >= len(embeddings) or (valid is not None and not valid[idx]):
+            continue
+        vector = np.asarray(embeddings[idx], dtype=float)
+        norm = np.linalg.norm(vector)
+        if norm != 0:
+            vectors[field] = vector / norm
+    return vectors
+
+
+def run_similar_pipeline(idx: int, filters: dict, snap: IndexSnapshot,
+                         timer: Optional[StageTimer] = None) -> Optional[List[dict]]:
+    """
+    Похожие решения ("ещё такие же") по сохранённым эмбеддингам кейса - без
+    запроса к Gemini. Первичный отбор - по вектору FAS_arguments кейса (или
+    первого поля с эмбеддингом); если есть граф соседей (knn_graph.py) -
+    его строка кейса вместо перебора. Переранжирование - эмбеддинг каждого поля
+    кейса против того же поля кандидата. Фильтры и веса - как в поиске;
+    сам кейс в результат не входит. None - у кейса нет ни одного эмбеддинга.
+    """
+    timer = timer or StageTimer()
+    vectors = case_query_vectors(idx, snap)
+    if not vectors:
+        return None
+    primary = next(iter(vectors.values()))
+    
+    graph = snap.knn_graph.get('FAS_arguments')
+    if graph is not None and 'FAS_arguments' in vectors:
+        # Соседи из графа prepare_data.py - чтение строки вместо перебора индекса.
+        # Оценки пересчитываются по эмбеддингам, как в semantic_search
+        with timer.stage("knn"):
+            neighbours = [int(i) for i in graph[0][idx][:SEARCH_TOP_CANDIDATES] if i >= 0]
+            scores = np.dot(snap.embeddings_fas_args[neighbours], primary) if neighbours else []
+            semantic_results = sorted(zip(neighbours, map(float, scores)), key=lambda x: x[1], reverse=True)
+    else:
+        with timer.stage("semantic"):
+            semantic_results = [
+                (i, score) for i, score in semantic_search(primary, SEARCH_TOP_CANDIDATES + 1, snap) if i != idx
+            ][:SEARCH_TOP_CANDIDATES]
+    
+    with timer.stage("fusion"):
+        sorted_candidates = fuse_results(semantic_results, [])
+    
+    if filters:
+        with timer.stage("filters"):
+            filtered_candidates = apply_filters(sorted_candidates, filters, snap)
+    else:
+        filtered_candidates = sorted_candidates
+    
+    timer.count("semantic_candidates", len(semantic_results))
+    timer.count("filtered_candidates", len(filtered_candidates))
+    
+    with timer.stage("rerank"):
+        field_scores = batch_field_scores([i for i, _ in filtered_candidates], primary, snap, field_queries=vectors)
+        return rerank_candidates(
+            filtered_candidates, False, False,
+            get_field_scores=field_scores.__getitem__,
+            get_case=lambda i: snap.cases[i],
+        )
+
+
+def build_case_results(hits: List[tuple], snap: IndexSnapshot) -> List[CaseResult]:
+    """Материализация строк ответа из (index, score, field_scores)."""
     case_results = []
-    for result in final_results:
-        case_data = result['case'].copy()
-        case_data['score'] = round(result['score'], 4)
-        case_data['field_scores'] = {k: round(v, 4) for k, v in result.get('field_scores', {}).items()}
+    for idx, score, field_scores in hits:
+        case_data = snap.cases[idx].copy()
+        case_data['score'] = score
+        case_data['field_scores'] = field_scores
         case_results.append(CaseResult(**case_data))
+    return case_results
+
+
+def run_sharded_search_pipeline(query: str, query_embedding: np.ndarray, filters: dict,
+                                coordinator: ShardCoordinator, timer: Optional[StageTimer] = None,
+                                collapse: bool = False) -> List[dict]:
+    """
+    Стадии поиска в режиме координатора. Семантический и keyword поиск,
+    фильтры и оценки полей выполняют шарды; их лучшие кандидаты сливаются
+    до глобальных top-k, дальше - те же объединение и переранжирование,
+    что в run_search_pipeline. Индексы - глобальные.
+    """
+    timer = timer or StageTimer()
+    
+    with timer.stage("shards"):
+        gathered = coordinator.search(query, query_embedding, filters, SEARCH_TOP_CANDIDATES, KEYWORD_TOP_K)
+    
+    with timer.stage("fusion"):
+        sorted_candidates = fuse_results(gathered.semantic, gathered.keyword)
+    
+    if filters:
+        with timer.stage("filters"):
+            filtered_candidates = [c for c in sorted_candidates if c[0] in gathered.passed]
+    else:
+        filtered_candidates = sorted_candidates
+    
+    timer.count("semantic_candidates", len(gathered.semantic))
+    timer.count("keyword_candidates", len(gathered.keyword))
+    timer.count("fused_candidates", len(sorted_candidates))
+    timer.count("filtered_candidates", len(filtered_candidates))
+    
+    use_keyword = len(gathered.semantic) == 0 and len(gathered.keyword) > 0
+    with timer.stage("rerank"):
+        reranked = rerank_candidates(
+            filtered_candidates, np.linalg.norm(query_embedding) == 0, use_keyword,
+            get_field_scores=lambda idx: dict(gathered.field_scores[idx]),
+            get_case=lambda idx: None,
+        )
+    
+    if collapse and gathered.clusters:
+        with timer.stage("collapse"):
+            reranked = collapse_duplicates(reranked, lambda idx: gathered.clusters.get(idx, idx))
+        timer.count("collapsed_candidates", len(reranked))
+    return reranked
+
+
+def build_sharded_case_results(hits: List[tuple], coordinator: ShardCoordinator) -> List[CaseResult]:
+    """Строки ответа по кейсам, запрошенным у шардов."""
+    cases = coordinator.fetch_cases([idx for idx, _, _ in hits])
+    case_results = []
+    for idx, score, field_scores in hits:
+        case_data = dict(cases[idx])
+        case_data['score'] = score
+        case_data['field_scores'] = field_scores
+        case_results.append(CaseResult(**case_data))
+    return case_results
+
+
+def profile_mode(
+    profile: Optional[str] = Query(default=None, description="Профилировать запрос: cprofile или sample"),
+    x_profile: Optional[str] = Header(default=None),
+    x_admin_token: Optional[str] = Header(default=None),
+) -> Optional[str]:
+    """
+    Режим профилирования запроса (заголовок X-Profile или параметр profile).
+    Доступен только с токеном администратора.
+    """
+    mode = x_profile or profile
+    if not mode:
+        return None
+    require_admin(x_admin_token)
+    if mode not in PROFILE_MODES:
+        raise HTTPException(status_code=400, detail=f"Режим профилирования: {', '.join(PROFILE_MODES)}")
+    return mode
+
+
+def run_profiled(mode: Optional[str], endpoint: str, timer: StageTimer, func, *args) -> Response:
+    """
+    Выполнить обработчик; при заданном режиме - под профилировщиком.
+    Профиль со стадиями и числом кандидатов сохраняется в PROFILE_DIR,
+    его id возвращается в заголовке X-Profile-Id.
+    """
+    if not mode:
+        return func(*args)
+    response, profile = profile_call(mode, func, *args)
+    profile_id = save_profile(PROFILE_DIR, endpoint, profile, {
+        "mode": mode,
+        "total_ms": round(timer.total() * 1000, 3),
+        "stages_ms": timer.stages_ms(),
+        "candidates": timer.counts,
+        "labels": timer.labels,
+    })
+    response.headers["X-Profile-Id"] = profile_id
+    print(f"Профиль {endpoint} сохранён: {PROFILE_DIR / profile_id}")
+    return response
+
+
+@app.post("/api/search", response_model=SearchResponse)
+async def search(request: SearchRequest, profile: Optional[str] = Depends(profile_mode)):
+    """
+    Гибридный поиск по решениям ФАС.
+    С X-Profile: cprofile|sample (и X-Admin-Token) запрос выполняется под профилировщиком.
+    """
+    timer = StageTimer()
+    
+    # Фиксируем снимок на весь запрос - перезагрузка индекса его не затронет
+    snap = snapshot
+    if not index_ready(snap):
+        raise HTTPException(
+            status_code=503, 
+            detail="Сервер не готов. Данные не загружены."
+        )
+    # Поиск (эмбеддинг запроса, numpy-стадии, переранжирование) - в пуле потоков:
+    # цикл событий остаётся свободным, numpy-операции отпускают GIL
+    with interactive_request():
+        return await run_in_threadpool(run_profiled, profile, "search", timer, execute_search, request, snap, timer)
+
+
+@contextmanager
+def interactive_request():
+    """Учёт выполняющихся интерактивных запросов - задания /api/jobs ждут их завершения."""
+    global _interactive_requests
+    with _interactive_lock:
+        _interactive_requests += 1
+    try:
+        yield
+    finally:
+        with _interactive_lock:
+            _interactive_requests -= 1
+
+
+def index_ready(snap: IndexSnapshot) -> bool:
+    """
+    Индекс готов к поиску: запуск завершён (Gemini настроен, снимок прогрет)
+    и локальный снимок загружен или шарды ответили при запуске. Снимок,
+    предзагруженный serve.py, готов раньше - до окончания запуска воркера
+    запросы не принимаются.
+    """
+    if not startup_state["ready"]:
+        return False
+    return shard_coordinator is not None or snap.is_ready
+
+
+def request_filters(request: SearchRequest) -> dict:
+    """Заданные в запросе фильтры."""
+    filters = {}
+    if request.year:
+        filters['year'] = request.year
+    if request.region:
+        filters['region'] = request.region
+    if request.industry:
+        filters['industry'] = request.industry
+    if request.article:
+        filters['article'] = request.article
+    if request.tags:
+        filters['tags'] = request.tags
+        if request.tags_mode == "all":
+            filters['tags_mode'] = "all"
+    if request.date_from:
+        filters['date_from'] = request.date_from.isoformat()
+    if request.date_to:
+        filters['date_to'] = request.date_to.isoformat()
+    return filters
+
+
+def execute_search(request: SearchRequest, snap: IndexSnapshot, timer: StageTimer) -> Response:
+    """Обработка /api/search: кэш, стадии поиска, ответ, метрики и журналы."""
+    global use_gemini
+    filters = request_filters(request)
+    
+    # Кэш: при попадании пропускаем все стадии, кроме формирования ответа.
+    # Стадии получают запрос в том виде, в каком его ввёл пользователь
+    query = request.query
+    data_version = shard_coordinator.version if shard_coordinator is not None else snap.version
+    cache_key = make_cache_key(query, filters, request.top_k, get_ranking_config(), data_version,
+                               request.collapse_duplicates)
+    with timer.stage("cache"):
+        hits = search_cache.get(cache_key)
+    timer.label("cache", "hit" if hits is not None else "miss")
+    
+    if hits is None:
+        cacheable = True
+        
+        # Создаем эмбеддинг запроса
+        if use_gemini:
+            with timer.stage("embedding"):
+                GEMINI_REQUESTS.inc()
+                query_embedding = get_embedding(query, task_type="retrieval_query")
+            
+            if query_embedding is None:
+                # Gemini недоступен - используем zero-vector
+                query_embedding = np.zeros(EMBEDDING_DIMENSION)
+                # Отключаем Gemini, только если настроенный клиент вернул ошибку
+                if api_configured:
+                    event_log.event("gemini_disabled", level="warning", detail="используется нулевой эмбеддинг")
+                    use_gemini = False
+                # Результат получен не тем режимом, что записан в ключе
+                cacheable = False
+        else:
+            # Используем нулевой эмбеддинг - будет работать только keyword search
+            query_embedding = np.zeros(EMBEDDING_DIMENSION)
+        
+        if shard_coordinator is not None:
+            try:
+                reranked = run_sharded_search_pipeline(query, query_embedding, filters, shard_coordinator, timer,
+                                                       collapse=request.collapse_duplicates)
+            except ShardError as e:
+                event_log.event("shard_error", level="error", detail=str(e))
+                raise HTTPException(status_code=503, detail=f"Шард недоступен: {e}")
+        else:
+            reranked = run_search_pipeline(query, query_embedding, filters, snap, timer,
+                                           collapse=request.collapse_duplicates)
+        hits = [
+            (
+                result['index'],
+                round(result['score'], 4),
+                {k: round(v, 4) for k, v in result.get('field_scores', {}).items()}
+            )
+            for result in reranked[:request.top_k]
+        ]
+        
+        if cacheable:
+            search_cache.put(cache_key, hits)
+    
+    # Формирование ответа
+    with timer.stage("results"):
+        if shard_coordinator is not None:
+            try:
+                case_results = build_sharded_case_results(hits, shard_coordinator)
+            except ShardError as e:
+                raise HTTPException(status_code=503, detail=f"Шард недоступен: {e}")
+        else:
+            case_results = build_case_results(hits, snap)
+    
+    # Сериализация выполняется здесь, а не в FastAPI - чтобы она попала в замер
+    with timer.stage("serialization"):
+        body = SearchResponse(
+            query=request.query,
+            total_cases=shard_coordinator.total_cases if shard_coordinator is not None else snap.total_cases,
+            results=case_results,
+            filters_applied=filters if filters else None,
+            message=None
+        ).model_dump_json()
+    
+    total = timer.total()
+    record_search_metrics(timer, filters, total)
+    event_log.event(
+        "search",
+        query=query[:100],
+        filters=filters,
+        top_k=request.top_k,
+        cache=timer.labels.get("cache"),
+        results=len(hits),
+        total_ms=round(total * 1000, 3),
+        stages_ms=timer.stages_ms(),
+        candidates=timer.counts,
+    )
+    if query_log is not None:
+        query_log.record({
+            "ts": round(time.time(), 3),
+            "q": request.query,
+            "f": filters,
+            "k": request.top_k,
+            **({"collapse": True} if request.collapse_duplicates else {}),
+            "cache": timer.labels.get("cache") == "hit",
+            "ms": timer.stages_ms(),
+            "total_ms": round(total * 1000, 3),
+        })
     
-    return SearchResponse(
-        query=request.query,
-        total_cases=len(cases),
-        results=case_results,
-        filters_applied=filters if filters else None,
-        message=None
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"Server-Timing": timer.server_timing(total)},
+    )
+
+
+@app.get("/api/cases/{index}/similar", response_model=SearchResponse)
+async def similar_cases(
+    index: int,
+    top_k: int = Query(default=DEFAULT_TOP_K, ge=1, le=50, description="Количество результатов"),
+    year: Optional[List[int]] = Query(default=None, description="Фильтр по году"),
+    region: Optional[List[str]] = Query(default=None, description="Фильтр по региону"),
+    industry: Optional[List[str]] = Query(default=None, description="Фильтр по отрасли"),
+    article: Optional[List[str]] = Query(default=None, description="Фильтр по статье закона"),
+    tags: Optional[List[str]] = Query(default=None, description="Фильтр по тематическим тегам"),
+    tags_mode: str = Query(default="any", pattern=TAG_MODES_PATTERN, description="any или all"),
+    date_from: Optional[date] = Query(default=None, description="Дата решения не раньше (YYYY-MM-DD)"),
+    date_to: Optional[date] = Query(default=None, description="Дата решения не позже (YYYY-MM-DD)"),
+):
+    """
+    Решения, похожие на кейс index (позиция в индексе, поле index результатов поиска).
+    Запросом служат сохранённые эмбеддинги кейса - Gemini не вызывается.
+    Фильтры - как в /api/search.
+    """
+    snap = snapshot
+    if shard_coordinator is not None:
+        raise HTTPException(status_code=501, detail="Похожие решения недоступны в режиме шардов")
+    if not index_ready(snap):
+        raise HTTPException(status_code=503, detail="Сервер не готов. Данные не загружены.")
+    if not 0 <= index < snap.total_cases:
+        raise HTTPException(status_code=404, detail="Кейс не найден")
+    
+    request = SearchRequest(query=f"similar:{index}", top_k=top_k, year=year, region=region,
+                            industry=industry, article=article, tags=tags, tags_mode=tags_mode,
+                            date_from=date_from, date_to=date_to)
+    timer = StageTimer()
+    with interactive_request():
+        return await run_in_threadpool(execute_similar, request, index, snap, timer)
+
+
+def execute_similar(request: SearchRequest, index: int, snap: IndexSnapshot, timer: StageTimer) -> Response:
+    """Обработка /api/cases/{index}/similar: стадии, ответ и Server-Timing."""
+    filters = request_filters(request)
+    reranked = run_similar_pipeline(index, filters, snap, timer)
+    if reranked is None:
+        raise HTTPException(status_code=422, detail="У кейса нет эмбеддингов")
+    hits = [
+        (r['index'], round(r['score'], 4), {k: round(v, 4) for k, v in r['field_scores'].items()})
+        for r in reranked[:request.top_k]
+    ]
+    with timer.stage("results"):
+        case_results = build_case_results(hits, snap)
+    with timer.stage("serialization"):
+        body = SearchResponse(
+            query=request.query,
+            total_cases=snap.total_cases,
+            results=case_results,
+            filters_applied=filters or None,
+        ).model_dump_json()
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"Server-Timing": timer.server_timing(timer.total())},
     )
 
 
+def record_search_metrics(timer: StageTimer, filters: dict, total: float):
+    """Перенести замеры запроса в метрики Prometheus."""
+    SEARCH_REQUESTS.inc(cache=timer.labels.get("cache", ""))
+    SEARCH_DURATION.observe(total)
+    for stage, seconds in timer.stages.items():
+        SEARCH_STAGE_DURATION.observe(seconds, stage=stage)
+    for name, value in timer.counts.items():
+        SEARCH_CANDIDATES.observe(value, stage=name[:-len("_candidates")] if name.endswith("_candidates") else name)
+    fused = timer.counts.get("fused_candidates")
+    if filters and fused:
+        FILTER_SELECTIVITY.observe(timer.counts.get("filtered_candidates", 0) / fused,
+                                   filters=",".join(sorted(filters)))
+
+
 def normalize_industry_name(name: str) -> str:
     """Нормализовать название отрасли - убрать лишние пробелы и т.д."""
     return ' / '.join([s.strip() for s in name.split('/')])
@@ -1120,19 +2050,19 @@ def build_industry_hierarchy_from_mapping(industry_counts: Dict[str, int]) -> Li
     return result
 
 
-@app.get("/api/filters", response_model=FilterOptions)
-async def get_filter_options():
-    """Получить доступные значения для фильтров."""
-    if not cases:
-        raise HTTPException(status_code=503, detail="Сервер не готов.")
-    
+def collect_filter_values(cases) -> dict:
+    """
+    Значения фильтров по кейсам: годы, регионы, число дел по отраслям, статьи.
+    Значения нескольких частей индекса (шардов) объединяются merge_filter_values.
+    """
     years = set()
     regions = set()
-    industries = set()
     articles = set()
     
-    # Подсчитываем количество дел для каждого значения отрасли
+    # Подсчитываем количество дел для каждого значения отрасли и тега
     industry_counts: Dict[str, int] = {}
+    tag_counts: Dict[str, int] = {}
+    days = []
     
     for case in cases:
         if case.get('document_date'):
@@ -1141,12 +2071,14 @@ async def get_filter_options():
                 years.add(year)
             except:
                 pass
+            day = parse_day(case['document_date'])
+            if day is not None:
+                days.append(day)
         
         if case.get('FAS_division'):
             regions.add(case['FAS_division'])
         
         if case.get('defendant_industry'):
-            industries.add(case['defendant_industry'])
             industry_counts[case['defendant_industry']] = industry_counts.get(case['defendant_industry'], 0) + 1
         
         if case.get('legal_provisions'):
@@ -1154,40 +2086,593 @@ async def get_filter_options():
             found_articles = re.findall(r'ст\.\s*\d+|ч\.\s*\d+\s*ст\.\s*\d+', legal, re.IGNORECASE)
             for art in found_articles:
                 articles.add(art.strip())
+        
+        for tag in {tag.strip() for tag in case_tags(case)} - {''}:
+            tag_counts[tag] = tag_counts.get(tag, 0) + 1
+    
+    return {
+        'years': years,
+        'regions': regions,
+        'industry_counts': industry_counts,
+        'articles': articles,
+        'tag_counts': tag_counts,
+        # Самая ранняя и самая поздняя дата (ISO) - пусто, если дат нет
+        'dates': [format_day(min(days)), format_day(max(days))] if days else [],
+    }
+
+
+def merge_filter_values(parts: List[dict]) -> dict:
+    """Объединить значения фильтров частей индекса (списки из JSON допускаются)."""
+    merged = {'years': set(), 'regions': set(), 'industry_counts': {}, 'articles': set(), 'tag_counts': {}}
+    dates = []
+    for part in parts:
+        merged['years'].update(part['years'])
+        merged['regions'].update(part['regions'])
+        merged['articles'].update(part['articles'])
+        for industry, count in part['industry_counts'].items():
+            merged['industry_counts'][industry] = merged['industry_counts'].get(industry, 0) + count
+        for tag, count in part.get('tag_counts', {}).items():
+            merged['tag_counts'][tag] = merged['tag_counts'].get(tag, 0) + count
+        dates.extend(part.get('dates', []))
+    # Даты ISO сравниваются как строки
+    merged['dates'] = [min(dates), max(dates)] if dates else []
+    return merged
+
+
+def build_filter_options(values: dict) -> FilterOptions:
+    """Опции фильтров с иерархиями по собранным значениям."""
+    industry_counts = values['industry_counts']
     
     # Строим иерархию отраслей на основе маппинга
     industry_groups = build_industry_hierarchy_from_mapping(industry_counts)
     
     # Строим иерархию регионов
-    region_groups = build_region_hierarchy(regions)
+    region_groups = build_region_hierarchy(values['regions'])
     
     # Строим иерархию статей
-    article_groups = build_article_hierarchy(articles)
+    article_groups = build_article_hierarchy(values['articles'])
     
     return FilterOptions(
-        years=sorted(list(years), reverse=True),
-        regions=sorted(list(regions)),
+        years=sorted(list(values['years']), reverse=True),
+        regions=sorted(list(values['regions'])),
         region_groups=region_groups,
-        industries=sorted(list(industries)),
+        industries=sorted(list(industry_counts)),
         industry_groups=industry_groups,
-        articles=sorted(list(articles)),
-        article_groups=article_groups
+        articles=sorted(list(values['articles'])),
+        article_groups=article_groups,
+        tags=[
+            TagOption(name=name, count=count)
+            for name, count in sorted(values.get('tag_counts', {}).items(), key=lambda x: (-x[1], x[0]))
+        ],
+        date_min=values['dates'][0] if values.get('dates') else None,
+        date_max=values['dates'][1] if values.get('dates') else None,
     )
 
 
+def compute_filter_options(cases) -> FilterOptions:
+    """Вычислить доступные значения фильтров по кейсам снимка."""
+    return build_filter_options(collect_filter_values(cases))
+
+
+def get_snapshot_filter_options(snap: IndexSnapshot) -> FilterOptions:
+    """Опции фильтров снимка - вычисляются один раз и хранятся в снимке."""
+    options = snap.derived.get('filter_options')
+    if options is None:
+        options = compute_filter_options(snap.cases)
+        snap.derived['filter_options'] = options
+    return options
+
+
+def suggest_labels(cases) -> List[tuple]:
+    """
+    Подписи для подсказок: (текст, вид, число дел). Теги, типы нарушений,
+    положения закона и ответчики - по кейсам; отрасли - все уровни
+    INDUSTRY_HIERARCHY (отрасль и сфера - суммой дел своих специализаций).
+    """
+    counts: Dict[tuple, int] = {}
+    
+    def add(text, kind: str, count: int = 1):
+        if text and isinstance(text, str) and text.strip():
+            key = (text.strip(), kind)
+            counts[key] = counts.get(key, 0) + count
+    
+    industry_counts: Dict[str, int] = {}
+    for case in cases:
+        add(case.get('Violation_Type'), 'violation_type')
+        add(case.get('defendant_name'), 'defendant')
+        for tag in set(parse_list_field(case['thematic_tags'])) if case.get('thematic_tags') else ():
+            add(tag, 'tag')
+        for provision in set(parse_list_field(case['legal_provisions'])) if case.get('legal_provisions') else ():
+            add(provision, 'article')
+        if case.get('defendant_industry'):
+            industry_counts[case['defendant_industry']] = industry_counts.get(case['defendant_industry'], 0) + 1
+    
+    for industry, spheres in INDUSTRY_HIERARCHY.items():
+        industry_total = 0
+        for sphere, specializations in spheres.items():
+            sphere_total = 0
+            for spec in specializations:
+                spec_count = industry_counts.get(spec, 0)
+                add(spec, 'industry', spec_count)
+                sphere_total += spec_count
+            add(sphere, 'industry', sphere_total)
+            industry_total += sphere_total
+        add(industry, 'industry', industry_total)
+    
+    return [(text, kind, count) for (text, kind), count in counts.items()]
+
+
+def get_suggest_index(snap: IndexSnapshot) -> SuggestIndex:
+    """Индекс подсказок снимка - строится один раз (при прогреве) и хранится в снимке."""
+    index = snap.derived.get('suggest_index')
+    if index is None:
+        with _derived_lock:
+            index = snap.derived.get('suggest_index')
+            if index is None:
+                index = SuggestIndex(suggest_labels(snap.cases))
+                snap.derived['suggest_index'] = index
+    return index
+
+
+@app.get("/api/suggest", response_model=SuggestResponse)
+async def suggest(
+    q: str = Query(..., min_length=1, max_length=200, description="Набранный текст"),
+    limit: int = Query(default=10, ge=1, le=MAX_SUGGESTIONS, description="Количество подсказок"),
+):
+    """
+    Подсказки поисковой строки: теги, типы нарушений, статьи закона, отрасли
+    и ответчики, начинающиеся с набранного текста (или его последних слов).
+    Отвечает из индекса в памяти, без Gemini - можно вызывать на каждое нажатие.
+    """
+    snap = snapshot
+    if shard_coordinator is not None:
+        raise HTTPException(status_code=501, detail="Подсказки недоступны в режиме шардов")
+    if not index_ready(snap):
+        raise HTTPException(status_code=503, detail="Сервер не готов.")
+    # Индекс подсказок строится при прогреве; поиск по нему (и ожидание _derived_lock) -
+    # в пуле потоков, а не в цикле событий
+    suggestions, replace_words = await run_in_threadpool(find_suggestions, snap, q, limit)
+    return SuggestResponse(query=q, replace_words=replace_words, suggestions=suggestions)
+
+
+def find_suggestions(snap: IndexSnapshot, q: str, limit: int) -> Tuple[List[dict], int]:
+    """Подсказки и число заменяемых ими последних слов запроса."""
+    return get_suggest_index(snap).suggest(q, limit)
+
+
+def current_filter_options(snap: IndexSnapshot) -> FilterOptions:
+    """Опции фильтров снимка или, в режиме координатора, всех шардов."""
+    if shard_coordinator is None:
+        return get_snapshot_filter_options(snap)
+    try:
+        return shard_coordinator.get_derived(
+            'filter_options',
+            lambda: build_filter_options(merge_filter_values(shard_coordinator.filter_values()))
+        )
+    except ShardError as e:
+        raise HTTPException(status_code=503, detail=f"Шард недоступен: {e}")
+
+
+@app.get("/api/filters", response_model=FilterOptions)
+async def get_filter_options(profile: Optional[str] = Depends(profile_mode)):
+    """Получить доступные значения для фильтров."""
+    snap = snapshot
+    if not (snap.cases or (shard_coordinator is not None and index_ready(snap))):
+        raise HTTPException(status_code=503, detail="Сервер не готов.")
+    if not profile:
+        with interactive_request():
+            return await run_in_threadpool(current_filter_options, snap)
+    timer = StageTimer()
+    
+    def build() -> Response:
+        with timer.stage("options"):
+            options = current_filter_options(snap)
+        with timer.stage("serialization"):
+            body = options.model_dump_json()
+        return Response(content=body, media_type="application/json")
+    
+    with interactive_request():
+        return await run_in_threadpool(run_profiled, profile, "filters", timer, build)
+
+
+def warmup_snapshot(snap: IndexSnapshot):
+    """
+    Прогрев снимка: синтетический запрос через все стадии поиска.
+    - подгружает в память страницы матриц (при mmap они читаются лениво);
+    - выполняет поиск с фильтрами каждого типа, переранжирование и сериализацию;
+    - строит индексы keyword-поиска и подсказок, заранее вычисляет опции фильтров.
+    Вызов Gemini не делается - вектор запроса берётся из самого индекса.
+    """
+    if not snap.is_ready or snap.total_cases == 0:
+        return
+    t0 = time.perf_counter()
+    
+    query_embedding = np.array(snap.embeddings_fas_args[0], dtype=float)
+    if not np.any(query_embedding):
+        query_embedding = np.ones(snap.embeddings_fas_args.shape[1])
+    
+    # Полный проход по каждой матрице затрагивает все её страницы
+    for emb in (snap.embeddings_fas_args, snap.embeddings_violation, snap.embeddings_ad_desc):
+        if emb is not None:
+            np.dot(emb, query_embedding)
+    
+    # Фильтры всех типов по значениям первого кейса
+    case = snap.cases[0]
+    filters = {}
+    if case.get('document_date') and case['document_date'][:4].isdigit():
+        filters['year'] = [int(case['document_date'][:4])]
+        filters['date_from'] = case['document_date'][:10]
+    if case.get('FAS_division'):
+        filters['region'] = [case['FAS_division']]
+    if case.get('defendant_industry'):
+        filters['industry'] = [case['defendant_industry']]
+    articles = re.findall(r'ст\.\s*\d+', case.get('legal_provisions') or '')
+    if articles:
+        filters['article'] = [articles[0]]
+    tags = case_tags(case)
+    if tags:
+        filters['tags'] = tags[:1]
+    
+    get_keyword_index(snap)
+    get_tag_index(snap)
+    get_date_index(snap)
+    query = normalize_query(' '.join((case.get('violation_summary') or 'реклама').split()[:5]))
+    for warm_filters in ({}, filters):
+        reranked = run_search_pipeline(query, query_embedding, warm_filters, snap)
+        hits = [(r['index'], round(r['score'], 4), r.get('field_scores', {})) for r in reranked[:DEFAULT_TOP_K]]
+        SearchResponse(
+            query=query,
+            total_cases=snap.total_cases,
+            results=build_case_results(hits, snap),
+            filters_applied=warm_filters or None
+        ).model_dump_json()
+    
+    get_snapshot_filter_options(snap)
+    get_suggest_index(snap)
+    print(f"  Прогрев снимка {snap.version}: {time.perf_counter() - t0:.2f} с")
+
+
+@app.get("/api/ready")
+async def readiness_check():
+    """
+    Проверка готовности (readiness probe).
+    200 - данные загружены и прогреты; 503 - запуск ещё идёт или завершился ошибкой.
+    """
+    state = {k: v for k, v in startup_state.items() if not k.startswith('_')}
+    state["elapsed_seconds"] = round((startup_state["ready_at"] or time.time()) - startup_state["started_at"], 3)
+    return JSONResponse(status_code=200 if startup_state["ready"] else 503, content=state)
+
+
 @app.get("/api/health")
 async def health_check():
     """Проверка состояния сервера."""
     return {
         "status": "ok",
+        "ready": startup_state["ready"],
+        "startup_stage": startup_state["stage"],
         "model_loaded": use_gemini,
-        "data_loaded": embeddings_fas_args is not None and cases is not None,
-        "total_cases": len(cases) if cases else 0,
+        "data_loaded": index_ready(snapshot),
+        "total_cases": shard_coordinator.total_cases if shard_coordinator is not None else snapshot.total_cases,
         "embedding_dimension": EMBEDDING_DIMENSION,
-        "embedding_model": "gemini-embedding-001" if use_gemini else "local-embeddings"
+        "embedding_model": "gemini-embedding-001" if use_gemini else "local-embeddings",
+        "data_version": shard_coordinator.version if shard_coordinator is not None else snapshot.version,
+        "shards": shard_coordinator.stats() if shard_coordinator is not None else None,
+        "bulk_jobs": bulk_worker.stats() if bulk_worker is not None else None,
+        "search_cache": search_cache.stats()
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Метрики в формате Prometheus с меткой worker (pid процесса).
+    С METRICS_DIR - значения всех воркеров serve.py, иначе только ответившего.
+    """
+    SEARCH_CACHE_ENTRIES.set(search_cache.stats()["size"])
+    others = metrics_dir.others() if metrics_dir is not None else ()
+    return PlainTextResponse(METRICS.render(others), media_type=metrics.CONTENT_TYPE)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    """Проверка доступа к служебным эндпоинтам по заголовку X-Admin-Token."""
+    if not Config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Служебные эндпоинты отключены (ADMIN_TOKEN не задан).")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, Config.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Неверный токен администратора.")
+
+
+@app.post("/api/admin/reload", dependencies=[Depends(require_admin)])
+async def admin_reload(force: bool = False):
+    """
+    Перезагрузить индекс из DATA_DIR без остановки сервиса.
+    Загрузка идёт в пуле потоков - текущие запросы обслуживаются старым снимком.
+    При serve.py перезагрузку выполняет родительский процесс (ответ - scheduled):
+    он загружает новый снимок и заменяет воркеры.
+    """
+    if index_owner_pid is not None and index_owner_pid != os.getpid():
+        os.kill(index_owner_pid, RELOAD_FORCE_SIGNAL if force else RELOAD_SIGNAL)
+        return {"status": "scheduled", "version": snapshot.version}
+    return await run_in_threadpool(reload_index, force)
+
+
+def memory_report(snap: IndexSnapshot) -> dict:
+    """
+    Память структур снимка, кэшей и процесса (байты).
+    Для mmap-матриц resident_bytes/pss_bytes - реально загруженные страницы файла.
+    """
+    matrices = {
+        "embeddings_fas_args": array_info(snap.embeddings_fas_args),
+        "embeddings_violation": array_info(snap.embeddings_violation),
+        "embeddings_ad_desc": array_info(snap.embeddings_ad_desc),
+        "valid_fas_args": array_info(snap.valid_fas_args),
+        "valid_violation": array_info(snap.valid_violation),
+        "valid_ad_desc": array_info(snap.valid_ad_desc),
+    }
+    if snap.duplicate_clusters is not None:
+        matrices["duplicate_clusters"] = array_info(snap.duplicate_clusters)
+    for field_name, (ids, scores) in snap.knn_graph.items():
+        matrices[f"knn_{field_name}_ids"] = array_info(ids)
+        matrices[f"knn_{field_name}_scores"] = array_info(scores)
+    tag_index = snap.derived.get('tag_index')
+    if tag_index is not None:
+        matrices["tag_bitsets"] = array_info(tag_index.bitsets)
+    date_index = snap.derived.get('date_index')
+    if date_index is not None:
+        matrices["date_days"] = array_info(date_index.days)
+        matrices["date_order"] = array_info(date_index.order)
+    keyword_index = snap.derived.get('keyword_index')
+    if keyword_index is not None:
+        # Тексты keyword-поиска в разделяемой памяти (keyword_index.py)
+        matrices["keyword_texts"] = {"bytes": keyword_index.nbytes, "mmap": True, "file": keyword_index.text_path}
+    resident = mapped_files(info["file"] for info in matrices.values() if info and "file" in info)
+    for info in matrices.values():
+        if info and "file" in info:
+            usage = resident.get(os.path.realpath(info["file"]), {})
+            info["resident_bytes"] = usage.get("Rss", 0)
+            info["pss_bytes"] = usage.get("Pss", 0)
+    
+    structures = {
+        "cases": deep_sizeof(snap.cases) if snap.cases is not None else 0,
+        # Производные структуры снимка: опции фильтров, индексы
+        "derived": {key: deep_sizeof(value) for key, value in list(snap.derived.items())},
+        "search_cache": search_cache.memory_bytes(),
+        "stack_sampler": deep_sizeof(stack_sampler.stacks),
+        "industry_hierarchy": deep_sizeof(INDUSTRY_HIERARCHY),
+        "region_hierarchy": deep_sizeof(REGION_HIERARCHY) + deep_sizeof(UFAS_TO_REGION),
+    }
+    heap_matrices = sum(info["bytes"] for info in matrices.values() if info and not info["mmap"])
+    return {
+        "data_version": snap.version,
+        "total_cases": snap.total_cases,
+        "pid": os.getpid(),
+        "matrices": matrices,
+        "structures": structures,
+        "totals": {
+            "matrices_bytes": sum(info["bytes"] for info in matrices.values() if info),
+            "matrices_heap_bytes": heap_matrices,
+            "structures_bytes": structures["cases"] + sum(structures["derived"].values()) + sum(
+                v for k, v in structures.items() if k not in ("cases", "derived")),
+        },
+        "process": process_memory(),
+    }
+
+
+@app.get("/api/admin/jobs", dependencies=[Depends(require_admin)])
+async def admin_bulk_jobs():
+    """Число заданий /api/jobs по статусам (запрос к очереди - в пуле потоков)."""
+    return await run_in_threadpool(get_bulk_store().stats)
+
+
+@app.get("/api/admin/memory", dependencies=[Depends(require_admin)])
+async def admin_memory():
+    """
+    Память, занятая структурами индекса, кэшами и процессом (RSS/PSS).
+    Обход cases занимает время, пропорциональное корпусу - выполняется в пуле потоков.
+    """
+    return await run_in_threadpool(memory_report, snapshot)
+
+
+@app.get("/api/admin/profiles", dependencies=[Depends(require_admin)])
+async def admin_list_profiles():
+    """Сохранённые профили запросов (метаданные, новые первыми)."""
+    if not PROFILE_DIR.exists():
+        return []
+    profiles = []
+    for path in sorted(PROFILE_DIR.glob("*.json"), reverse=True):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+@app.get("/api/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def admin_get_profile(profile_id: str):
+    """Файл профиля: .pstats (cprofile) или .collapsed (sample)."""
+    if not re.fullmatch(r"[\w.-]+", profile_id):
+        raise HTTPException(status_code=400, detail="Некорректный id профиля.")
+    for suffix in (".pstats", ".collapsed"):
+        path = PROFILE_DIR / f"{profile_id}{suffix}"
+        if path.exists():
+            return FileResponse(path, filename=path.name)
+    raise HTTPException(status_code=404, detail="Профиль не найден.")
+
+
+@app.post("/api/admin/sampler", dependencies=[Depends(require_admin)])
+async def admin_sampler(enabled: bool, interval_ms: Optional[float] = None):
+    """Включить или выключить фоновую выборку стеков воркера."""
+    if interval_ms is not None:
+        if interval_ms <= 0:
+            raise HTTPException(status_code=400, detail="interval_ms должен быть больше 0.")
+        stack_sampler.interval = interval_ms / 1000
+    if enabled:
+        stack_sampler.start()
+    else:
+        stack_sampler.stop()
+    return stack_sampler.stats()
+
+
+@app.get("/api/admin/sampler", dependencies=[Depends(require_admin)], response_class=PlainTextResponse)
+async def admin_sampler_stacks(reset: bool = False):
+    """
+    Накопленные стеки в свёрнутом формате (flamegraph.pl, speedscope).
+    reset=true - начать накопление заново.
+    """
+    stats = stack_sampler.stats()
+    return PlainTextResponse(
+        stack_sampler.collapsed(reset=reset),
+        headers={"X-Sampler-Samples": str(stats["samples"]), "X-Sampler-Running": str(stats["running"]).lower()},
+    )
+
+
+def get_bulk_store() -> BulkJobStore:
+    """Очередь заданий /api/jobs (файл создаётся при первом обращении)."""
+    global _bulk_store
+    if _bulk_store is None:
+        _bulk_store = BulkJobStore(Path(Config.BULK_JOBS_DB) if Config.BULK_JOBS_DB else DATA_DIR / "bulk_jobs.sqlite3")
+    return _bulk_store
+
+
+def bulk_should_wait() -> bool:
+    """Задания откладываются, пока идут интерактивные запросы или индекс не готов."""
+    return _interactive_requests > 0 or not index_ready(snapshot)
+
+
+def bulk_result(idx: int, score: float, case: dict) -> dict:
+    """Найденное решение в результатах задания."""
+    result = {"index": idx, "score": round(score, 4)}
+    result.update((name, case.get(name)) for name in RESULT_CASE_FIELDS)
+    return result
+
+
+def process_bulk_batch(job: dict, texts: List[str]) -> Tuple[List[list], str]:
+    """
+    Батч текстов задания: эмбеддинги одним запросом к Gemini, пакетный поиск
+    (run_batch_search_pipeline), лучшие top_k решений на текст.
+    Пустые тексты получают пустой результат.
+    """
+    params = job["params"]
+    filters = params.get("filters") or {}
+    top_k = params["top_k"]
+    queries = [normalize_query(text) for text in texts]
+    active = [i for i, query in enumerate(queries) if query]
+    
+    if use_gemini and active:
+        bulk_embedding_limiter.acquire()
+        query_embeddings = get_embeddings_batch(queries)
+    else:
+        query_embeddings = np.zeros((len(queries), EMBEDDING_DIMENSION))
+    
+    if shard_coordinator is not None:
+        data_version = shard_coordinator.version
+        reranked = {
+            i: run_sharded_search_pipeline(queries[i], query_embeddings[i], filters, shard_coordinator)[:top_k]
+            for i in active
+        }
+        cases = shard_coordinator.fetch_cases(sorted({r['index'] for hits in reranked.values() for r in hits}))
+    else:
+        snap = snapshot
+        data_version = snap.version
+        batch = run_batch_search_pipeline([queries[i] for i in active], query_embeddings[active], filters, snap)
+        reranked = {i: hits[:top_k] for i, hits in zip(active, batch)}
+        cases = {r['index']: r['case'] for hits in reranked.values() for r in hits}
+    
+    results = [[] for _ in texts]
+    for i, hits in reranked.items():
+        results[i] = [bulk_result(r['index'], r['score'], cases[r['index']]) for r in hits]
+    BULK_ROWS.inc(len(texts))
+    return results, data_version
+
+
+def start_bulk_worker():
+    """Запустить фоновую обработку заданий в текущем процессе."""
+    global bulk_worker
+    if bulk_worker is None:
+        bulk_worker = BulkJobWorker(
+            get_bulk_store(), process_bulk_batch, bulk_should_wait,
+            # Gemini принимает не больше 100 текстов в одном запросе
+            batch_size=max(1, min(Config.BULK_BATCH_SIZE, 100)),
+            cpu_share=Config.BULK_CPU_SHARE,
+        )
+    bulk_worker.ensure_started()
+
+
+def read_upload_texts(upload: UploadFile, column: Optional[str]) -> List[str]:
+    """Тексты загруженного CSV (чтение и разбор - в пуле потоков, а не в цикле событий)."""
+    upload.file.seek(0)
+    return read_csv_texts(upload.file.read(), column, Config.BULK_MAX_ROWS)
+
+
+@app.post("/api/jobs", status_code=202, dependencies=[Depends(require_admin)])
+async def create_bulk_job(
+    file: UploadFile = File(..., description="CSV с заголовком: текст рекламы в колонке column"),
+    column: Optional[str] = Form(default=None, description="Колонка с текстом (по умолчанию text или единственная)"),
+    top_k: int = Form(default=5, description="Число решений на текст"),
+    filters: Optional[str] = Form(
+        default=None, description='Фильтры как в /api/search, JSON: {"year": [2023], "date_from": "2023-01-01"}'
+    ),
+):
+    """
+    Задание массовой проверки: тексты из CSV обрабатываются в фоне.
+    Эндпоинты заданий - служебные (заголовок X-Admin-Token), как /api/admin/*.
+    Возвращает задание с id; прогресс - GET /api/jobs/{id}, результаты -
+    GET /api/jobs/{id}/results?format=csv|jsonl.
+    """
+    try:
+        filter_values = json.loads(filters) if filters else {}
+        if not isinstance(filter_values, dict):
+            raise ValueError("filters должен быть JSON-объектом")
+        unknown = set(filter_values) - SEARCH_FILTER_FIELDS
+        if unknown:
+            raise ValueError(f"Неизвестные фильтры: {', '.join(sorted(unknown))}")
+        # Проверка значений - той же моделью, что у /api/search
+        request = SearchRequest(query="-", top_k=top_k, **filter_values)
+        texts = await run_in_threadpool(read_upload_texts, file, column)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    params = {"top_k": request.top_k, "filters": request_filters(request), "column": column}
+    job = await run_in_threadpool(get_bulk_store().create, file.filename, texts, params)
+    return JSONResponse(status_code=202, content=job)
+
+
+@app.get("/api/jobs/{job_id}", dependencies=[Depends(require_admin)])
+async def get_bulk_job(job_id: str):
+    """Состояние задания: status (queued, running, done, failed), done/total, progress."""
+    job = await run_in_threadpool(get_bulk_store().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задание не найдено")
+    return job
+
+
+@app.get("/api/jobs/{job_id}/results", dependencies=[Depends(require_admin)])
+async def get_bulk_job_results(job_id: str, fmt: str = Query(default="csv", alias="format", description="csv или jsonl")):
+    """
+    Результаты задания потоком. До завершения задания - уже обработанные строки.
+    csv - строка на каждое найденное решение; jsonl - объект на каждый текст.
+    """
+    if fmt not in RESULT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Формат: {', '.join(RESULT_FORMATS)}")
+    store = get_bulk_store()
+    if await run_in_threadpool(store.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Задание не найдено")
+    media_type = "text/csv; charset=utf-8" if fmt == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_results(store, job_id, fmt),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{job_id}.{fmt}"'},
+    )
+
+
+@app.delete("/api/jobs/{job_id}", dependencies=[Depends(require_admin)])
+async def delete_bulk_job(job_id: str):
+    """Удалить задание и его результаты (выполняющееся задание останавливается)."""
+    if not await run_in_threadpool(get_bulk_store().delete, job_id):
+        raise HTTPException(status_code=404, detail="Задание не найдено")
+    return {"status": "deleted", "id": job_id}
+
+
 @app.get("/")
 async def root():
     """Корневой эндпоинт."""
@@ -1197,6 +2682,11 @@ async def root():
         "embedding_model": "gemini-embedding-001" if use_gemini else f"local ({EMBEDDING_DIMENSION}d)",
         "docs": "/docs",
         "health": "/api/health",
+        "ready": "/api/ready",
         "search": "POST /api/search",
-        "filters": "GET /api/filters"
+        "similar": "GET /api/cases/{index}/similar",
+        "filters": "GET /api/filters",
+        "suggest": "GET /api/suggest?q=...",
+        "jobs": "POST /api/jobs",
+        "metrics": "/metrics"
     }
@@ -0,0 +1,136 @@
+"""
+Учёт памяти структур индекса и процесса (для /api/admin/memory).
+
+- deep_sizeof: размер объекта Python с вложенными объектами (каждый объект
+  учитывается один раз, общие строки - у первого владельца);
+- array_info: размер, dtype и способ хранения матрицы numpy;
+- process_memory: RSS/PSS процесса и резидентная часть отображённых файлов
+  (/proc/self/smaps_rollup и /proc/self/smaps, только Linux).
+"""
+
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def deep_sizeof(obj, seen: Optional[set] = None) -> int:
+    """Размер объекта в байтах вместе со всем, на что он ссылается."""
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        if isinstance(current, np.ndarray):
+            # Память данных учитывается только у владельца буфера; mmap - не в куче процесса
+            total += sys.getsizeof(current) if current.base is not None else current.nbytes + sys.getsizeof(current)
+            continue
+        total += sys.getsizeof(current)
+        if isinstance(current, (str, bytes, int, float, bool, type(None))):
+            continue
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        else:
+            if hasattr(current, "__dict__"):
+                stack.append(current.__dict__)
+            for slot in getattr(type(current), "__slots__", ()):
+                if hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+    return total
+
+
+def is_mmapped(array: np.ndarray) -> bool:
+    """Данные матрицы отображены из файла (np.load(mmap_mode=...))."""
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base if isinstance(array.base, np.ndarray) else None
+    return False
+
+
+def array_info(array: Optional[np.ndarray]) -> Optional[dict]:
+    """Размер и тип хранения матрицы."""
+    if array is None:
+        return None
+    info = {
+        "bytes": int(array.nbytes),
+        "shape": list(array.shape),
+        "dtype": str(array.dtype),
+        "mmap": is_mmapped(array),
+    }
+    filename = getattr(array, "filename", None)
+    if filename:
+        info["file"] = str(filename)
+    return info
+
+
+def _parse_kb(lines: Iterable[str], fields: Iterable[str]) -> Dict[str, int]:
+    wanted = set(fields)
+    result = {}
+    for line in lines:
+        name, _, rest = line.partition(":")
+        if name in wanted:
+            result[name] = int(rest.split()[0]) * 1024
+    return result
+
+
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty", "Swap")
+
+
+def mapped_files(paths: Iterable[str]) -> Dict[str, dict]:
+    """Резидентная память (Rss/Pss) отображений заданных файлов по /proc/self/smaps."""
+    wanted = {os.path.realpath(p) for p in paths}
+    result: Dict[str, dict] = {}
+    smaps = Path("/proc/self/smaps")
+    if not wanted or not smaps.exists():
+        return result
+    current = None
+    with open(smaps, "r") as f:
+        for line in f:
+            head = line.split(None, 5)
+            # Заголовок отображения: "адреса права смещение устройство inode [путь]"
+            if len(head) >= 5 and "-" in head[0] and ":" not in head[0]:
+                path = head[5].strip() if len(head) == 6 else ""
+                current = path if path in wanted else None
+                continue
+            if current is None:
+                continue
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                entry = result.setdefault(current, {"Rss": 0, "Pss": 0})
+                entry[name] += int(rest.split()[0]) * 1024
+    return result
+
+
+def process_memory() -> dict:
+    """RSS/PSS процесса в байтах (Linux) и пиковый RSS."""
+    result = {}
+    rollup = Path("/proc/self/smaps_rollup")
+    if rollup.exists():
+        with open(rollup, "r") as f:
+            result.update({k.lower(): v for k, v in _parse_kb(f, SMAPS_FIELDS).items()})
+    else:
+        status = Path("/proc/self/status")
+        if status.exists():
+            with open(status, "r") as f:
+                parsed = _parse_kb(f, ("VmRSS",))
+            if "VmRSS" in parsed:
+                result["rss"] = parsed["VmRSS"]
+    if resource is not None:
+        # ru_maxrss: килобайты в Linux, байты в macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        result["max_rss"] = maxrss if sys.platform == "darwin" else maxrss * 1024
+    return result
@@ -0,0 +1,250 @@
+"""
+Метрики в формате Prometheus (text exposition 0.0.4) без внешних зависимостей.
+
+Счётчики, гистограммы и gauge с метками; отдаются эндпоинтом /metrics.
+Метрики живут в памяти процесса и помечаются меткой worker (pid).
+При serve.py воркеры делят один сокет, и запрос /metrics попадает в
+случайный воркер, поэтому в этом режиме (METRICS_DIR) каждый воркер
+периодически сбрасывает свои значения в файл, а /metrics отдаёт
+значения всех живых воркеров. Суммирование - в Prometheus
+(sum without (worker) (...)).
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Границы гистограмм длительностей стадий, секунды
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Число кандидатов на стадиях поиска
+COUNT_BUCKETS = (0, 1, 5, 10, 20, 50, 100, 150, 200)
+# Доли 0..1 (селективность фильтров)
+RATIO_BUCKETS = (0.0, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self, constant: Tuple[Tuple[str, str], ...]) -> List[str]:
+        """Строки экспозиции метрики с постоянными метками constant."""
+
+
+class Counter(_Metric):
+    """Монотонный счётчик."""
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self, constant: Tuple[Tuple[str, str], ...]) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key, constant)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """Текущее значение."""
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def samples(self, constant: Tuple[Tuple[str, str], ...]) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key, constant)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными границами корзин."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # ключ меток -> [счётчики корзин..., сумма, количество]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self, constant: Tuple[Tuple[str, str], ...]) -> List[str]:
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        lines = []
+        for key, state in items:
+            cumulative = 0.0
+            for i, bound in enumerate(self.buckets):
+                cumulative += state[i]
+                le = (("le", _format_value(bound)),)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, constant + le)} "
+                             f"{_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key, constant)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(state[-1])}")
+        return lines
+
+
+class Registry:
+    """Набор метрик процесса."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def _constant(self) -> Tuple[Tuple[str, str], ...]:
+        return (("worker", str(os.getpid())),)
+
+    def samples(self) -> Dict[str, List[str]]:
+        """Строки значений процесса по именам метрик."""
+        constant = self._constant()
+        return {metric.name: metric.samples(constant) for metric in self._metrics}
+
+    def render(self, others: Sequence[Dict[str, List[str]]] = ()) -> str:
+        """
+        Текст для /metrics: значения процесса и (при METRICS_DIR)
+        значения других воркеров, сгруппированные по метрикам.
+        """
+        own = self.samples()
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(own[metric.name])
+            for samples in others:
+                lines.extend(samples.get(metric.name, ()))
+        return "\n".join(lines) + "\n"
+
+
+class MetricsDirectory:
+    """
+    Обмен метриками между воркерами через файлы <pid>.json в общей директории.
+    Файлы, не обновлявшиеся дольше stale_after секунд (воркер завершён), не учитываются.
+    """
+
+    def __init__(self, registry: Registry, path: Path, interval: float = 5.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.stale_after = max(interval * 3, 15.0)
+        self._pid: Optional[int] = None
+
+    def _own_file(self) -> Path:
+        return self.path / f"{os.getpid()}.json"
+
+    def dump(self):
+        """Записать значения процесса (атомарно через rename)."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        target = self._own_file()
+        tmp = target.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.registry.samples(), f, ensure_ascii=False)
+        os.replace(tmp, target)
+
+    def _run(self):
+        while True:
+            try:
+                self.dump()
+            except OSError as e:
+                print(f"Ошибка записи метрик в {self.path}: {e}")
+            time.sleep(self.interval)
+
+    def ensure_started(self):
+        """Фоновый сброс метрик; поток создаётся заново после fork."""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        threading.Thread(target=self._run, name="metrics-dump", daemon=True).start()
+
+    def others(self) -> List[Dict[str, List[str]]]:
+        """Последние значения остальных живых воркеров."""
+        result = []
+        own = self._own_file().name
+        now = time.time()
+        for file in self.path.glob("*.json"):
+            if file.name == own:
+                continue
+            try:
+                if now - file.stat().st_mtime > self.stale_after:
+                    continue
+                with open(file, "r", encoding="utf-8") as f:
+                    result.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return result
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
@@ -0,0 +1,125 @@
+"""
+Кластеры почти одинаковых решений (MinHash + LSH).
+
+В выгрузке ФАС много почти совпадающих решений: один и тот же
+рекламодатель и та же реклама в разных территориальных управлениях.
+prepare_data.py присваивает каждому кейсу номер кластера по тексту
+ad_content_cited + FAS_arguments, поиск с collapse_duplicates оставляет
+из кластера только лучший результат.
+
+- Текст -> множество шинглов (SHINGLE_WORDS слов подряд) -> MinHash-подпись
+  из NUM_PERM минимумов (доля совпадающих позиций двух подписей - оценка
+  коэффициента Жаккара множеств шинглов).
+- LSH: подпись делится на BANDS полос; кейсы с одинаковой полосой - кандидаты.
+  Кандидат сравнивается не со всеми кейсами корзины, а с её первыми
+  MAX_BUCKET_REPRESENTATIVES представителями, поэтому время почти линейно
+  по числу кейсов.
+- Пары с оценкой сходства не ниже порога объединяются (union-find);
+  номер кластера - наименьший номер строки в нём, у одиночных - своя строка.
+"""
+
+import re
+import zlib
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+DUPLICATE_CLUSTERS_FILE = "duplicate_clusters.npy"
+
+NUM_PERM = 128
+BANDS = 16
+SHINGLE_WORDS = 3
+MAX_BUCKET_REPRESENTATIVES = 8
+
+# Параметры хэш-функций фиксированы: подписи воспроизводимы между запусками
+_rng = np.random.RandomState(0x5EED)
+_HASH_A = _rng.randint(0, 2 ** 62, NUM_PERM, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+_HASH_B = _rng.randint(0, 2 ** 62, NUM_PERM, dtype=np.int64).astype(np.uint64)
+
+
+def shingles(text: str) -> np.ndarray:
+    """Хэши (crc32) шинглов текста без повторов."""
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    if len(words) <= SHINGLE_WORDS:
+        grams = {" ".join(words)}
+    else:
+        grams = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    return np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash(text: str) -> Optional[np.ndarray]:
+    """MinHash-подпись (uint32 [NUM_PERM]); None - в тексте нет слов."""
+    values = shingles(text)
+    if values.size == 0:
+        return None
+    # Хэш multiply-shift: (a*x + b) mod 2^64, старшие 32 бита
+    with np.errstate(over="ignore"):
+        hashed = (values[:, None] * _HASH_A + _HASH_B) >> np.uint64(32)
+    return hashed.min(axis=0).astype(np.uint32)
+
+
+class DuplicateClusterer:
+    """Накопление подписей по частям выгрузки и разбиение на кластеры."""
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self._signatures: List[Optional[np.ndarray]] = []
+
+    def add(self, texts: Sequence[str]):
+        self._signatures.extend(minhash(text) for text in texts)
+
+    def clusters(self) -> np.ndarray:
+        """Номер кластера каждой строки (int32): наименьшая строка кластера."""
+        n = len(self._signatures)
+        parent = list(range(n))
+
+        def find(row: int) -> int:
+            while parent[row] != row:
+                parent[row] = parent[parent[row]]
+                row = parent[row]
+            return row
+
+        rows = [row for row, signature in enumerate(self._signatures) if signature is not None]
+        if rows:
+            signatures = np.stack([self._signatures[row] for row in rows])
+            band_width = NUM_PERM // BANDS
+            min_matches = self.threshold * NUM_PERM
+            for band in range(BANDS):
+                keys = signatures[:, band * band_width:(band + 1) * band_width]
+                buckets = {}
+                for i, row in enumerate(rows):
+                    representatives = buckets.setdefault(keys[i].tobytes(), [])
+                    root = find(row)
+                    for rep_i, rep in representatives:
+                        if find(rep) == root:
+                            break
+                        if np.count_nonzero(signatures[rep_i] == signatures[i]) >= min_matches:
+                            parent[root] = find(rep)
+                            break
+                    else:
+                        if len(representatives) < MAX_BUCKET_REPRESENTATIVES:
+                            representatives.append((i, row))
+
+        roots = [find(row) for row in range(n)]
+        smallest = {}
+        for row, root in enumerate(roots):
+            smallest.setdefault(root, row)
+        return np.array([smallest[root] for root in roots], dtype=np.int32)
+
+
+def collapse_duplicates(results: List[dict], cluster_of: Callable[[int], int]) -> List[dict]:
+    """
+    Оставить из каждого кластера первый (лучший) результат. results - по
+    убыванию оценки, с ключом 'index'; cluster_of(index) - номер кластера.
+    """
+    seen = set()
+    collapsed = []
+    for result in results:
+        cluster = cluster_of(result['index'])
+        if cluster in seen:
+            continue
+        seen.add(cluster)
+        collapsed.append(result)
+    return collapsed
@@ -2,38 +2,90 @@
 Скрипт подготовки данных: генерация эмбеддингов из CSV файла решений ФАС.
 Использует Google Gemini Embedding API (новый SDK google-genai).
 Запуск: python prepare_data.py
+        python prepare_data.py --incremental  # эмбеддинги только для новых/изменённых текстов
+        python prepare_data.py --backfill     # дозапрос эмбеддингов, не полученных из-за ошибок API
+
+Рядом с каждой матрицей embeddings_<поле>.npy сохраняется маска valid_<поле>.npy:
+True - у строки есть настоящий эмбеддинг, False - текст пустой или батч не удался.
+По эмбеддингам строится граф ближайших соседей knn_<поле>_*.npy (KNN_K, knn_graph.py);
+в режимах --incremental и --backfill он по возможности дополняется, а не строится заново.
+Почти одинаковые решения объединяются в кластеры duplicate_clusters.npy (near_duplicates.py).
 """
 
+import argparse
+import hashlib
 import json
+import os
+import shutil
 import numpy as np
 import pandas as pd
 from pathlib import Path
+import threading
 import time
-import sys
+from array import array
+from collections.abc import Sequence
+from functools import partial
+from typing import Iterator, Optional
 
-# Новый SDK google-genai
-from google import genai
+# Новый SDK google-genai (клиент создаётся в Config.create_genai_client)
 from google.genai import types
 
 from config import Config
+from embedding_pipeline import EmbeddingJob, RetryPolicy, TokenBucket, run_embedding_jobs
+from knn_graph import (
+    block_rows_for, build_knn, knn_ids_file, knn_scores_file, load_knn_graph, save_knn_graph, update_knn,
+)
+from near_duplicates import DUPLICATE_CLUSTERS_FILE, DuplicateClusterer
+from text_column import TextColumnWriter
+from vector_cache import VectorCache, normalize_text
 
 
 # Глобальная переменная для клиента
 client = None
 
+# Кэш векторов по содержимому текста (см. init_vector_cache)
+vector_cache: Optional[VectorCache] = None
+
+# Поля с эмбеддингами
+EMBEDDING_FIELDS = ['FAS_arguments', 'violation_summary', 'ad_description']
+
+# Хэши текстов, по которым построены эмбеддинги (для инкрементального режима)
+HASHES_FILE = "embedding_hashes.json"
+# Кэш векторов уникальных текстов между запусками
+VECTOR_CACHE_FILE = "embedding_cache.sqlite3"
+
+# Чекпоинты незавершённых заданий эмбеддинга (внутри директории данных)
+CHECKPOINT_DIR = "checkpoints"
+# Тексты полей текущего запуска на диске (text_column.py), удаляются по завершении
+TEXTS_DIR = "ingest_texts"
+
+# Векторов за один шаг чтения/копирования: в памяти не больше VECTOR_CHUNK x D
+VECTOR_CHUNK = 1024
+
 
 def init_genai_client():
     """Инициализация клиента Gemini."""
     global client
     api_key = Config.get_api_key()
     
-    client = genai.Client(api_key=api_key)
+    client = Config.create_genai_client()
     
     print(f"Gemini API настроен с ключом: {api_key[:10]}...")
+    if Config.GEMINI_BASE_URL:
+        print(f"Адрес Gemini API: {Config.GEMINI_BASE_URL}")
     print(f"Модель: gemini-embedding-001")
     print(f"Размерность эмбеддингов: {Config.EMBEDDING_DIMENSION}")
 
 
+def init_vector_cache(data_dir: Path):
+    """Открыть кэш векторов в директории данных (EMBEDDING_CACHE=true)."""
+    global vector_cache
+    if not Config.EMBEDDING_CACHE:
+        return
+    vector_cache = VectorCache(data_dir / VECTOR_CACHE_FILE, "gemini-embedding-001", Config.EMBEDDING_DIMENSION)
+    print(f"Кэш векторов: {vector_cache.path} ({len(vector_cache)} векторов)")
+
+
 def get_embedding(text: str, task_type: str = "retrieval_document") -> np.ndarray:
     """
     Создать эмбеддинг для текста через Gemini API.
@@ -48,11 +100,8 @@ def get_embedding(text: str, task_type: str = "retrieval_document") -> np.ndarra
     if not text or not text.strip():
         return np.zeros(Config.EMBEDDING_DIMENSION)
     
-    task_type_map = {
-        "retrieval_query": types.EmbedContentTaskType.RETRIEVAL_QUERY,
-        "retrieval_document": types.EmbedContentTaskType.RETRIEVAL_DOCUMENT,
-    }
-    task = task_type_map.get(task_type, types.EmbedContentTaskType.RETRIEVAL_DOCUMENT)
+    # task_type это просто строка в новом SDK (как в main.py)
+    task = task_type if task_type in ("retrieval_query", "retrieval_document") else "retrieval_document"
     
     try:
         result = client.models.embed_content(
@@ -79,8 +128,270 @@ def get_embedding(text: str, task_type: str = "retrieval_document") -> np.ndarra
         return None  # Возвращаем None чтобы указать на ошибку
 
 
+def _job_id(texts: list[str], task: str) -> str:
+    """Идентификатор задания эмбеддинга: модель, размерность, тип задачи и все тексты."""
+    h = hashlib.sha256(f"gemini-embedding-001:{Config.EMBEDDING_DIMENSION}:{task}".encode())
+    for text in texts:
+        h.update(hashlib.sha256(text.encode("utf-8")).digest())
+    return h.hexdigest()
+
+
+class EmbeddingCheckpoint:
+    """
+    Чекпоинт задания эмбеддинга на диске.
+    - {path}.partial.npy - заранее выделенная матрица (np.memmap), куда пишется
+      каждый готовый батч;
+    - {path}.checkpoint.json - номера готовых батчей.
+    Батч отмечается готовым только после flush данных, поэтому после сбоя
+    повторный запуск продолжает с первого незавершённого батча.
+    """
+    
+    def __init__(self, path: Path, job_id: str, total: int, batch_size: int):
+        self.partial_path = path.with_name(path.name + ".partial.npy")
+        self.checkpoint_path = path.with_name(path.name + ".checkpoint.json")
+        self.job_id = job_id
+        self.batch_size = batch_size
+        self.done: set[int] = set()
+        # Батчи завершаются в разных потоках конвейера
+        self._lock = threading.Lock()
+        
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shape = (total, Config.EMBEDDING_DIMENSION)
+        state = None
+        if self.checkpoint_path.exists() and self.partial_path.exists():
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        
+        if state and state.get("job_id") == job_id and state.get("batch_size") == batch_size:
+            self.embeddings = np.lib.format.open_memmap(self.partial_path, mode="r+")
+            self.done = set(state.get("done", []))
+            print(f"  Продолжение с чекпоинта: готово батчей {len(self.done)}")
+        else:
+            self.embeddings = np.lib.format.open_memmap(self.partial_path, mode="w+", dtype=np.float64, shape=shape)
+            self._save_state()
+    
+    def _save_state(self):
+        tmp_path = self.checkpoint_path.with_name(self.checkpoint_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"job_id": self.job_id, "batch_size": self.batch_size, "done": sorted(self.done)}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+    
+    def mark_done(self, batch_index: int):
+        """Зафиксировать батч: сначала данные на диск, затем номер в чекпоинт."""
+        with self._lock:
+            self.embeddings.flush()
+            self.done.add(batch_index)
+            self._save_state()
+
+
+def remove_checkpoints(checkpoint_dir: Path):
+    """Удалить все чекпоинты заданий в директории."""
+    if not checkpoint_dir.exists():
+        return
+    for path in checkpoint_dir.iterdir():
+        if path.name.endswith((".partial.npy", ".checkpoint.json")):
+            path.unlink()
+
+
+def _vector_key(text: str, task: str) -> str:
+    """Ключ содержимого текста (совпадает с ключом кэша векторов)."""
+    if vector_cache is not None:
+        return vector_cache.key(text, task)
+    return hashlib.sha256(f"{task}:{text}".encode("utf-8")).hexdigest()
+
+
+def _embed_api_call(batch: list[str], task: str) -> list[list[float]]:
+    """Один запрос к Gemini API для батча текстов. Ошибки пробрасываются в конвейер."""
+    result = client.models.embed_content(
+        model="gemini-embedding-001",
+        contents=batch,
+        config=types.EmbedContentConfig(
+            task_type=task,
+            output_dimensionality=Config.EMBEDDING_DIMENSION
+        )
+    )
+    return [emb.values for emb in result.embeddings]
+
+
+class _RowTexts(Sequence):
+    """Нормализованные тексты строк rows набора texts (читаются по мере обращения)."""
+    
+    def __init__(self, texts, rows: np.ndarray):
+        self.texts = texts
+        self.rows = rows
+    
+    def __len__(self) -> int:
+        return len(self.rows)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [normalize_text(self.texts[int(row)]) for row in self.rows[index]]
+        return normalize_text(self.texts[int(self.rows[index])])
+
+
+def embed_texts_concurrently(jobs: dict, task_type: str = "retrieval_document",
+                             retry_on_quota: bool = True, outputs: Optional[dict] = None,
+                             rows: Optional[dict] = None) -> dict:
+    """
+    Эмбеддинги для нескольких наборов текстов (например, всех полей) одновременно.
+    Батчи всех наборов идут через общий пул потоков и общий лимитер квоты
+    (EMBEDDING_WORKERS, EMBEDDING_RPM, EMBEDDING_TEXTS_PER_MINUTE).
+    
+    Тексты нормализуются и дедуплицируются по всем наборам: каждый уникальный
+    текст запрашивается один раз (в наборе, где встретился первым), вектор
+    раздаётся всем его строкам. Тексты, уже лежащие в кэше векторов
+    (vector_cache), в API не отправляются.
+    
+    Векторы не накапливаются в памяти: вектор уникального текста пишется в
+    строку его первого появления в outputs, остальные строки копируются
+    оттуда частями. Тексты читаются из наборов по мере надобности, поэтому
+    набор может быть колонкой на диске (text_column.TextColumn).
+    
+    Args:
+        jobs: {имя: (тексты, путь чекпоинта или None)}
+        task_type: Тип задачи
+        retry_on_quota: Повторять ли неудачные батчи
+        outputs: {имя: (матрица (len(тексты), Config.EMBEDDING_DIMENSION), маска (len(тексты),))} -
+            куда писать результат (например, open_npy_output); по умолчанию - новые массивы в памяти
+        rows: {имя: номера строк} - эмбеддинги нужны только этим строкам (по умолчанию всем);
+            остальные строки outputs не изменяются
+    
+    Returns:
+        {имя: (матрица, маска валидности)} - outputs.
+        В маске False - пустые тексты и строки батчей, не удавшихся после всех повторов.
+    """
+    # task_type это просто строка в новом SDK (как в main.py)
+    task = task_type if task_type in ("retrieval_query", "retrieval_document") else "retrieval_document"
+    batch_size = 100
+    names = list(jobs)
+    if outputs is None:
+        outputs = {
+            name: (np.zeros((len(texts), Config.EMBEDDING_DIMENSION)), np.zeros(len(texts), dtype=bool))
+            for name, (texts, _) in jobs.items()
+        }
+    
+    # Ключ содержимого каждой непустой строки. Для уникального ключа хранится
+    # только место первого появления (набор, строка) - не текст и не вектор
+    key_ids = {}
+    first_job = array("i")
+    first_row = array("q")
+    row_keys = {}
+    for job_index, name in enumerate(names):
+        texts = jobs[name][0]
+        selected = range(len(texts)) if rows is None or name not in rows else rows[name]
+        job_rows = array("q")
+        job_uids = array("q")
+        for row in selected:
+            # Пустые тексты не отправляем в API - их эмбеддинг нулевой (как в get_embedding)
+            normalized = normalize_text(texts[int(row)])
+            if not normalized:
+                continue
+            key = _vector_key(normalized, task)
+            uid = key_ids.get(key)
+            if uid is None:
+                uid = key_ids[key] = len(first_row)
+                first_job.append(job_index)
+                first_row.append(int(row))
+            job_rows.append(int(row))
+            job_uids.append(uid)
+        row_keys[name] = (np.array(job_rows, dtype=np.int64), np.array(job_uids, dtype=np.int64))
+    keys = list(key_ids)
+    first_job = np.array(first_job, dtype=np.int32)
+    first_row = np.array(first_row, dtype=np.int64)
+    found = np.zeros(len(keys), dtype=bool)
+    
+    def store(uids: np.ndarray, vectors):
+        """Записать векторы уникальных текстов в строки их первого появления."""
+        for job_index, name in enumerate(names):
+            mine = first_job[uids] == job_index
+            if np.any(mine):
+                outputs[name][0][first_row[uids[mine]]] = np.asarray(vectors)[mine]
+        found[uids] = True
+    
+    if vector_cache is not None:
+        for start in range(0, len(keys), VECTOR_CHUNK):
+            chunk = keys[start:start + VECTOR_CHUNK]
+            cached = vector_cache.get_many(chunk)
+            if cached:
+                uids = np.array([key_ids[key] for key in cached], dtype=np.int64)
+                store(uids, np.stack(list(cached.values())))
+    total_rows = sum(len(job_rows) for job_rows, _ in row_keys.values())
+    print(f"\nТекстов: {total_rows}, уникальных: {len(keys)}, из кэша векторов: {int(found.sum())}")
+    
+    pipeline_jobs = []
+    job_uids = {}
+    for job_index, name in enumerate(names):
+        texts, checkpoint_path = jobs[name]
+        job_uids[name] = np.flatnonzero((first_job == job_index) & ~found)
+        if not len(job_uids[name]):
+            continue
+        job_texts = _RowTexts(texts, first_row[job_uids[name]])
+        
+        print(f"\n[{name}] генерация эмбеддингов для {len(job_texts)} текстов...")
+        # Результат пишется в заранее выделенную матрицу: в памяти или на диске (чекпоинт)
+        if checkpoint_path is not None:
+            checkpoint = EmbeddingCheckpoint(checkpoint_path, _job_id(job_texts, task), len(job_texts), batch_size)
+            pipeline_jobs.append(EmbeddingJob(
+                name=name, texts=job_texts, output=checkpoint.embeddings, batch_size=batch_size,
+                done=set(checkpoint.done), on_batch_done=checkpoint.mark_done
+            ))
+        else:
+            pipeline_jobs.append(EmbeddingJob(
+                name=name, texts=job_texts, output=np.zeros((len(job_texts), Config.EMBEDDING_DIMENSION)),
+                batch_size=batch_size
+            ))
+    
+    if pipeline_jobs:
+        run_embedding_jobs(
+            pipeline_jobs,
+            embed_fn=partial(_embed_api_call, task=task),
+            workers=Config.EMBEDDING_WORKERS,
+            request_limiter=TokenBucket(Config.EMBEDDING_RPM),
+            text_limiter=TokenBucket(Config.EMBEDDING_TEXTS_PER_MINUTE, capacity=max(batch_size, Config.EMBEDDING_TEXTS_PER_MINUTE / 60)),
+            retry=RetryPolicy(max_retries=Config.EMBEDDING_MAX_RETRIES if retry_on_quota else 0)
+        )
+    
+    for job in pipeline_jobs:
+        job_valid = np.ones(len(job.texts), dtype=bool)
+        for b in job.failed_batches:
+            job_valid[(b - 1) * batch_size:b * batch_size] = False
+        # Новые векторы - в outputs и в кэш (только настоящие: неудачные запросим в следующий раз)
+        for start in range(0, len(job.texts), VECTOR_CHUNK):
+            positions = np.flatnonzero(job_valid[start:start + VECTOR_CHUNK]) + start
+            if not len(positions):
+                continue
+            uids = job_uids[job.name][positions]
+            vectors = np.asarray(job.output[positions], dtype=np.float64)
+            store(uids, vectors)
+            if vector_cache is not None:
+                vector_cache.put_many({keys[uid]: vector for uid, vector in zip(uids.tolist(), vectors)})
+        if job.failed_batches:
+            failed = int((~job_valid).sum())
+            print(f"  [{job.name}] Внимание: {failed} эмбеддингов не удалось создать "
+                  f"(отмечены в маске, восстановить: python prepare_data.py --backfill)")
+    
+    # Раздаём векторы уникальных текстов по остальным строкам всех наборов
+    for job_index, name in enumerate(names):
+        embeddings, valid = outputs[name]
+        job_rows, uids = row_keys[name]
+        for start in range(0, len(job_rows), VECTOR_CHUNK):
+            chunk_rows = job_rows[start:start + VECTOR_CHUNK]
+            chunk_uids = uids[start:start + VECTOR_CHUNK]
+            chunk_found = found[chunk_uids]
+            valid[chunk_rows] = chunk_found
+            embeddings[chunk_rows[~chunk_found]] = 0
+            for source_index, source in enumerate(names):
+                copy = chunk_found & (first_job[chunk_uids] == source_index)
+                if source_index == job_index:
+                    copy &= first_row[chunk_uids] != chunk_rows
+                if np.any(copy):
+                    embeddings[chunk_rows[copy]] = outputs[source][0][first_row[chunk_uids[copy]]]
+    
+    return outputs
+
+
 def get_embeddings_batch(texts: list[str], task_type: str = "retrieval_document", 
-                         retry_on_quota: bool = True) -> np.ndarray:
+                         retry_on_quota: bool = True, checkpoint_path: Optional[Path] = None) -> np.ndarray:
     """
     Создать эмбеддинги для списка текстов через Gemini API.
     
@@ -88,196 +399,600 @@ def get_embeddings_batch(texts: list[str], task_type: str = "retrieval_document"
         texts: Список текстов для эмбеддингов
         task_type: Тип задачи
         retry_on_quota: Повторять ли при ошибке квоты
+        checkpoint_path: Путь задания для чекпоинтов; если задан, готовые батчи
+            сохраняются на диск и повторный запуск продолжает с места сбоя
     
     Returns:
         numpy array формы (len(texts), Config.EMBEDDING_DIMENSION)
     """
     if not texts:
         return np.array([])
-    
-    all_embeddings = []
-    failed_count = 0
-    batch_size = 100
-    
-    task_type_map = {
-        "retrieval_query": types.EmbedContentTaskType.RETRIEVAL_QUERY,
-        "retrieval_document": types.EmbedContentTaskType.RETRIEVAL_DOCUMENT,
-    }
-    task = task_type_map.get(task_type, types.EmbedContentTaskType.RETRIEVAL_DOCUMENT)
-    
-    total_batches = (len(texts) + batch_size - 1) // batch_size
-    print(f"\nГенерация эмбеддингов для {len(texts)} текстов...")
-    
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i:i + batch_size]
-        batch_num = i // batch_size + 1
-        
-        if batch_num % 5 == 0 or batch_num == 1:
-            print(f"  Батч {batch_num}/{total_batches}... (неудачных: {failed_count})")
-            sys.stdout.flush()
-        
-        try:
-            result = client.models.embed_content(
-                model="gemini-embedding-001",
-                contents=batch,
-                config=types.EmbedContentConfig(
-                    task_type=task,
-                    output_dimensionality=Config.EMBEDDING_DIMENSION
-                )
-            )
-            for emb in result.embeddings:
-                all_embeddings.append(np.array(emb.values))
-                
-        except Exception as e:
-            error_msg = str(e)
-            # При ошибке используем нулевые векторы
-            print(f"  Батч {batch_num} ошибка: {error_msg[:50]}...")
-            for _ in range(len(batch)):
-                all_embeddings.append(np.zeros(Config.EMBEDDING_DIMENSION))
-                failed_count += 1
-            
-            # Если это ошибка квоты - ждем и пробуем еще раз
-            if retry_on_quota and failed_count > 10:
-                print(f"\n⚠️ Слишком много ошибок API. Ждем 60 секунд...")
-                time.sleep(60)
-                failed_count = 0
-    
-    if failed_count > 0:
-        print(f"  Внимание: {failed_count} эмбеддингов не удалось создать (использованы нулевые векторы)")
-    
-    return np.array(all_embeddings)
-
-
-def load_csv() -> pd.DataFrame:
-    """Загрузка CSV файла с решениями ФАС."""
+    embeddings, _ = embed_texts_concurrently({"texts": (texts, checkpoint_path)}, task_type, retry_on_quota)["texts"]
+    return embeddings
+
+
+def save_npy_atomic(path: Path, array: np.ndarray):
+    """
+    Сохранить .npy атомарно: запись во временный файл и os.replace.
+    Сервер может держать старый файл отображённым в память (INDEX_MMAP) -
+    перезапись на месте привела бы к SIGBUS в его процессах.
+    """
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def open_npy_output(path: Path, shape: tuple, dtype=np.float64) -> np.ndarray:
+    """
+    Матрица результата на диске: временный .npy рядом с path, заполненный нулями
+    (np.memmap - в памяти только страницы, с которыми идёт работа).
+    Итоговый файл заменяется в commit_npy_output.
+    """
+    tmp_path = path.with_name(path.name + ".tmp")
+    if not shape[0]:
+        # Пустую матрицу отобразить в память нельзя
+        return np.zeros(shape, dtype=dtype)
+    return np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+
+
+def commit_npy_output(path: Path, array: np.ndarray):
+    """Сохранить матрицу из open_npy_output атомарно (как save_npy_atomic)."""
+    if not isinstance(array, np.memmap):
+        save_npy_atomic(path, array)
+        return
+    array.flush()
+    os.replace(array.filename, path)
+
+
+def save_json_atomic(path: Path, data):
+    """Сохранить JSON атомарно (временный файл + os.replace)."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def find_csv_path() -> Path:
+    """Найти CSV файл с решениями ФАС."""
     # Попробовать разные пути к CSV
     possible_paths = [
         Path(__file__).parent.parent / "fas_ad_practice_dataset.csv",
         Path(__file__).parent.parent / "Legal" / "fas_ad_practice_dataset.csv",
     ]
     
-    csv_path = None
     for path in possible_paths:
         if path.exists():
-            csv_path = path
-            break
+            return path
     
-    if csv_path is None:
-        raise FileNotFoundError(f"CSV файл не найден. Проверьте пути: {[str(p) for p in possible_paths]}")
-    
-    print(f"Загрузка CSV: {csv_path}")
-    df = pd.read_csv(csv_path, sep=";", encoding="utf-8")
-    print(f"Загружено {len(df)} записей")
-    return df
+    raise FileNotFoundError(f"CSV файл не найден. Проверьте пути: {[str(p) for p in possible_paths]}")
+
+
+def iter_csv_chunks(csv_path: Path, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """
+    Читать CSV частями по chunk_size строк - в памяти не больше одной части.
+    Все колонки читаются как строки: тип не зависит от содержимого части
+    (иначе docId в части с пропусками превратился бы в float).
+    Индекс строк сквозной по всему файлу.
+    """
+    print(f"Чтение CSV частями по {chunk_size} строк: {csv_path}")
+    return pd.read_csv(csv_path, sep=";", encoding="utf-8", dtype=str, chunksize=chunk_size)
+
+
+def _text_column(df: pd.DataFrame, column: str) -> pd.Series:
+    """Колонка как строки, пропуски и отсутствующая колонка - пустая строка."""
+    if column not in df.columns:
+        return pd.Series("", index=df.index, dtype=object)
+    return df[column].fillna("").astype(str)
+
+
+def extract_fas_thesis(fas_arguments: pd.Series) -> pd.Series:
+    """
+    Текст FAS_arguments для эмбеддинга (векторизовано):
+    "Ключевой тезис: ... Юридическое ..." -> тезис, иначе первые 500 символов.
+    """
+    has_thesis = fas_arguments.str.contains("Ключевой тезис:", regex=False)
+    thesis = (
+        fas_arguments.str.split("Ключевой тезис:", regex=False).str[1]
+        .str.split("Юридическое", regex=False).str[0]
+        .str.strip()
+    )
+    return thesis.where(has_thesis, fas_arguments.str[:500]).fillna("")
 
 
 def prepare_separate_field_texts(df: pd.DataFrame) -> dict:
     """Подготовить отдельные тексты для каждого поля с эмбеддингами."""
-    fas_args_texts = []
-    violation_texts = []
-    ad_desc_texts = []
-    
-    for _, row in df.iterrows():
-        # FAS_arguments - самое важное для первичного поиска
-        if pd.notna(row.get("FAS_arguments")):
-            args = str(row['FAS_arguments'])
-            if "Ключевой тезис:" in args:
-                thesis = args.split("Ключевой тезис:")[1].split("Юридическое")[0].strip()
-                fas_args_texts.append(thesis)
-            else:
-                fas_args_texts.append(args[:500])
-        else:
-            fas_args_texts.append("")
-        
-        # violation_summary - для переранжирования
-        if pd.notna(row.get("violation_summary")):
-            violation_texts.append(str(row['violation_summary']))
-        else:
-            violation_texts.append("")
-        
-        # ad_description - для переранжирования
-        if pd.notna(row.get("ad_description")):
-            ad_desc_texts.append(str(row['ad_description']))
-        else:
-            ad_desc_texts.append("")
-    
     return {
-        'FAS_arguments': fas_args_texts,
-        'violation_summary': violation_texts,
-        'ad_description': ad_desc_texts
+        # FAS_arguments - самое важное для первичного поиска
+        'FAS_arguments': extract_fas_thesis(_text_column(df, "FAS_arguments")).tolist(),
+        # violation_summary и ad_description - для переранжирования
+        'violation_summary': _text_column(df, "violation_summary").tolist(),
+        'ad_description': _text_column(df, "ad_description").tolist(),
     }
 
 
-def generate_embeddings(texts: list[str], task_type: str = "retrieval_document") -> np.ndarray:
+def generate_embeddings(texts: list[str], task_type: str = "retrieval_document",
+                        checkpoint_path: Optional[Path] = None) -> np.ndarray:
     """Генерация эмбеддингов для списка текстов через Google Gemini."""
-    embeddings = get_embeddings_batch(texts, task_type)
+    embeddings = get_embeddings_batch(texts, task_type, checkpoint_path=checkpoint_path)
     
     if embeddings.size > 0:
         print(f"Размерность эмбеддингов: {embeddings.shape}")
     return embeddings
 
 
+CASE_COLUMNS = [
+    "docId", "Violation_Type", "document_date", "FASbd_link",
+    "FAS_division", "violation_found", "defendant_name",
+    "defendant_industry", "ad_description", "ad_content_cited",
+    "ad_platform", "violation_summary", "FAS_arguments",
+    "legal_provisions", "thematic_tags"
+]
+
+
 def prepare_cases(df: pd.DataFrame) -> list[dict]:
     """Подготовка данных кейсов для JSON."""
-    cases = []
-    
-    columns = [
-        "docId", "Violation_Type", "document_date", "FASbd_link",
-        "FAS_division", "violation_found", "defendant_name",
-        "defendant_industry", "ad_description", "ad_content_cited",
-        "ad_platform", "violation_summary", "FAS_arguments",
-        "legal_provisions", "thematic_tags"
+    table = df.reindex(columns=CASE_COLUMNS)
+    # CSV читается с dtype=str, поэтому значения уже строки
+    table = table.astype(object).where(table.notna(), None)
+    return [
+        {"index": int(idx), **record}
+        for idx, record in zip(df.index, table.to_dict("records"))
     ]
+
+
+class CasesWriter:
+    """
+    Потоковая запись cases.json: кейсы дописываются во временный файл
+    по мере чтения CSV, commit() атомарно заменяет итоговый файл.
+    """
     
-    for idx, row in df.iterrows():
-        case = {"index": idx}
-        for col in columns:
-            value = row.get(col)
-            if pd.isna(value):
-                case[col] = None
-            else:
-                case[col] = str(value)
-        cases.append(case)
+    def __init__(self, path: Path):
+        self.path = path
+        self.tmp_path = path.with_name(path.name + ".tmp")
+        self.count = 0
+        self._file = open(self.tmp_path, "w", encoding="utf-8")
+        self._file.write("[")
+    
+    def write(self, cases: list[dict]):
+        for case in cases:
+            self._file.write(",\n  " if self.count else "\n  ")
+            self._file.write(json.dumps(case, ensure_ascii=False, indent=2).replace("\n", "\n  "))
+            self.count += 1
+    
+    def commit(self):
+        self._file.write("\n]" if self.count else "]")
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+    
+    def abort(self):
+        self._file.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+
+def duplicate_texts(df: pd.DataFrame) -> list[str]:
+    """Текст для поиска почти одинаковых решений: цитата рекламы и аргументы ФАС."""
+    return (_text_column(df, "ad_content_cited") + "\n" + _text_column(df, "FAS_arguments")).tolist()
+
+
+def ingest_csv(csv_path: Path, cases_writer: CasesWriter, chunk_size: int, texts_dir: Path,
+               clusterer: Optional[DuplicateClusterer] = None) -> tuple[dict, list]:
+    """
+    Потоковая обработка CSV: по каждой части готовятся тексты полей и кейсы,
+    кейсы сразу пишутся на диск, тексты полей - в колонки в texts_dir
+    (text_column.py). В памяти остаются только docId - DataFrame целиком
+    не создаётся. Если передан clusterer, в нём накапливаются
+    MinHash-подписи кейсов.
+    
+    Returns:
+        (тексты полей {поле: TextColumn}, docId по строкам)
+    """
+    writers = {field_name: TextColumnWriter(texts_dir / field_name) for field_name in EMBEDDING_FIELDS}
+    doc_ids = []
+    for chunk in iter_csv_chunks(csv_path, chunk_size):
+        for field_name, texts in prepare_separate_field_texts(chunk).items():
+            writers[field_name].extend(texts)
+        cases = prepare_cases(chunk)
+        if clusterer is not None:
+            clusterer.add(duplicate_texts(chunk))
+        doc_ids.extend(case["docId"] for case in cases)
+        cases_writer.write(cases)
+        print(f"  обработано строк: {len(doc_ids)}")
+    print(f"Загружено {len(doc_ids)} записей")
+    return {field_name: writer.close() for field_name, writer in writers.items()}, doc_ids
+
+
+def text_hash(text: str) -> str:
+    """Хэш текста поля - по нему определяется, нужен ли новый эмбеддинг."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def validity_path(data_dir: Path, field_name: str) -> Path:
+    """Файл маски валидности эмбеддингов поля (читается сервером, см. index_snapshot)."""
+    return data_dir / f"valid_{field_name}.npy"
+
+
+def load_previous_run(data_dir: Path) -> Optional[dict]:
+    """
+    Загрузить результаты предыдущего запуска для инкрементального режима:
+    хэши текстов по docId, номера строк по docId и матрицы эмбеддингов.
+    Возвращает None, если переиспользовать нечего (первый запуск, другая
+    модель или размерность).
+    """
+    hashes_path = data_dir / HASHES_FILE
+    cases_path = data_dir / "cases.json"
+    if not hashes_path.exists() or not cases_path.exists():
+        print("  Предыдущий запуск не найден - полная генерация")
+        return None
+    
+    with open(hashes_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("model") != "gemini-embedding-001" or manifest.get("dimension") != Config.EMBEDDING_DIMENSION:
+        print("  Модель или размерность изменились - полная генерация")
+        return None
+    
+    with open(cases_path, "r", encoding="utf-8") as f:
+        old_cases = json.load(f)
+    
+    doc_rows = {}
+    duplicated = set()
+    for row, case in enumerate(old_cases):
+        doc_id = case.get("docId")
+        if doc_id in doc_rows:
+            duplicated.add(doc_id)
+        elif doc_id is not None:
+            doc_rows[doc_id] = row
+    
+    hashes = manifest.get("fields", {})
+    if duplicated and manifest.get("duplicate_doc_ids") != "first_row":
+        # Старый манифест хранил хэш последней строки docId, а doc_rows - первую:
+        # векторы повторяющихся docId не переиспользуются
+        hashes = {
+            field_name: {doc_id: h for doc_id, h in field_hashes.items() if doc_id not in duplicated}
+            for field_name, field_hashes in hashes.items()
+        }
+    
+    embeddings = {}
+    valid = {}
+    for field_name in EMBEDDING_FIELDS:
+        path = data_dir / f"embeddings_{field_name}.npy"
+        if path.exists():
+            emb = np.load(path, mmap_mode="r")
+            if emb.shape == (len(old_cases), Config.EMBEDDING_DIMENSION):
+                embeddings[field_name] = emb
+                mask_path = validity_path(data_dir, field_name)
+                if mask_path.exists():
+                    mask = np.load(mask_path)
+                    if mask.shape == (len(old_cases),):
+                        valid[field_name] = mask
+    
+    return {
+        "doc_ids": [case.get("docId") for case in old_cases],
+        "doc_rows": doc_rows,
+        "hashes": hashes,
+        "embeddings": embeddings,
+        "valid": valid,
+        "knn": load_knn_graph(data_dir, len(old_cases), mmap=True),
+    }
+
+
+def plan_incremental_embeddings(field_name: str, texts, doc_ids: list, previous: Optional[dict],
+                                result: np.ndarray, valid: np.ndarray) -> list[int]:
+    """
+    Инкрементальный план для поля: переиспользованные векторы пишутся сразу
+    в матрицу результата result и маску valid, возвращаются номера строк,
+    которым нужен новый эмбеддинг.
+    Вектор строки берётся из старой матрицы, если у docId не изменился
+    хэш текста и старый вектор валиден по маске (без маски - не нулевой).
+    В Gemini отправляются только новые и изменённые непустые тексты.
+    """
+    old_emb = previous["embeddings"].get(field_name) if previous else None
+    old_hashes = previous["hashes"].get(field_name, {}) if previous else {}
+    old_valid = previous["valid"].get(field_name) if previous else None
+    
+    to_embed = []
+    reused = 0
+    for row, (text, doc_id) in enumerate(zip(texts, doc_ids)):
+        if not text.strip():
+            continue  # пустой текст - нулевой вектор без запроса к API
+        if old_emb is not None and doc_id is not None and old_hashes.get(doc_id) == text_hash(text):
+            old_row = previous["doc_rows"].get(doc_id)
+            if old_row is not None and (
+                old_valid[old_row] if old_valid is not None else np.any(old_emb[old_row])
+            ):
+                result[row] = old_emb[old_row]
+                valid[row] = True
+                reused += 1
+                continue
+        to_embed.append(row)
+    
+    print(f"  - {field_name}: переиспользовано {reused}, к генерации {len(to_embed)}")
+    return to_embed
+
+
+def plan_incremental_knn(field_name: str, doc_ids: list, embedded_rows: list[int], valid: np.ndarray,
+                         previous: Optional[dict]) -> Optional[list[int]]:
+    """
+    Строки поля, которых нет в графе соседей предыдущего запуска (дописанные
+    в конец и впервые получившие эмбеддинг), - если граф можно дополнить.
+    None - граф строится заново: старые кейсы переставлены или у строки,
+    уже входившей в граф, изменился или пропал вектор.
+    """
+    if previous is None or field_name not in previous["knn"] or field_name not in previous["valid"]:
+        return None
+    old_doc_ids = previous["doc_ids"]
+    old_n = len(old_doc_ids)
+    # Строки сопоставляются по номеру: старые кейсы - тот же префикс без повторов docId
+    if len(previous["doc_rows"]) != old_n or doc_ids[:old_n] != old_doc_ids:
+        return None
+    old_valid = previous["valid"][field_name]
+    embedded = np.zeros(len(doc_ids), dtype=bool)
+    embedded[embedded_rows] = True
+    if np.any(old_valid & (embedded[:old_n] | ~valid[:old_n])):
+        return None
+    return np.flatnonzero(~old_valid & valid[:old_n]).tolist()
+
+
+def write_knn_graphs(data_dir: Path, embeddings_map: dict, valid_map: dict,
+                     previous_graph: dict, changed_rows: dict):
+    """
+    Построить и сохранить граф соседей каждого поля. Для поля с известными
+    changed_rows (см. plan_incremental_knn) старый граф из previous_graph
+    дополняется, иначе - считается полностью.
+    """
+    if Config.KNN_K <= 0:
+        # Граф прошлого запуска удаляется: иначе сервер загрузит устаревших соседей
+        for field_name in embeddings_map:
+            for name in (knn_ids_file(field_name), knn_scores_file(field_name)):
+                (data_dir / name).unlink(missing_ok=True)
+        print("  Граф соседей отключён (KNN_K=0)")
+        return
+    for field_name, embeddings in embeddings_map.items():
+        valid = valid_map[field_name]
+        block_rows = block_rows_for(len(embeddings), Config.KNN_MEMORY_MB)
+        old = previous_graph.get(field_name)
+        rows = changed_rows.get(field_name)
+        reusable = old is not None and rows is not None and old[0].shape[1] == Config.KNN_K
+        if reusable and not rows and len(old[0]) == len(embeddings):
+            print(f"  - {field_name}: граф соседей не изменился")
+            continue
+        started = time.time()
+        if reusable:
+            ids, scores = update_knn(embeddings, valid, old[0], old[1], rows, Config.KNN_K, block_rows)
+            mode = f"дополнен ({len(rows) + len(embeddings) - len(old[0])} новых строк)"
+        else:
+            ids, scores = build_knn(embeddings, valid, Config.KNN_K, block_rows)
+            mode = "построен"
+        save_knn_graph(data_dir, field_name, ids, scores, save_npy_atomic)
+        print(f"  - {field_name}: граф соседей {mode} за {time.time() - started:.1f} с")
+
+
+def write_duplicate_clusters(data_dir: Path, clusterer: DuplicateClusterer):
+    """Разбить кейсы на кластеры почти одинаковых решений и сохранить номера кластеров."""
+    print("\n=== Кластеры почти одинаковых решений ===")
+    started = time.time()
+    clusters = clusterer.clusters()
+    save_npy_atomic(data_dir / DUPLICATE_CLUSTERS_FILE, clusters)
+    sizes = np.bincount(clusters, minlength=len(clusters))
+    print(f"  Кластеров с повторами: {int((sizes > 1).sum())}, кейсов в них: {int(sizes[sizes > 1].sum())} "
+          f"(порог {Config.DEDUP_THRESHOLD}, {time.time() - started:.1f} с)")
+
+
+def build_hashes_manifest(field_texts: dict, doc_ids: list) -> dict:
+    """
+    Хэши текстов всех полей по docId - сохраняются рядом с эмбеддингами.
+    При повторах docId хэш берётся у первой строки - той же, на которую
+    указывает doc_rows в load_previous_run: вектор переиспользуется только
+    вместе с хэшем своего текста.
+    """
+    fields = {}
+    for field_name, texts in field_texts.items():
+        hashes = {}
+        for doc_id, text in zip(doc_ids, texts):
+            if doc_id is not None and doc_id not in hashes:
+                hashes[doc_id] = text_hash(text)
+        fields[field_name] = hashes
+    return {
+        "model": "gemini-embedding-001",
+        "dimension": Config.EMBEDDING_DIMENSION,
+        "duplicate_doc_ids": "first_row",
+        "fields": fields,
+    }
+
+
+def backfill(data_dir: Path):
+    """
+    Дозапросить эмбеддинги только для строк, отмеченных в масках как невалидные
+    (батч не удался), при непустом тексте. Тексты восстанавливаются из cases.json,
+    поэтому результат согласован с текущими файлами независимо от CSV.
+    """
+    cases_path = data_dir / "cases.json"
+    if not cases_path.exists():
+        print(f"Нет {cases_path} - сначала выполните полную подготовку данных")
+        return
+    with open(cases_path, "r", encoding="utf-8") as f:
+        cases = json.load(f)
+    field_texts = prepare_separate_field_texts(pd.DataFrame(cases))
+    
+    embeddings_map = {}
+    valid_map = {}
+    jobs = {}
+    rows_map = {}
+    for field_name, texts in field_texts.items():
+        field_path = data_dir / f"embeddings_{field_name}.npy"
+        if not field_path.exists():
+            print(f"  {field_name}: нет {field_path.name}, пропуск")
+            continue
+        embeddings = np.load(field_path, mmap_mode="r")
+        mask_path = validity_path(data_dir, field_name)
+        if mask_path.exists():
+            valid = np.load(mask_path)
+        else:
+            # Файлы до появления масок: невалидны нулевые векторы
+            valid = np.array([np.any(embeddings[row]) for row in range(len(embeddings))], dtype=bool)
+        rows = [row for row in np.flatnonzero(~valid) if texts[row].strip()]
+        print(f"  {field_name}: к дозапросу {len(rows)} из {len(texts)}")
+        if rows:
+            # Дозапрошенные векторы пишутся в копию файла на диске (см. open_npy_output)
+            tmp_path = field_path.with_name(field_path.name + ".tmp")
+            shutil.copyfile(field_path, tmp_path)
+            embeddings = np.lib.format.open_memmap(tmp_path, mode="r+")
+            rows_map[field_name] = rows
+            jobs[field_name] = (texts, data_dir / CHECKPOINT_DIR / f"backfill_{field_name}")
+        embeddings_map[field_name] = embeddings
+        valid_map[field_name] = valid
+    
+    if jobs:
+        embed_texts_concurrently(jobs, task_type="retrieval_document",
+                                 outputs={name: (embeddings_map[name], valid_map[name]) for name in jobs},
+                                 rows=rows_map)
+        for field_name, rows in rows_map.items():
+            print(f"  {field_name}: восстановлено {int(valid_map[field_name][rows].sum())} из {len(rows)}")
+    
+    # Перезаписываются только поля с дозапрошенными строками: файлы остальных
+    # не меняются, и версия данных (горячая перезагрузка серверов) - тоже
+    for field_name in rows_map:
+        commit_npy_output(data_dir / f"embeddings_{field_name}.npy", embeddings_map[field_name])
+        save_npy_atomic(validity_path(data_dir, field_name), valid_map[field_name])
     
-    return cases
+    # В графе восстановленных строк не было (без эмбеддинга) - достаточно дополнить
+    previous_graph = load_knn_graph(data_dir, len(cases), mmap=True)
+    recovered = {
+        field_name: [row for row in rows_map.get(field_name, []) if valid_map[field_name][row]]
+        for field_name in embeddings_map
+    }
+    write_knn_graphs(data_dir, embeddings_map, valid_map, previous_graph, recovered)
+    remove_checkpoints(data_dir / CHECKPOINT_DIR)
+    print("Backfill завершён")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Подготовка данных и эмбеддингов решений ФАС")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--incremental", action="store_true",
+        help="переиспользовать эмбеддинги неизменённых строк (по docId и хэшу текста)"
+    )
+    mode.add_argument(
+        "--backfill", action="store_true",
+        help="дозапросить только эмбеддинги, отмеченные невалидными в масках valid_*.npy"
+    )
+    return parser.parse_args()
 
 
 def main():
     """Главная функция подготовки данных."""
+    args = parse_args()
+    
     # Инициализация Gemini API
     init_genai_client()
     
-    # Создаем директорию для данных
-    data_dir = Path(__file__).parent / "data"
-    data_dir.mkdir(exist_ok=True)
+    # Создаем директорию для данных (ту же, из которой читает сервер)
+    data_dir = Config.get_data_dir()
+    data_dir.mkdir(parents=True, exist_ok=True)
+    init_vector_cache(data_dir)
+    
+    if args.backfill:
+        backfill(data_dir)
+        return
+    
+    # Результаты предыдущего запуска - для инкрементального режима
+    # (читаются до записи нового cases.json)
+    previous = load_previous_run(data_dir) if args.incremental else None
     
-    # Загружаем CSV
-    df = load_csv()
+    # Потоковое чтение CSV: тексты полей - в колонки на диске, кейсы - сразу во временный
+    # файл, который заменит cases.json только после сохранения эмбеддингов
+    cases_path = data_dir / "cases.json"
+    texts_dir = data_dir / TEXTS_DIR
+    cases_writer = CasesWriter(cases_path)
+    clusterer = DuplicateClusterer(Config.DEDUP_THRESHOLD) if Config.DEDUP_THRESHOLD > 0 else None
+    try:
+        field_texts, doc_ids = ingest_csv(find_csv_path(), cases_writer, Config.CSV_CHUNK_SIZE, texts_dir, clusterer)
+    except BaseException:
+        cases_writer.abort()
+        raise
     
     # Генерируем отдельные эмбеддинги для полей
     # (по новой архитектуре - не генерируем объединённый embeddings.npy)
     print("\n=== Генерация эмбеддингов для полей ===")
-    field_texts = prepare_separate_field_texts(df)
     
-    for field_name, field_texts_list in field_texts.items():
-        print(f"  - {field_name}...")
-        field_embeddings = generate_embeddings(field_texts_list, task_type="retrieval_document")
+    # Готовые батчи каждого поля сохраняются в чекпоинт: после сбоя
+    # повторный запуск продолжит с первого незавершённого батча
+    checkpoint_dir = data_dir / CHECKPOINT_DIR
+    
+    # Все поля генерируются одновременно через общий конвейер с лимитом квоты.
+    # Матрицы результата - на диске (open_npy_output): память не растёт с числом кейсов
+    field_embeddings_map = {}
+    field_valid_map = {}
+    jobs = {}
+    rows_to_embed = {}
+    try:
+        for field_name, column in field_texts.items():
+            checkpoint_path = checkpoint_dir / f"embeddings_{field_name}"
+            field_embeddings_map[field_name] = open_npy_output(
+                data_dir / f"embeddings_{field_name}.npy", (len(column), Config.EMBEDDING_DIMENSION)
+            )
+            field_valid_map[field_name] = np.zeros(len(column), dtype=bool)
+            if args.incremental:
+                rows = plan_incremental_embeddings(
+                    field_name, column, doc_ids, previous,
+                    field_embeddings_map[field_name], field_valid_map[field_name]
+                )
+            else:
+                rows = np.arange(len(column))
+            rows_to_embed[field_name] = rows
+            jobs[field_name] = (column, checkpoint_path)
+        
+        started = time.time()
+        embed_texts_concurrently(jobs, task_type="retrieval_document",
+                                 outputs={name: (field_embeddings_map[name], field_valid_map[name]) for name in jobs},
+                                 rows=rows_to_embed)
+    except BaseException:
+        cases_writer.abort()
+        raise
+    print(f"Эмбеддинги сгенерированы за {time.time() - started:.1f} с")
+    
+    # Запись согласованного набора: сначала эмбеддинги, затем хэши и кейсы.
+    # Каждый файл заменяется атомарно; сервер подхватит новую версию целиком
+    for field_name, field_embeddings in field_embeddings_map.items():
         field_path = data_dir / f"embeddings_{field_name}.npy"
-        np.save(field_path, field_embeddings)
-        print(f"    Сохранены: {field_path}")
+        commit_npy_output(field_path, field_embeddings)
+        save_npy_atomic(validity_path(data_dir, field_name), field_valid_map[field_name])
+        invalid = int((~field_valid_map[field_name]).sum())
+        print(f"    Сохранены: {field_path} (без эмбеддинга: {invalid})")
+    
+    # Граф соседей - до cases.json, чтобы сервер увидел согласованный набор файлов
+    print("\n=== Граф ближайших соседей ===")
+    knn_changed_rows = {
+        field_name: plan_incremental_knn(field_name, doc_ids, rows_to_embed[field_name],
+                                         field_valid_map[field_name], previous)
+        for field_name in field_embeddings_map
+    }
+    write_knn_graphs(data_dir, field_embeddings_map, field_valid_map,
+                     previous["knn"] if previous else {}, knn_changed_rows)
+    
+    if clusterer is not None:
+        write_duplicate_clusters(data_dir, clusterer)
+    else:
+        # Кластеры прошлого запуска удаляются: иначе сервер схлопнет выдачу по ним
+        (data_dir / DUPLICATE_CLUSTERS_FILE).unlink(missing_ok=True)
+    
+    save_json_atomic(data_dir / HASHES_FILE, build_hashes_manifest(field_texts, doc_ids))
     
     # Сохраняем кейсы
-    cases = prepare_cases(df)
-    cases_path = data_dir / "cases.json"
-    with open(cases_path, "w", encoding="utf-8") as f:
-        json.dump(cases, f, ensure_ascii=False, indent=2)
+    cases_writer.commit()
     print(f"Кейсы сохранены: {cases_path}")
     
+    # Итоговые файлы записаны - чекпоинты и тексты полей больше не нужны
+    remove_checkpoints(checkpoint_dir)
+    shutil.rmtree(texts_dir, ignore_errors=True)
+    
     print("\n" + "=" * 50)
     print("ПОДГОТОВКА ДАННЫХ ЗАВЕРШЕНА!")
     print("=" * 50)
     print(f"  - Эмбеддинги полей: 3 файла")
-    print(f"  - Кейсы: {len(cases)} записей")
+    print(f"  - Граф соседей: K={Config.KNN_K}")
+    print(f"  - Кейсы: {cases_writer.count} записей")
     print(f"  - Модель: gemini-embedding-001")
     print(f"  - Размерность: {Config.EMBEDDING_DIMENSION}")
 
@@ -0,0 +1,161 @@
+"""
+Профилирование запросов.
+
+- profile_call: выполнить один вызов под профилировщиком - детерминированным
+  (cProfile, файл .pstats) или статистическим (выборка стеков, файл
+  .collapsed в формате flamegraph.pl / speedscope);
+- StackSampler: фоновая выборка стеков потоков с накоплением
+  свёрнутых стеков; низкие накладные расходы, включается на лету
+  (POST /api/admin/sampler).
+
+Выборка читает sys._current_frames() из отдельного потока, поэтому
+реальный шаг не меньше интервала переключения GIL (sys.getswitchinterval(), 5 мс).
+"""
+
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+PROFILE_MODES = ("cprofile", "sample")
+
+# Поток, стоящий в ожидании в этих модулях, считается простаивающим и не учитывается
+IDLE_MODULES = {"threading.py", "queue.py", "selectors.py"}
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def collapse_stack(frame, limit: int = 128) -> str:
+    """Стек кадра в свёрнутом виде: "корень;...;вершина"."""
+    names = []
+    while frame is not None and len(names) < limit:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """
+    Выборка стеков потоков с заданным интервалом.
+    thread_id - сэмплировать только этот поток (иначе все, кроме собственного).
+    """
+
+    def __init__(self, interval: float = 0.01, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if self.thread_id is not None:
+                frames = {self.thread_id: frames[self.thread_id]} if self.thread_id in frames else {}
+            collected = []
+            for ident, frame in frames.items():
+                if ident == own or os.path.basename(frame.f_code.co_filename) in IDLE_MODULES:
+                    continue
+                if ident not in names:
+                    thread = next((t for t in threading.enumerate() if t.ident == ident), None)
+                    names[ident] = thread.name if thread is not None else str(ident)
+                collected.append(f"{names[ident]};{collapse_stack(frame)}")
+            del frames
+            with self._lock:
+                self.stacks.update(collected)
+                self.samples += 1
+
+    def collapsed(self, reset: bool = False) -> str:
+        """Накопленные стеки: строка "стек число" на каждый стек."""
+        with self._lock:
+            items = self.stacks.most_common()
+            if reset:
+                self.stacks.clear()
+                self.samples = 0
+                self.started_at = time.time()
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "running": self.running,
+                "interval_ms": round(self.interval * 1000, 3),
+                "samples": self.samples,
+                "stacks": len(self.stacks),
+                "since": self.started_at,
+            }
+
+
+def profile_call(mode: str, func: Callable, *args, interval: float = 0.001, **kwargs) -> Tuple[object, object]:
+    """
+    Выполнить func(*args, **kwargs) под профилировщиком в текущем потоке.
+    Возвращает (результат, профиль): cProfile.Profile либо StackSampler.
+    """
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            profiler.disable()
+        return result, profiler
+    if mode == "sample":
+        sampler = StackSampler(interval=interval, thread_id=threading.get_ident())
+        sampler.start()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            sampler.stop()
+        return result, sampler
+    raise ValueError(f"Неизвестный режим профилирования: {mode}")
+
+
+def save_profile(profile_dir: Path, endpoint: str, profile, meta: dict) -> str:
+    """
+    Сохранить профиль и метаданные (стадии, число кандидатов) в profile_dir:
+    <id>.pstats или <id>.collapsed и <id>.json. Возвращает id профиля.
+    """
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{uuid.uuid4().hex[:8]}"
+    if isinstance(profile, cProfile.Profile):
+        filename = f"{profile_id}.pstats"
+        profile.dump_stats(str(profile_dir / filename))
+    else:
+        filename = f"{profile_id}.collapsed"
+        (profile_dir / filename).write_text(profile.collapsed(), encoding="utf-8")
+    meta = {"id": profile_id, "endpoint": endpoint, "file": filename, "created_at": time.time(), **meta}
+    with open(profile_dir / f"{profile_id}.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return profile_id
@@ -0,0 +1,94 @@
+"""
+Журнал поисковых запросов (включается QUERY_LOG=true).
+
+Компактный append-only JSONL: одна строка на запрос /api/search -
+запрос, фильтры, top_k, время, попадание в кэш и длительности стадий.
+Используется для воспроизведения реальной нагрузки (benchmarks/replay.py).
+
+Запись не блокирует обработку запроса: строки кладутся в очередь и
+дописываются фоновым потоком. Каждая строка пишется одним write() в файл,
+открытый с O_APPEND, поэтому воркеры serve.py могут писать в один файл.
+"""
+
+import json
+import os
+import queue
+import threading
+from pathlib import Path
+from typing import Optional
+
+
+class QueryLog:
+    """Асинхронная запись журнала запросов в JSONL-файл."""
+
+    thread_name = "query-log"
+
+    def __init__(self, path: Path, max_queue: int = 10000):
+        self.path = path
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _ensure_writer(self):
+        # Поток создаётся лениво и заново после fork (serve.py)
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=f"{self.thread_name}-writer", daemon=True)
+            self._thread.start()
+
+    def _open(self) -> int:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        return os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _close_fd(self, fd: int):
+        os.close(fd)
+
+    def _run(self):
+        fd = self._open()
+        try:
+            while True:
+                line = self._queue.get()
+                if line is None:
+                    break
+                try:
+                    os.write(fd, line)
+                except OSError as e:
+                    print(f"Ошибка записи журнала {self.path}: {e}")
+        finally:
+            self._close_fd(fd)
+
+    def record(self, entry: dict):
+        """Добавить запись; при переполнении очереди запись отбрасывается."""
+        self._ensure_writer()
+        line = (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Дописать очередь и остановить поток."""
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+def read_query_log(path: Path):
+    """Прочитать записи журнала (битые строки пропускаются)."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
@@ -0,0 +1,226 @@
+"""
+Кэш результатов поиска.
+
+Хранит итоговый ранжированный список (индекс кейса, оценка, оценки полей)
+для ключа (нормализованный запрос, фильтры, top_k, конфигурация ранжирования,
+версия данных). Два уровня:
+- локальный LRU в памяти процесса;
+- опциональный общий уровень в SQLite-файле, доступный всем воркерам
+  на одной машине.
+
+При смене версии данных оба уровня сбрасываются автоматически.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple
+
+from memory_usage import deep_sizeof
+
+# Элемент кэша: (index, score, field_scores)
+CachedHit = Tuple[int, float, Dict[str, float]]
+
+
+def normalize_query(query: str) -> str:
+    """
+    Нормализовать запрос для ключа: схлопнутые пробелы. Регистр сохраняется -
+    эмбеддинг запроса от него зависит, а значит и ранжирование.
+    """
+    return ' '.join(query.split())
+
+
+def make_cache_key(query: str, filters: dict, top_k: int, ranking_config: dict, data_version: str,
+                   collapse_duplicates: bool = False) -> str:
+    """
+    Построить ключ кэша.
+    Порядок значений в фильтрах-списках не влияет на ключ;
+    фильтры-значения (tags_mode, даты) входят в ключ как есть.
+    """
+    payload = {
+        'query': normalize_query(query),
+        'filters': {k: sorted(set(v)) if isinstance(v, list) else v for k, v in sorted(filters.items()) if v},
+        'top_k': top_k,
+        'ranking': ranking_config,
+        'data_version': data_version,
+    }
+    if collapse_duplicates:
+        # Только при включённой опции - ключи прежних запросов не меняются
+        payload['collapse_duplicates'] = True
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class SearchResultCache:
+    """
+    Двухуровневый кэш результатов поиска: LRU в памяти + общий SQLite.
+    Ошибки общего уровня не должны ломать поиск - они только логируются.
+    """
+
+    def __init__(self, max_size: int = 1024, shared_path: Optional[Path] = None, shared_max_rows: int = 50000):
+        self.max_size = max_size
+        self.shared_path = shared_path
+        self.shared_max_rows = shared_max_rows
+        self.data_version: Optional[str] = None
+
+        self._local: "OrderedDict[str, List[CachedHit]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn_local = threading.local()
+        self._puts_since_prune = 0
+
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+        # Соединения SQLite нельзя использовать после fork (serve.py)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_connections)
+
+        if self.shared_path is not None:
+            try:
+                self._init_shared()
+            except Exception as e:
+                print(f"Общий кэш поиска отключён: {e}")
+                self.shared_path = None
+
+    # --- Общий уровень (SQLite) ---
+
+    def _reset_connections(self):
+        self._conn_local = threading.local()
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Соединение с SQLite - своё для каждого потока."""
+        conn = getattr(self._conn_local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.shared_path), timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn_local.conn = conn
+        return conn
+
+    def _init_shared(self):
+        self.shared_path.parent.mkdir(parents=True, exist_ok=True)
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS search_cache ("
+            " key TEXT PRIMARY KEY,"
+            " data_version TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+
+    def _shared_get(self, key: str) -> Optional[List[CachedHit]]:
+        try:
+            row = self._connect().execute(
+                "SELECT value FROM search_cache WHERE key = ? AND data_version = ?",
+                (key, self.data_version)
+            ).fetchone()
+        except Exception as e:
+            print(f"Ошибка чтения общего кэша: {e}")
+            return None
+        if row is None:
+            return None
+        return [(int(idx), float(score), fields) for idx, score, fields in json.loads(row[0])]
+
+    def _shared_put(self, key: str, hits: List[CachedHit]):
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, data_version, value, created_at) VALUES (?, ?, ?, ?)",
+                (key, self.data_version, json.dumps(hits, ensure_ascii=False), time.time())
+            )
+            self._puts_since_prune += 1
+            if self._puts_since_prune >= 500:
+                self._puts_since_prune = 0
+                # Удаляем самые старые записи сверх лимита
+                conn.execute(
+                    "DELETE FROM search_cache WHERE key IN ("
+                    " SELECT key FROM search_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.shared_max_rows,)
+                )
+        except Exception as e:
+            print(f"Ошибка записи в общий кэш: {e}")
+
+    # --- Публичный интерфейс ---
+
+    def set_data_version(self, data_version: str):
+        """Зафиксировать версию данных. При смене версии кэш сбрасывается."""
+        if data_version == self.data_version:
+            return
+        with self._lock:
+            self._local.clear()
+            self.data_version = data_version
+        if self.shared_path is not None:
+            try:
+                self._connect().execute(
+                    "DELETE FROM search_cache WHERE data_version != ?", (data_version,)
+                )
+            except Exception as e:
+                print(f"Ошибка очистки общего кэша: {e}")
+
+    def get(self, key: str) -> Optional[List[CachedHit]]:
+        """Получить результат по ключу или None."""
+        if self.max_size <= 0 and self.shared_path is None:
+            return None
+
+        with self._lock:
+            value = self._local.get(key)
+            if value is not None:
+                self._local.move_to_end(key)
+                self.hits += 1
+                return value
+
+        if self.shared_path is not None:
+            value = self._shared_get(key)
+            if value is not None:
+                self._put_local(key, value)
+                with self._lock:
+                    self.shared_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _put_local(self, key: str, hits: List[CachedHit]):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._local[key] = hits
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+
+    def put(self, key: str, hits: List[CachedHit]):
+        """Сохранить результат в оба уровня."""
+        self._put_local(key, hits)
+        if self.shared_path is not None:
+            self._shared_put(key, hits)
+
+    def clear(self):
+        """Полностью очистить локальный уровень."""
+        with self._lock:
+            self._local.clear()
+
+    def memory_bytes(self) -> int:
+        """Оценка памяти локального уровня (байты)."""
+        with self._lock:
+            return deep_sizeof(self._local)
+
+    def stats(self) -> dict:
+        """Статистика кэша."""
+        with self._lock:
+            return {
+                'size': len(self._local),
+                'max_size': self.max_size,
+                'shared': self.shared_path is not None,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'data_version': self.data_version,
+            }
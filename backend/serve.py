@@ -0,0 +1,215 @@
+"""
+Запуск нескольких воркеров с общим индексом в памяти.
+Запуск: python serve.py --workers 4 --port 8000
+
+В отличие от `uvicorn main:app --workers N`, где каждый воркер сам загружает
+эмбеддинги и cases.json, здесь индекс загружается один раз в родительском
+процессе, после чего воркеры создаются через fork и читают те же физические
+страницы памяти:
+- матрицы эмбеддингов - только для чтения (при INDEX_MMAP=true ещё и
+  отображены из файлов, т.е. разделяются через page cache);
+- перед fork вызывается gc.freeze(), чтобы сборщик мусора в воркерах
+  не обходил объекты родителя и не провоцировал copy-on-write.
+
+Горячая перезагрузка тоже выполняется в родителе: он следит за DATA_DIR
+(INDEX_RELOAD_INTERVAL), загружает и прогревает новый снимок и заменяет
+воркеры - новые создаются через fork уже с новым снимком, старые получают
+SIGTERM и дообслуживают начатые запросы. Воркеры за файлами не следят,
+/api/admin/reload передаётся родителю сигналом (SIGHUP, с force - SIGUSR1);
+перезагрузку можно запустить и вручную: kill -HUP <pid родителя>.
+
+Только для Linux/macOS (нужен os.fork).
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+# Период опроса завершившихся воркеров и сигналов перезагрузки, секунд
+LOOP_INTERVAL = 0.2
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="FAS Hybrid Search - воркеры с общим индексом")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--log-level", default="info")
+    return parser.parse_args()
+
+
+def create_socket(host: str, port: int) -> socket.socket:
+    """Общий слушающий сокет - его наследуют все воркеры."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def freeze_objects():
+    """Перенести все живые объекты в "вечное" поколение GC (перед fork)."""
+    gc.unfreeze()
+    gc.collect()
+    gc.freeze()
+
+
+def run_worker(app_module, sock: socket.socket, log_level: str):
+    """
+    Тело дочернего процесса: запуск (Gemini, прогрев) и обычный uvicorn-сервер
+    на общем сокете. Соединения воркер принимает только после запуска - при
+    замене воркеров запросы до его готовности обслуживают старые.
+    """
+    for signum in (signal.SIGINT, signal.SIGTERM, app_module.RELOAD_SIGNAL, app_module.RELOAD_FORCE_SIGNAL):
+        signal.signal(signum, signal.SIG_DFL)
+    app_module.run_startup()
+    config = uvicorn.Config(app_module.app, log_level=log_level)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+def main():
+    if not hasattr(os, "fork"):
+        print("serve.py требует os.fork (Linux/macOS). Используйте uvicorn main:app")
+        sys.exit(1)
+
+    args = parse_args()
+
+    # Загрузка индекса в родителе - один раз на все воркеры
+    import main as app_module
+    from index_snapshot import SnapshotWatcher
+    try:
+        app_module.preload_index()
+    except RuntimeError as e:
+        print(f"ОШИБКА ЗАГРУЗКИ: {e}")
+        sys.exit(1)
+
+    # Снимок принадлежит родителю: воркеры не запускают свой SnapshotWatcher
+    reload_interval = app_module.Config.INDEX_RELOAD_INTERVAL
+    app_module.Config.INDEX_RELOAD_INTERVAL = 0
+    app_module.index_owner_pid = os.getpid()
+
+    freeze_objects()
+
+    sock = create_socket(args.host, args.port)
+    print(f"Воркеров: {args.workers}, адрес: http://{args.host}:{args.port}")
+
+    workers = {}
+    # Воркеры со старым снимком, которые завершаются после перезагрузки
+    retiring = set()
+    # Старые снимки живут, пока их воркеры не завершились (файлы keyword-индекса
+    # удаляются при освобождении снимка)
+    retired_snapshots = []
+    reload_requests = []
+    shutting_down = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(app_module, sock, args.log_level)
+            finally:
+                os._exit(0)
+        workers[pid] = time.time()
+
+    def reload_workers(force: bool = False) -> dict:
+        """Загрузить новый снимок и заменить им воркеры."""
+        previous = app_module.snapshot
+        result = app_module.reload_index(force)
+        print(f"Перезагрузка индекса: {result}")
+        if result["status"] != "reloaded":
+            return result
+        # Пул процессов прогрева воркерам не достаётся
+        app_module.shutdown_search_pool()
+        freeze_objects()
+        old_workers = list(workers)
+        for _ in range(args.workers):
+            spawn()
+        for pid in old_workers:
+            retiring.add(pid)
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        retired_snapshots.append(previous)
+        print(f"Воркеры заменены: версия данных {result['version']}")
+        return result
+
+    watcher = None
+    if reload_interval > 0 and app_module.shard_coordinator is None:
+        watcher = SnapshotWatcher(
+            app_module.DATA_DIR,
+            get_version=lambda: app_module.snapshot.version,
+            reload=reload_workers,
+            interval=reload_interval,
+        )
+
+    def shutdown(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def request_reload(signum, frame):
+        reload_requests.append(signum == app_module.RELOAD_FORCE_SIGNAL)
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(app_module.RELOAD_SIGNAL, request_reload)
+    signal.signal(app_module.RELOAD_FORCE_SIGNAL, request_reload)
+
+    for _ in range(args.workers):
+        spawn()
+
+    next_poll = time.monotonic() + reload_interval
+    while workers:
+        while workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                workers.clear()
+                break
+            if pid == 0:
+                break
+            started_at = workers.pop(pid, None)
+            if pid in retiring:
+                retiring.discard(pid)
+                if not retiring:
+                    retired_snapshots.clear()
+                continue
+            if shutting_down or started_at is None:
+                continue
+            print(f"Воркер {pid} завершился (код {os.waitstatus_to_exitcode(status)}), перезапуск...")
+            # Защита от бесконечного цикла перезапусков при ошибке на старте
+            if time.time() - started_at < 1:
+                time.sleep(1)
+            spawn()
+
+        if not shutting_down:
+            try:
+                if reload_requests:
+                    force = any(reload_requests)
+                    reload_requests.clear()
+                    reload_workers(force)
+                elif watcher is not None and time.monotonic() >= next_poll:
+                    next_poll = time.monotonic() + reload_interval
+                    watcher.poll()
+            except Exception as e:
+                print(f"Ошибка перезагрузки индекса: {e}")
+        time.sleep(LOOP_INTERVAL)
+
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
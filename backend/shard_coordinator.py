@@ -0,0 +1,168 @@
+"""
+Координатор распределённого поиска (режим SHARD_URLS).
+
+Запрос рассылается всем шардам параллельно (shard_server.py); каждый
+возвращает свои лучшие семантические и keyword кандидаты, признак
+прохождения фильтров и оценки полей. Списки кандидатов объединяются
+слиянием уже отсортированных списков (heapq.merge) до тех же глобальных
+top-k, что и в одном процессе, после чего main.py выполняет обычное
+объединение оценок, фильтрацию и переранжирование. Кейсы для ответа
+запрашиваются у шардов только для итоговых результатов.
+"""
+
+import base64
+import hashlib
+import heapq
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+import httpx
+import numpy as np
+
+
+class ShardError(Exception):
+    """Шард недоступен или вернул ошибку."""
+
+
+def encode_embedding(embedding: np.ndarray) -> Optional[str]:
+    """Вектор запроса для передачи шардам (None для нулевого)."""
+    if not np.any(embedding):
+        return None
+    return base64.b64encode(np.asarray(embedding, dtype="<f8").tobytes()).decode("ascii")
+
+
+def decode_embedding(data: Optional[str], dimension: int) -> np.ndarray:
+    if data is None:
+        return np.zeros(dimension)
+    return np.frombuffer(base64.b64decode(data), dtype="<f8")
+
+
+def merge_top(lists: List[List[list]], top_k: int) -> List[tuple]:
+    """
+    Слияние отсортированных по убыванию оценки списков [(idx, score)] шардов.
+    При равных оценках - по возрастанию глобального индекса, как при
+    устойчивой сортировке в одном процессе.
+    """
+    merged = heapq.merge(*lists, key=lambda item: (-item[1], item[0]))
+    return [(int(idx), score) for idx, score in itertools.islice(merged, top_k)]
+
+
+@dataclass
+class GatheredCandidates:
+    """Объединённые ответы шардов на один запрос."""
+    semantic: List[tuple]
+    keyword: List[tuple]
+    # Глобальные индексы, прошедшие фильтры (None - фильтров нет)
+    passed: Optional[Set[int]]
+    field_scores: Dict[int, Dict[str, float]] = field(default_factory=dict)
+    # Номер кластера почти одинаковых решений по глобальному индексу кандидата
+    clusters: Dict[int, int] = field(default_factory=dict)
+
+
+class ShardCoordinator:
+    """Клиент набора шардов: рассылка запросов и слияние ответов."""
+
+    def __init__(self, urls: List[str], timeout: float = 10.0):
+        self.urls = urls
+        self.clients = [httpx.Client(base_url=url, timeout=timeout) for url in urls]
+        self.executor = ThreadPoolExecutor(max_workers=len(urls), thread_name_prefix="shard")
+        self.shard_versions: List[str] = [""] * len(urls)
+        self.total_cases = 0
+        # Производные данные набора шардов (опции фильтров) по версии
+        self.derived: dict = {}
+        self._derived_version = ""
+
+    @property
+    def version(self) -> str:
+        """Версия данных набора шардов - меняется при смене версии любого шарда."""
+        return hashlib.sha256(",".join(self.shard_versions).encode()).hexdigest()[:16]
+
+    def _call(self, i: int, method: str, path: str, json_body: Optional[dict] = None) -> dict:
+        try:
+            response = self.clients[i].request(method, path, json=json_body)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            raise ShardError(f"Шард {self.urls[i]}: {e}") from e
+
+    def _fan_out(self, method: str, path: str, json_body: Optional[dict] = None) -> List[dict]:
+        futures = [self.executor.submit(self._call, i, method, path, json_body) for i in range(len(self.clients))]
+        return [future.result() for future in futures]
+
+    def refresh(self) -> List[dict]:
+        """Опросить состояние шардов: версии и число кейсов."""
+        states = self._fan_out("GET", "/shard/health")
+        self.shard_versions = [state["version"] for state in states]
+        self.total_cases = sum(state["total_cases"] for state in states)
+        return states
+
+    def wait_ready(self, timeout: float = 300.0, interval: float = 1.0) -> List[dict]:
+        """Ждать, пока все шарды ответят на /shard/health."""
+        deadline = time.time() + timeout
+        while True:
+            try:
+                return self.refresh()
+            except ShardError as e:
+                if time.time() >= deadline:
+                    raise
+                print(f"  Ожидание шардов: {e}")
+                time.sleep(interval)
+
+    def search(self, query: str, query_embedding: np.ndarray, filters: dict,
+               semantic_k: int, keyword_k: int) -> GatheredCandidates:
+        """Разослать запрос шардам и объединить их кандидатов."""
+        body = {
+            "query": query,
+            "embedding": encode_embedding(query_embedding),
+            "filters": filters,
+            "semantic_k": semantic_k,
+            "keyword_k": keyword_k,
+        }
+        responses = self._fan_out("POST", "/shard/search", body)
+        self.shard_versions = [response["version"] for response in responses]
+
+        passed = None
+        if filters:
+            passed = set()
+            for response in responses:
+                passed.update(response["passed"])
+        field_scores = {}
+        clusters = {}
+        for response in responses:
+            field_scores.update((int(idx), scores) for idx, scores in response["field_scores"].items())
+            clusters.update((int(idx), cluster) for idx, cluster in response.get("clusters", {}).items())
+        return GatheredCandidates(
+            semantic=merge_top([response["semantic"] for response in responses], semantic_k),
+            keyword=merge_top([response["keyword"] for response in responses], keyword_k),
+            passed=passed,
+            field_scores=field_scores,
+            clusters=clusters,
+        )
+
+    def fetch_cases(self, ids: List[int]) -> Dict[int, dict]:
+        """Кейсы по глобальным индексам."""
+        if not ids:
+            return {}
+        cases = {}
+        for response in self._fan_out("POST", "/shard/cases", {"ids": list(ids)}):
+            cases.update((int(idx), case) for idx, case in response.items())
+        return cases
+
+    def filter_values(self) -> List[dict]:
+        """Значения фильтров каждого шарда (объединяются main.merge_filter_values)."""
+        return self._fan_out("GET", "/shard/filter_values")
+
+    def get_derived(self, key: str, build):
+        """Производные данные набора шардов, пересчитываются при смене версии."""
+        if self._derived_version != self.version:
+            self.derived = {}
+            self._derived_version = self.version
+        if key not in self.derived:
+            self.derived[key] = build()
+        return self.derived[key]
+
+    def stats(self) -> dict:
+        return {"shards": self.urls, "shard_versions": self.shard_versions, "total_cases": self.total_cases}
@@ -0,0 +1,166 @@
+"""
+Разбиение индекса на шарды для распределённого поиска.
+
+Каждый шард - полноценная директория данных (cases.json, матрицы
+эмбеддингов, маски валидности, кластеры почти одинаковых решений) с частью
+кейсов и файлом global_ids.npy:
+позиция кейса в исходном индексе. Шард обслуживается отдельным процессом
+(shard_server.py), /api/search в режиме координатора (SHARD_URLS)
+рассылает запрос всем шардам и объединяет результаты (shard_coordinator.py).
+
+Разбиение:
+- hash - по хэшу docId (равномерно, кейс всегда в одном и том же шарде);
+- year - по году решения; годы распределяются по шардам с выравниванием
+  числа кейсов, кейсы без года - в наименее загруженный шард.
+
+Запуск (из backend/):
+    python shard_index.py --data-dir data --out data/shards --shards 4 --by hash
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from index_snapshot import (
+    CASES_FILE,
+    EMBEDDINGS_AD_DESC_FILE,
+    EMBEDDINGS_FAS_ARGS_FILE,
+    EMBEDDINGS_VIOLATION_FILE,
+    VALID_AD_DESC_FILE,
+    VALID_FAS_ARGS_FILE,
+    VALID_VIOLATION_FILE,
+    compute_data_version,
+)
+from near_duplicates import DUPLICATE_CLUSTERS_FILE
+from prepare_data import save_json_atomic, save_npy_atomic
+
+GLOBAL_IDS_FILE = "global_ids.npy"
+MANIFEST_FILE = "shards.json"
+SHARD_KEYS = ("hash", "year")
+
+# Матрица и маска валидности каждого поля
+FIELD_FILES = [
+    (EMBEDDINGS_FAS_ARGS_FILE, VALID_FAS_ARGS_FILE),
+    (EMBEDDINGS_VIOLATION_FILE, VALID_VIOLATION_FILE),
+    (EMBEDDINGS_AD_DESC_FILE, VALID_AD_DESC_FILE),
+]
+
+
+def case_year(case: dict) -> Optional[int]:
+    date = case.get("document_date") or ""
+    return int(date[:4]) if date[:4].isdigit() else None
+
+
+def hash_shard(case: dict, position: int, n_shards: int) -> int:
+    key = case.get("docId") or str(position)
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % n_shards
+
+
+def assign_years(cases: List[dict], n_shards: int) -> Dict[Optional[int], int]:
+    """Годы по шардам: от самых крупных к меньшим, каждый - в наименее загруженный шард."""
+    counts = Counter(case_year(case) for case in cases)
+    load = [0] * n_shards
+    assignment: Dict[Optional[int], int] = {}
+    for year, count in sorted(counts.items(), key=lambda item: (-item[1], str(item[0]))):
+        shard = load.index(min(load))
+        assignment[year] = shard
+        load[shard] += count
+    return assignment
+
+
+def plan_shards(cases: List[dict], n_shards: int, by: str) -> List[np.ndarray]:
+    """Позиции кейсов каждого шарда (по возрастанию - порядок исходного индекса сохраняется)."""
+    if by == "hash":
+        owners = [hash_shard(case, i, n_shards) for i, case in enumerate(cases)]
+    elif by == "year":
+        years = assign_years(cases, n_shards)
+        owners = [years[case_year(case)] for case in cases]
+    else:
+        raise ValueError(f"Неизвестный способ разбиения: {by}")
+    owners = np.array(owners, dtype=np.int64)
+    return [np.flatnonzero(owners == shard) for shard in range(n_shards)]
+
+
+def write_rows(source: np.ndarray, rows: np.ndarray, path: Path, chunk_size: int = 8192):
+    """Записать строки source[rows] в .npy по частям (без загрузки всей матрицы)."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    target = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=source.dtype,
+                                       shape=(len(rows),) + source.shape[1:])
+    for start in range(0, len(rows), chunk_size):
+        target[start:start + chunk_size] = source[rows[start:start + chunk_size]]
+    target.flush()
+    del target
+    os.replace(tmp_path, path)
+
+
+def split_index(data_dir: Path, out_dir: Path, n_shards: int, by: str = "hash") -> dict:
+    """Разбить индекс data_dir на n_shards директорий out_dir/shard_<i>."""
+    with open(data_dir / CASES_FILE, "r", encoding="utf-8") as f:
+        cases = json.load(f)
+    shard_rows = plan_shards(cases, n_shards, by)
+
+    matrices = {}
+    for emb_file, valid_file in FIELD_FILES:
+        embeddings = np.load(data_dir / emb_file, mmap_mode="r")
+        if len(embeddings) != len(cases):
+            raise ValueError(f"{emb_file}: {len(embeddings)} строк, кейсов {len(cases)}")
+        valid_path = data_dir / valid_file
+        valid = np.load(valid_path) if valid_path.exists() else None
+        matrices[emb_file] = (embeddings, valid_file, valid)
+    # Номера кластеров - глобальные строки, в шардах не перенумеровываются
+    clusters_path = data_dir / DUPLICATE_CLUSTERS_FILE
+    clusters = np.load(clusters_path) if clusters_path.exists() else None
+
+    manifest = {
+        "by": by,
+        "total_cases": len(cases),
+        "source_version": compute_data_version(data_dir),
+        "shards": [],
+    }
+    for shard, rows in enumerate(shard_rows):
+        shard_dir = out_dir / f"shard_{shard}"
+        shard_dir.mkdir(parents=True, exist_ok=True)
+        for emb_file, (embeddings, valid_file, valid) in matrices.items():
+            write_rows(embeddings, rows, shard_dir / emb_file)
+            if valid is not None:
+                save_npy_atomic(shard_dir / valid_file, valid[rows])
+        save_npy_atomic(shard_dir / GLOBAL_IDS_FILE, rows.astype(np.int64))
+        if clusters is not None:
+            save_npy_atomic(shard_dir / DUPLICATE_CLUSTERS_FILE, clusters[rows])
+        save_json_atomic(shard_dir / CASES_FILE, [cases[i] for i in rows])
+
+        years = sorted({case_year(cases[i]) for i in rows} - {None})
+        manifest["shards"].append({"name": shard_dir.name, "cases": int(len(rows)), "years": years})
+        print(f"  {shard_dir.name}: {len(rows)} кейсов" + (f", годы {years}" if by == "year" else ""))
+
+    save_json_atomic(out_dir / MANIFEST_FILE, manifest)
+    return manifest
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Разбиение индекса на шарды")
+    parser.add_argument("--data-dir", type=Path, default=Path(__file__).parent / "data")
+    parser.add_argument("--out", type=Path, required=True, help="директория шардов")
+    parser.add_argument("--shards", type=int, default=4, help="число шардов")
+    parser.add_argument("--by", choices=SHARD_KEYS, default="hash", help="ключ разбиения")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.shards < 1:
+        raise SystemExit("--shards должно быть не меньше 1")
+    print(f"Разбиение {args.data_dir} на {args.shards} шардов ({args.by}) -> {args.out}")
+    manifest = split_index(args.data_dir, args.out, args.shards, args.by)
+    print(f"Готово: {manifest['total_cases']} кейсов, манифест {args.out / MANIFEST_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Сервер шарда индекса.
+
+Обслуживает одну директорию шарда (shard_index.py) и выполняет
+шард-локальную часть поиска для координатора (shard_coordinator.py):
+- семантический и keyword поиск - лучшие кандидаты шарда;
+- фильтры и оценки полей для переранжирования по этим кандидатам.
+Объединение, итоговое переранжирование и ответ формирует координатор.
+Индексы в ответах - глобальные (позиции в исходном индексе).
+
+Запуск одного шарда (из backend/):
+    python shard_server.py --shard-dir data/shards/shard_0 --port 8101
+Все шарды директории - отдельными процессами на портах 8101, 8102, ...:
+    python shard_server.py --shards-dir data/shards --base-port 8101
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+from config import Config
+from index_snapshot import load_snapshot, validate_snapshot
+from shard_coordinator import decode_embedding
+from shard_index import GLOBAL_IDS_FILE, MANIFEST_FILE
+from main import (
+    KEYWORD_TOP_K,
+    SEARCH_TOP_CANDIDATES,
+    apply_filters,
+    candidate_field_scores,
+    collect_filter_values,
+    get_keyword_index,
+    keyword_search,
+    semantic_search,
+)
+
+
+class ShardSearchRequest(BaseModel):
+    query: str
+    # Вектор запроса: float64 little-endian в base64; None - нулевой вектор
+    embedding: Optional[str] = None
+    filters: Dict[str, Union[list, str]] = {}
+    semantic_k: int = SEARCH_TOP_CANDIDATES
+    keyword_k: int = KEYWORD_TOP_K
+
+
+class ShardCasesRequest(BaseModel):
+    ids: List[int]
+
+
+def create_app(shard_dir: Path, mmap: bool = Config.INDEX_MMAP) -> FastAPI:
+    """Приложение шарда; данные загружаются сразу при создании."""
+    app = FastAPI(title=f"FAS search shard {shard_dir.name}")
+
+    snap = load_snapshot(shard_dir, mmap=mmap)
+    problem = validate_snapshot(snap)
+    if problem:
+        raise RuntimeError(f"Шард {shard_dir}: {problem}")
+    global_ids = np.load(shard_dir / GLOBAL_IDS_FILE)
+    local_ids = {int(gid): i for i, gid in enumerate(global_ids)}
+    dimension = snap.embeddings_fas_args.shape[1]
+    shard_filter_values = collect_filter_values(snap.cases)
+    get_keyword_index(snap)
+    print(f"Шард {shard_dir.name}: {snap.total_cases} кейсов, версия {snap.version}")
+
+    @app.get("/shard/health")
+    async def health():
+        return {"ready": True, "name": shard_dir.name, "version": snap.version, "total_cases": snap.total_cases}
+
+    @app.post("/shard/search")
+    def search(request: ShardSearchRequest):
+        query_embedding = decode_embedding(request.embedding, dimension)
+        semantic_results = semantic_search(query_embedding, request.semantic_k, snap)
+        keyword_results = keyword_search(request.query, snap, top_k=request.keyword_k)
+
+        # Фильтры и оценки полей - для всех кандидатов шарда, которые могут войти в итог
+        candidates = sorted({idx for idx, _ in semantic_results} | {idx for idx, _ in keyword_results})
+        response = {
+            "version": snap.version,
+            "semantic": [[int(global_ids[idx]), score] for idx, score in semantic_results],
+            "keyword": [[int(global_ids[idx]), score] for idx, score in keyword_results],
+            "passed": None,
+            "field_scores": {},
+            "clusters": {},
+        }
+        if snap.duplicate_clusters is not None:
+            response["clusters"] = {
+                str(int(global_ids[idx])): int(snap.duplicate_clusters[idx]) for idx in candidates
+            }
+        if request.filters:
+            passed = apply_filters([(idx, 0.0) for idx in candidates], request.filters, snap)
+            response["passed"] = [int(global_ids[idx]) for idx, _ in passed]
+        norm = np.linalg.norm(query_embedding)
+        if norm != 0:
+            query_norm = query_embedding / norm
+            response["field_scores"] = {
+                str(int(global_ids[idx])): candidate_field_scores(idx, query_norm, snap) for idx in candidates
+            }
+        return response
+
+    @app.post("/shard/cases")
+    def cases(request: ShardCasesRequest):
+        """Кейсы по глобальным индексам (отсутствующие в шарде пропускаются)."""
+        return {str(gid): snap.cases[local_ids[gid]] for gid in request.ids if gid in local_ids}
+
+    @app.get("/shard/filter_values")
+    async def filter_values():
+        return {key: sorted(value) if isinstance(value, set) else value for key, value in shard_filter_values.items()}
+
+    return app
+
+
+def run_all(shards_dir: Path, host: str, base_port: int) -> int:
+    """Запустить все шарды директории отдельными процессами и ждать их завершения."""
+    manifest_path = shards_dir / MANIFEST_FILE
+    if not manifest_path.exists():
+        sys.exit(f"Нет {manifest_path} - сначала выполните shard_index.py")
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        shard_dirs = [shards_dir / shard["name"] for shard in json.load(f)["shards"]]
+    processes = []
+    urls = []
+    for i, shard_dir in enumerate(shard_dirs):
+        port = base_port + i
+        processes.append(subprocess.Popen([
+            sys.executable, str(Path(__file__).resolve()),
+            "--shard-dir", str(shard_dir), "--host", host, "--port", str(port),
+        ]))
+        urls.append(f"http://{host}:{port}")
+    print(f"Шардов: {len(processes)}. Для координатора: SHARD_URLS={','.join(urls)}")
+    try:
+        while all(p.poll() is None for p in processes):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in processes:
+            if p.poll() is None:
+                p.terminate()
+        for p in processes:
+            p.wait()
+    return max((p.returncode or 0) for p in processes)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Сервер шарда индекса")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--shard-dir", type=Path, help="директория одного шарда")
+    target.add_argument("--shards-dir", type=Path, help="директория всех шардов (shard_index.py --out)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--base-port", type=int, default=8101, help="порт первого шарда для --shards-dir")
+    parser.add_argument("--log-level", default="warning")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.shards_dir:
+        sys.exit(run_all(args.shards_dir, args.host, args.base_port))
+    app = create_app(args.shard_dir)
+    uvicorn.run(app, host=args.host, port=args.port, log_level=args.log_level)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Замер стадий обработки запроса.
+
+StageTimer создаётся на каждый запрос и передаётся по стадиям поиска;
+по нему формируется заголовок Server-Timing и запись журнала запросов.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+class StageTimer:
+    """Время стадий (секунды) и счётчики одного запроса."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.labels: Dict[str, str] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """Засечь время блока; повторные замеры одной стадии суммируются."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - t0
+
+    def count(self, name: str, value: int):
+        """Счётчик запроса (число кандидатов и т.п.)."""
+        self.counts[name] = value
+
+    def label(self, name: str, value: str):
+        """Текстовая метка запроса (например, cache=hit)."""
+        self.labels[name] = value
+
+    def total(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def stages_ms(self, digits: int = 3) -> Dict[str, float]:
+        return {name: round(seconds * 1000, digits) for name, seconds in self.stages.items()}
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        """
+        Значение заголовка Server-Timing:
+        "semantic;dur=1.234, keyword;dur=5.678, cache;desc=miss, total;dur=9.1"
+        """
+        parts = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages.items()]
+        parts.extend(f"{name};desc={value}" for name, value in self.labels.items())
+        parts.append(f"total;dur={(self.total() if total is None else total) * 1000:.3f}")
+        return ", ".join(parts)
+
+
+def parse_server_timing(header: str) -> Dict[str, object]:
+    """
+    Разобрать заголовок Server-Timing: {имя: длительность в мс} для метрик
+    с dur и {имя: строка} для метрик только с desc.
+    """
+    result: Dict[str, object] = {}
+    for metric in header.split(","):
+        fields = [f.strip() for f in metric.split(";")]
+        if not fields or not fields[0]:
+            continue
+        name = fields[0]
+        params = dict(f.split("=", 1) for f in fields[1:] if "=" in f)
+        if "dur" in params:
+            try:
+                result[name] = float(params["dur"])
+            except ValueError:
+                continue
+        elif "desc" in params:
+            result[name] = params["desc"].strip('"')
+    return result
@@ -0,0 +1,109 @@
+"""
+Подсказки поисковой строки по префиксу.
+
+Подписи (теги, типы нарушений, статьи закона, отрасли, ответчики)
+нормализуются и раскладываются в отсортированный массив ключей: ключ -
+хвост подписи, начинающийся с каждого её слова, поэтому "строит" находит
+и "ООО "Строительство"", и "Строительство / Ремонт". Подписи
+пронумерованы по убыванию веса (числа дел), так что лучшие подсказки для
+диапазона ключей - наименьшие номера в нём.
+
+Поиск - два bisect по массиву ключей. Для коротких префиксов с широким
+диапазоном (больше DENSE_RANGE ключей) лучшие подсказки вычислены при
+построении, остальные диапазоны настолько малы, что разбираются на месте.
+Внешних вызовов нет; индекс строится по снимку один раз.
+"""
+
+import bisect
+import re
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+# Больше подсказок за один запрос не отдаётся
+MAX_SUGGESTIONS = 20
+# Префиксы с диапазоном шире - с заранее вычисленным ответом
+DENSE_RANGE = 256
+# Подсказка заменяет не больше стольких последних слов запроса
+MAX_TAIL_WORDS = 6
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def normalize_label(text: str) -> str:
+    """Нижний регистр, ё -> е, знаки препинания и кавычки - пробел."""
+    return " ".join(_NON_WORD.sub(" ", text.lower().replace("ё", "е")).split())
+
+
+def _next_prefix(prefix: str) -> str:
+    """Наименьшая строка больше всех строк с префиксом prefix."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class SuggestIndex:
+    """Отсортированный массив ключей подписей с весами."""
+
+    def __init__(self, labels: Iterable[Tuple[str, str, int]]):
+        # (текст, вид, вес) без повторов; номер подписи = место по убыванию веса
+        merged: Dict[Tuple[str, str], int] = {}
+        for text, kind, weight in labels:
+            text = text.strip()
+            if text and normalize_label(text):
+                merged[(text, kind)] = merged.get((text, kind), 0) + weight
+        ordered = sorted(merged.items(), key=lambda item: (-item[1], item[0][0], item[0][1]))
+        self.texts = [text for (text, _), _ in ordered]
+        self.kinds = [kind for (_, kind), _ in ordered]
+        self.weights = [weight for _, weight in ordered]
+
+        pairs = []
+        for rank, text in enumerate(self.texts):
+            normalized = normalize_label(text)
+            for match in re.finditer(r"\w+", normalized):
+                pairs.append((normalized[match.start():], rank))
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.ranks = np.array([rank for _, rank in pairs], dtype=np.int32)
+        self.dense: Dict[str, np.ndarray] = {}
+        self._build_dense(0, len(self.keys), 1)
+
+    def _build_dense(self, lo: int, hi: int, length: int):
+        """Ответы для префиксов длины length и длиннее с диапазоном шире DENSE_RANGE."""
+        start = lo
+        while start < hi:
+            key = self.keys[start]
+            if len(key) < length:
+                start += 1
+                continue
+            prefix = key[:length]
+            end = bisect.bisect_left(self.keys, _next_prefix(prefix), start, hi)
+            if end - start > DENSE_RANGE:
+                self.dense[prefix] = np.unique(self.ranks[start:end])[:MAX_SUGGESTIONS]
+                self._build_dense(start, end, length + 1)
+            start = end
+
+    def lookup(self, prefix: str, limit: int = 10) -> List[dict]:
+        """Подсказки по префиксу (уже нормализованному): лучшие по весу."""
+        if not prefix:
+            return []
+        ranks = self.dense.get(prefix)
+        if ranks is None:
+            lo = bisect.bisect_left(self.keys, prefix)
+            hi = bisect.bisect_left(self.keys, _next_prefix(prefix), lo)
+            ranks = np.unique(self.ranks[lo:hi])
+        return [
+            {"text": self.texts[rank], "kind": self.kinds[rank], "count": self.weights[rank]}
+            for rank in ranks[:limit].tolist()
+        ]
+
+    def suggest(self, query: str, limit: int = 10) -> Tuple[List[dict], int]:
+        """
+        Подсказки для набранного текста: сначала по всему тексту, затем по всё
+        более коротким хвостам (последним словам). Возвращает подсказки и
+        число последних слов запроса (по пробелам), которые они заменяют.
+        """
+        words = query.split()
+        for n in range(min(len(words), MAX_TAIL_WORDS), 0, -1):
+            result = self.lookup(normalize_label(" ".join(words[-n:])), limit)
+            if result:
+                return result, n
+        return [], 0
@@ -0,0 +1,64 @@
+"""
+Тематические теги кейсов: словарь и битовые множества.
+
+thematic_tags каждого кейса разбирается один раз при загрузке снимка:
+тег получает целочисленный код, для каждого кода хранится битовое
+множество кейсов (np.packbits, бит на кейс). Фильтр по тегам - OR или
+AND нескольких строк битов и проверка битов кандидатов, без разбора
+строк на каждый запрос.
+"""
+
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+TAG_MODES = ("any", "all")
+
+
+def tag_key(tag: str) -> str:
+    """Ключ тега в словаре: без регистра и крайних пробелов."""
+    return " ".join(tag.lower().split())
+
+
+class TagIndex:
+    """Словарь тегов (код -> название, число дел) и битовые множества кейсов."""
+
+    def __init__(self, case_tags: Sequence[Sequence[str]]):
+        self.total_cases = len(case_tags)
+        self.codes: Dict[str, int] = {}
+        self.names: List[str] = []
+        postings: List[List[int]] = []
+        for idx, tags in enumerate(case_tags):
+            for tag in tags:
+                key = tag_key(tag)
+                if not key:
+                    continue
+                code = self.codes.get(key)
+                if code is None:
+                    code = self.codes[key] = len(self.names)
+                    self.names.append(tag.strip())
+                    postings.append([])
+                if not postings[code] or postings[code][-1] != idx:
+                    postings[code].append(idx)
+
+        self.counts = np.array([len(ids) for ids in postings], dtype=np.int64)
+        self.bitsets = np.zeros((len(postings), (self.total_cases + 7) // 8), dtype=np.uint8)
+        for code, ids in enumerate(postings):
+            row = np.zeros(self.total_cases, dtype=bool)
+            row[ids] = True
+            self.bitsets[code] = np.packbits(row)
+
+    def mask(self, tags: Sequence[str], mode: str = "any") -> np.ndarray:
+        """Битовое множество кейсов с любым (any) или всеми (all) тегами."""
+        codes = [self.codes.get(tag_key(tag)) for tag in tags]
+        known = [code for code in codes if code is not None]
+        if not known or (mode == "all" and len(known) < len(codes)):
+            return np.zeros(self.bitsets.shape[1], dtype=np.uint8)
+        reduce = np.bitwise_and if mode == "all" else np.bitwise_or
+        return reduce.reduce(self.bitsets[known], axis=0)
+
+    @staticmethod
+    def contains(mask: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        """Входят ли кейсы ids в битовое множество mask (порядок битов np.packbits)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        return ((mask[ids >> 3] >> (7 - (ids & 7))) & 1).astype(bool)
@@ -0,0 +1,6 @@
+"""Модули backend импортируются в тестах напрямую (как в main.py)."""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
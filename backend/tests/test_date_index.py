@@ -0,0 +1,95 @@
+"""DateIndex: отрезки отсортированных дат против сравнения строк дат."""
+
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from date_index import DateIndex, format_day, parse_day
+
+
+@pytest.fixture(scope="module")
+def dates():
+    rng = random.Random(2)
+    start = date(2012, 1, 1)
+    values = []
+    for _ in range(300):
+        roll = rng.random()
+        if roll < 0.05:
+            values.append(None)
+        elif roll < 0.1:
+            values.append(rng.choice(["", "н/д", "2020", "2021-13-01"]))
+        else:
+            day = start + timedelta(days=rng.randint(0, 365 * 12))
+            # Часть дат - со временем, как в исходном CSV
+            values.append(day.isoformat() + (" 00:00:00" if rng.random() < 0.3 else ""))
+    # Повторы граничных дней
+    values += ["2016-03-01"] * 3 + ["2019-12-31"] * 2
+    return values
+
+
+@pytest.fixture(scope="module")
+def index(dates):
+    return DateIndex(dates)
+
+
+def expected_in_range(dates, date_from, date_to):
+    result = []
+    for value in dates:
+        day = parse_day(value)
+        if day is None:
+            result.append(False)
+            continue
+        iso = format_day(day)
+        result.append((date_from is None or iso >= date_from) and (date_to is None or iso <= date_to))
+    return np.array(result)
+
+
+@pytest.mark.parametrize("date_from,date_to", [
+    ("2016-03-01", "2019-12-31"),
+    ("2016-03-02", None),
+    (None, "2016-03-01"),
+    (None, None),
+    ("2019-12-31", "2019-12-31"),
+    ("2030-01-01", None),
+    ("2020-01-01", "2019-01-01"),
+])
+def test_in_range_matches_comparison(dates, index, date_from, date_to):
+    day_from = parse_day(date_from) if date_from else None
+    day_to = parse_day(date_to) if date_to else None
+    ids = np.arange(len(dates))
+    assert (index.in_range(ids, day_from, day_to) == expected_in_range(dates, date_from, date_to)).all()
+
+
+def test_span_counts_dated_cases(dates, index):
+    dated = sum(parse_day(value) is not None for value in dates)
+    assert index.dated == dated
+    assert index.span(None, None) == (0, dated)
+    lo, hi = index.span(parse_day("2019-12-31"), parse_day("2019-12-31"))
+    assert hi - lo == sum(parse_day(value) == parse_day("2019-12-31") for value in dates)
+    # Пустой диапазон - пустой отрезок, а не отрицательный
+    lo, hi = index.span(parse_day("2020-01-01"), parse_day("2019-01-01"))
+    assert lo == hi
+
+
+def test_order_sorts_by_day(index):
+    assert (np.diff(index.days[index.order].astype(np.int64)) >= 0).all()
+    assert (index.order[index.positions] == np.arange(len(index.days))).all()
+
+
+def test_in_years(dates, index):
+    ids = np.arange(len(dates))
+    years = [2016, 2020]
+    # Год - первые 4 символа document_date (строка "2020" без дня тоже относится к году)
+    expected = np.array([isinstance(v, str) and v[:4].isdigit() and int(v[:4]) in years for v in dates])
+    assert (index.in_years(ids, years) == expected).all()
+
+
+def test_parse_and_format_day():
+    assert parse_day("1970-01-01") == 0
+    assert parse_day(date(1970, 1, 2)) == 1
+    assert parse_day("2024-02-29T10:00:00") == parse_day("2024-02-29")
+    assert parse_day("2023-02-29") is None
+    assert parse_day(None) is None
+    assert format_day(parse_day("2024-02-29")) == "2024-02-29"
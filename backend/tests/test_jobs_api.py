@@ -0,0 +1,94 @@
+"""Проверка параметров POST /api/jobs (без запуска сервера и обработки заданий)."""
+
+import json
+import os
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+# main читает DATA_DIR при импорте; индекс в этих тестах не загружается
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="fas_test_data_"))
+
+import main  # noqa: E402
+from bulk_jobs import BulkJobStore  # noqa: E402
+
+TOKEN = "test-token"
+CSV = "text\nреклама пива\nскидка 90%\n".encode("utf-8")
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(main.Config, "ADMIN_TOKEN", TOKEN)
+    monkeypatch.setattr(main, "_bulk_store", BulkJobStore(tmp_path / "jobs.sqlite3"))
+    # Без контекстного менеджера: startup (загрузка данных, Gemini) не выполняется
+    return TestClient(main.app)
+
+
+def post_job(client, filters=None, token=TOKEN, data=CSV, **form):
+    if filters is not None:
+        form["filters"] = filters if isinstance(filters, str) else json.dumps(filters)
+    headers = {"X-Admin-Token": token} if token else {}
+    return client.post("/api/jobs", files={"file": ("ads.csv", data, "text/csv")}, data=form, headers=headers)
+
+
+def test_requires_admin_token(client, monkeypatch):
+    assert post_job(client, token=None).status_code == 403
+    assert post_job(client, token="wrong").status_code == 403
+    job_id = post_job(client).json()["id"]
+    assert client.get(f"/api/jobs/{job_id}").status_code == 403
+    assert client.get(f"/api/jobs/{job_id}", headers={"X-Admin-Token": TOKEN}).status_code == 200
+    monkeypatch.setattr(main.Config, "ADMIN_TOKEN", None)
+    assert post_job(client).status_code == 403
+
+
+def test_accepts_all_search_filters(client):
+    response = post_job(client, {
+        "year": [2023], "region": ["Москва"], "industry": ["Финансы"], "article": ["ст. 5"],
+        "tags": ["алкоголь", "финансы"], "tags_mode": "all",
+        "date_from": "2023-01-01", "date_to": "2023-12-31",
+    }, top_k="3")
+    assert response.status_code == 202, response.text
+    job = response.json()
+    assert job["total"] == 2
+    assert job["params"]["top_k"] == 3
+    # Фильтры сохраняются в том же виде, что у /api/search (request_filters)
+    assert job["params"]["filters"] == {
+        "year": [2023], "region": ["Москва"], "industry": ["Финансы"], "article": ["ст. 5"],
+        "tags": ["алкоголь", "финансы"], "tags_mode": "all",
+        "date_from": "2023-01-01", "date_to": "2023-12-31",
+    }
+
+
+def test_filter_fields_follow_search_request():
+    assert main.SEARCH_FILTER_FIELDS == {
+        "year", "region", "industry", "article", "tags", "tags_mode", "date_from", "date_to",
+    }
+
+
+@pytest.mark.parametrize("filters", [
+    {"bogus": [1]},
+    {"query": "подмена запроса"},
+    {"tags_mode": "some"},
+    {"date_from": "01.02.2023"},
+    {"year": ["не год"]},
+    "[2023]",
+    "{не json",
+])
+def test_rejects_invalid_filters(client, filters):
+    assert post_job(client, filters).status_code == 400
+
+
+def test_rejects_invalid_top_k_and_csv(client):
+    assert post_job(client, top_k="99").status_code == 400
+    assert post_job(client, data=b"").status_code == 400
+    assert post_job(client, data=b"a;b\n1;2\n").status_code == 400
+    assert post_job(client, data=CSV, column="нет").status_code == 400
+
+
+def test_admin_job_counts(client):
+    post_job(client)
+    headers = {"X-Admin-Token": TOKEN}
+    assert client.get("/api/admin/jobs").status_code == 403
+    counts = client.get("/api/admin/jobs", headers=headers).json()
+    assert counts["queued"] == 1 and sum(counts.values()) == 1
@@ -0,0 +1,120 @@
+"""KeywordIndex против прямого перебора текстов (прежний main.keyword_search)."""
+
+import errno
+import random
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import keyword_index
+from keyword_index import KeywordIndex
+
+FIELDS = ["violation_summary", "ad_description", "FAS_arguments"]
+WORDS = ["реклама", "Алкоголь", "скидка", "врач", "банк", "кредит", "ёлка", "sms", "№1", "лучший", "товар", "ООО"]
+
+
+def baseline_search(cases, fields, query, top_k):
+    """Перебор всех полей всех кейсов - эталон оценок."""
+    query_lower = query.lower()
+    query_words = set(re.findall(r'\b\w+\b', query_lower))
+    scores = []
+    for idx, case in enumerate(cases):
+        score = 0
+        for field in fields:
+            text_lower = (case.get(field, '') or '').lower()
+            if query_lower in text_lower:
+                score += 10
+            for word in query_words:
+                if len(word) > 3 and word in text_lower:
+                    score += 1
+        if score > 0:
+            scores.append((idx, score))
+    scores.sort(key=lambda x: x[1], reverse=True)
+    return scores[:top_k]
+
+
+def make_cases(n, seed=0):
+    rng = random.Random(seed)
+    cases = []
+    for _ in range(n):
+        case = {}
+        for field in FIELDS:
+            roll = rng.random()
+            if roll < 0.1:
+                continue
+            case[field] = None if roll < 0.15 else " ".join(rng.choices(WORDS, k=rng.randint(1, 8)))
+        cases.append(case)
+    return cases
+
+
+QUERIES = ["реклама алкоголь", "Скидка", "кредит банк лучший товар", "врач", "sms", "ёлка реклама", "нет такого", "ма ал"]
+
+
+@pytest.fixture(scope="module")
+def cases():
+    return make_cases(500)
+
+
+@pytest.fixture(scope="module")
+def index(cases):
+    return KeywordIndex(cases, FIELDS)
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_search_matches_baseline(cases, index, query):
+    assert index.search(query, 50) == baseline_search(cases, FIELDS, query, 50)
+
+
+def test_search_many_matches_single_queries(index):
+    assert index.search_many(QUERIES, 30) == [index.search(query, 30) for query in QUERIES]
+
+
+def test_term_across_field_boundary_is_not_a_match():
+    index = KeywordIndex([{"a": "абв", "b": "где"}], ["a", "b"])
+    assert index.search("вгд", 10) == []
+    assert index.search("где", 10) == [(0, 10)]
+
+
+def test_chunked_search_matches_sequential(cases, index):
+    with ThreadPoolExecutor(4) as executor:
+        assert index.search_many(QUERIES, 50, executor, 4) == index.search_many(QUERIES, 50)
+
+
+def test_process_pool_matches_sequential(cases, index):
+    with ProcessPoolExecutor(2) as executor:
+        assert index.search("реклама кредит", 50, executor, 3) == index.search("реклама кредит", 50)
+
+
+def test_directory_parameter(cases, tmp_path):
+    index = KeywordIndex(cases, FIELDS, str(tmp_path))
+    assert index.text_path.startswith(str(tmp_path))
+    assert index.search("банк", 20) == baseline_search(cases, FIELDS, "банк", 20)
+
+
+def test_falls_back_to_temp_dir_when_no_space(cases, tmp_path, monkeypatch):
+    full = tmp_path / "full"
+    full.mkdir()
+    save = np.save
+
+    def save_without_space(path, array):
+        if str(path).startswith(str(full)):
+            raise OSError(errno.ENOSPC, "No space left on device")
+        return save(path, array)
+
+    monkeypatch.setattr(keyword_index.np, "save", save_without_space)
+    index = KeywordIndex(cases, FIELDS, str(full))
+    assert not index.text_path.startswith(str(full))
+    # Недописанная директория удалена
+    assert list(full.iterdir()) == []
+    assert index.search("товар", 20) == baseline_search(cases, FIELDS, "товар", 20)
+
+
+def test_other_errors_are_raised(cases, tmp_path, monkeypatch):
+    def failing_save(path, array):
+        raise OSError(errno.EACCES, "Permission denied")
+
+    monkeypatch.setattr(keyword_index.np, "save", failing_save)
+    with pytest.raises(OSError):
+        KeywordIndex(cases, FIELDS, str(tmp_path))
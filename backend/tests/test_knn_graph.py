@@ -0,0 +1,79 @@
+"""Граф соседей: build_knn против перебора, update_knn против полного построения."""
+
+import numpy as np
+import pytest
+
+from knn_graph import MISSING, build_knn, update_knn
+
+K = 10
+
+
+def make_embeddings(n, dim=16, seed=3):
+    rng = np.random.RandomState(seed)
+    embeddings = rng.normal(size=(n, dim))
+    valid = rng.random_sample(n) > 0.1
+    embeddings[~valid] = 0
+    return embeddings, valid
+
+
+def brute_force(embeddings, valid, i, k):
+    """Соседи кейса i как в semantic_search с вектором кейса в роли запроса."""
+    scores = embeddings @ (embeddings[i] / np.linalg.norm(embeddings[i]))
+    scores = np.where(valid, scores, -np.inf)
+    scores[i] = -np.inf
+    top = np.argsort(-scores, kind="stable")[:k]
+    return top[np.isfinite(scores[top])]
+
+
+def assert_same_graph(ids, scores, expected_ids, expected_scores):
+    assert ids.shape == expected_ids.shape
+    # Оценки считаются в float32 разными блоками - сравнение с допуском
+    np.testing.assert_allclose(scores, expected_scores, atol=1e-5)
+    assert (ids == expected_ids).all()
+
+
+@pytest.mark.parametrize("block_rows", [1, 7, 1000])
+def test_build_matches_brute_force(block_rows):
+    embeddings, valid = make_embeddings(120)
+    ids, scores = build_knn(embeddings, valid, K, block_rows)
+    for i in range(len(embeddings)):
+        if not valid[i]:
+            assert (ids[i] == MISSING).all()
+            continue
+        expected = brute_force(embeddings, valid, i, K)
+        assert ids[i][:len(expected)].tolist() == expected.tolist()
+        assert i not in ids[i]
+
+
+def test_build_fills_missing_when_few_valid_rows():
+    embeddings, valid = make_embeddings(6)
+    valid[:] = [True, True, True, False, False, False]
+    ids, _ = build_knn(embeddings, valid, K, 4)
+    assert (ids[:3, 2:] == MISSING).all()
+    assert (ids[3:] == MISSING).all()
+
+
+@pytest.mark.parametrize("block_rows", [5, 1000])
+def test_update_appended_rows_matches_build(block_rows):
+    embeddings, valid = make_embeddings(150)
+    old_ids, old_scores = build_knn(embeddings[:100], valid[:100], K, block_rows)
+    ids, scores = update_knn(embeddings, valid, old_ids, old_scores, [], K, block_rows)
+    assert_same_graph(ids, scores, *build_knn(embeddings, valid, K, block_rows))
+
+
+def test_update_rows_that_gained_embeddings_matches_build():
+    embeddings, valid = make_embeddings(150)
+    # Строки, у которых при прошлом запуске не было эмбеддинга, и дописанные строки
+    gained = np.flatnonzero(valid[:100])[::9]
+    old_valid = valid[:100].copy()
+    old_valid[gained] = False
+    old_ids, old_scores = build_knn(embeddings[:100], old_valid, K, 16)
+    ids, scores = update_knn(embeddings, valid, old_ids, old_scores, gained, K, 16)
+    assert_same_graph(ids, scores, *build_knn(embeddings, valid, K, 16))
+
+
+def test_update_without_changes_keeps_graph():
+    embeddings, valid = make_embeddings(50)
+    old_ids, old_scores = build_knn(embeddings, valid, K, 16)
+    ids, scores = update_knn(embeddings, valid, old_ids, old_scores, [], K, 16)
+    assert (ids == old_ids).all() and (scores == old_scores).all()
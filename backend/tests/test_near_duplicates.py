@@ -0,0 +1,70 @@
+"""Кластеры почти одинаковых решений (MinHash + LSH) и схлопывание выдачи."""
+
+import random
+
+import numpy as np
+
+from near_duplicates import DuplicateClusterer, collapse_duplicates, minhash
+
+WORDS = ("реклама алкоголь скидка кредит банк пиво магазин акция товар услуга "
+         "потребитель нарушение закон управление распространение сайт").split()
+
+
+def random_text(rng, length=60):
+    return " ".join(rng.choice(WORDS) + str(rng.randint(0, 999)) for _ in range(length))
+
+
+def cluster(texts, threshold=0.8):
+    clusterer = DuplicateClusterer(threshold)
+    # Подписи накапливаются по частям выгрузки
+    clusterer.add(texts[:len(texts) // 2])
+    clusterer.add(texts[len(texts) // 2:])
+    return clusterer.clusters()
+
+
+def test_minhash_is_reproducible_and_case_insensitive():
+    text = "Реклама пива без предупреждения о вреде"
+    assert np.array_equal(minhash(text), minhash(text.upper()))
+    assert minhash(text).dtype == np.uint32
+    assert minhash("  ... ") is None
+
+
+def test_near_duplicates_share_cluster():
+    rng = random.Random(7)
+    base = [random_text(rng) for _ in range(20)]
+    # Копия с дописанной в конце фразой и копия в другом регистре
+    texts = base + [base[3] + " красноярское управление", base[11].upper()]
+    clusters = cluster(texts)
+    assert clusters.dtype == np.int32
+    assert clusters[20] == 3
+    assert clusters[21] == 11
+    # Остальные кейсы - одиночные: номер кластера равен своей строке
+    singles = [row for row in range(20) if row not in (3, 11)]
+    assert clusters[singles].tolist() == singles
+    assert clusters[3] == 3 and clusters[11] == 11
+
+
+def test_cluster_number_is_smallest_row():
+    rng = random.Random(3)
+    text = random_text(rng)
+    texts = [random_text(rng), text, random_text(rng), text, text]
+    assert cluster(texts).tolist() == [0, 1, 2, 1, 1]
+
+
+def test_threshold_and_empty_texts():
+    rng = random.Random(5)
+    words = random_text(rng, 40).split()
+    close = " ".join(words[:-2] + random_text(rng, 2).split())
+    texts = [" ".join(words), close, "", "", "!!!"]
+    # Общих шинглов около 90%: ниже порога 0.99, выше 0.6
+    assert cluster(texts, threshold=0.99).tolist() == [0, 1, 2, 3, 4]
+    # Тексты без слов не объединяются ни с кем
+    assert cluster(texts, threshold=0.6).tolist() == [0, 0, 2, 3, 4]
+
+
+def test_collapse_duplicates_keeps_best_of_cluster():
+    clusters = {0: 0, 1: 1, 2: 0, 3: 3, 4: 1}
+    results = [{"index": index, "score": 1 - index / 10} for index in (2, 1, 0, 4, 3)]
+    collapsed = collapse_duplicates(results, clusters.__getitem__)
+    assert [result["index"] for result in collapsed] == [2, 1, 3]
+    assert collapse_duplicates([], clusters.__getitem__) == []
@@ -0,0 +1,77 @@
+"""Ключ кэша результатов и его сброс при смене версии данных."""
+
+from search_cache import SearchResultCache, make_cache_key
+
+RANKING = {"weights": {"FAS_arguments": 1.0}, "rrf_k": 60}
+
+
+def key(filters=None, query="реклама пива", version="v1", **kwargs):
+    return make_cache_key(query, filters or {}, 10, RANKING, version, **kwargs)
+
+
+def test_list_filters_are_order_insensitive():
+    assert key({"region": ["Москва", "Казань"]}) == key({"region": ["Казань", "Москва", "Москва"]})
+    assert key({"year": [2023], "region": ["Москва"]}) == key({"region": ["Москва"], "year": [2023]})
+    assert key({"region": ["Москва"]}) != key({"region": ["Казань"]})
+
+
+def test_scalar_filters_are_kept_as_is():
+    tags = {"tags": ["алкоголь", "финансы"]}
+    assert key({**tags, "tags_mode": "all"}) != key(tags)
+    assert key({"date_from": "2023-01-01"}) != key({"date_from": "2023-01-02"})
+    assert key({"date_from": "2023-01-01"}) != key({"date_to": "2023-01-01"})
+    # Пустые фильтры не влияют на ключ
+    assert key({"region": [], "date_from": None}) == key()
+
+
+def test_query_whitespace_and_options():
+    assert key(query="  реклама   пива ") == key()
+    assert key(query="Реклама пива") != key()
+    assert key(collapse_duplicates=True) != key()
+
+
+def test_key_depends_on_data_version():
+    assert key(version="v1") != key(version="v2")
+
+
+def test_local_level_is_reset_on_new_version():
+    cache = SearchResultCache(max_size=2)
+    cache.set_data_version("v1")
+    hits = [(3, 0.9, {"FAS_arguments": 0.9})]
+    cache.put(key(), hits)
+    assert cache.get(key()) == hits
+    # Та же версия - кэш сохраняется
+    cache.set_data_version("v1")
+    assert cache.get(key()) == hits
+    cache.set_data_version("v2")
+    assert cache.get(key()) is None
+    assert cache.stats()["data_version"] == "v2"
+
+
+def test_local_level_evicts_least_recent():
+    cache = SearchResultCache(max_size=2)
+    cache.set_data_version("v1")
+    for query in ("a", "b"):
+        cache.put(key(query=query), [(0, 1.0, {})])
+    cache.get(key(query="a"))
+    cache.put(key(query="c"), [(0, 1.0, {})])
+    assert cache.get(key(query="b")) is None
+    assert cache.get(key(query="a")) is not None
+
+
+def test_shared_level_drops_other_versions(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    writer = SearchResultCache(max_size=0, shared_path=path)
+    writer.set_data_version("v1")
+    hits = [(1, 0.5, {"FAS_arguments": 0.5})]
+    writer.put(key(), hits)
+
+    reader = SearchResultCache(max_size=4, shared_path=path)
+    reader.set_data_version("v1")
+    assert reader.get(key()) == hits
+    assert reader.stats()["shared_hits"] == 1
+
+    # Воркер с новой версией удаляет из общего уровня записи старой
+    SearchResultCache(max_size=0, shared_path=path).set_data_version("v2")
+    reader.clear()
+    assert reader.get(key()) is None
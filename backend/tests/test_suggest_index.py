@@ -0,0 +1,82 @@
+"""SuggestIndex: подсказки по префиксу против перебора всех подписей."""
+
+import random
+
+import pytest
+
+from suggest_index import DENSE_RANGE, MAX_SUGGESTIONS, SuggestIndex, normalize_label
+
+LABELS = [
+    ('ООО "Строительство"', "respondent", 3),
+    ("Строительство / Ремонт", "industry", 7),
+    ("ст. 5 ч. 3 п. 1", "article", 12),
+    ("Реклама алкоголя", "violation_type", 40),
+    ("реклама алкоголя", "tag", 5),
+    ("Ёлочные игрушки", "tag", 2),
+    ("   ", "tag", 100),
+]
+
+
+def expected(labels, prefix, limit):
+    """Перебор: подписи, у которых с prefix начинается хвост с любого слова."""
+    merged = {}
+    for text, kind, weight in labels:
+        text = text.strip()
+        if normalize_label(text):
+            merged[(text, kind)] = merged.get((text, kind), 0) + weight
+    ordered = sorted(merged.items(), key=lambda item: (-item[1], item[0][0], item[0][1]))
+    found = []
+    for (text, kind), weight in ordered:
+        words = normalize_label(text).split()
+        if any(" ".join(words[i:]).startswith(prefix) for i in range(len(words))):
+            found.append({"text": text, "kind": kind, "count": weight})
+    return found[:limit]
+
+
+@pytest.fixture(scope="module")
+def index():
+    return SuggestIndex(LABELS)
+
+
+def test_prefix_matches_any_word(index):
+    texts = [s["text"] for s in index.lookup("строит")]
+    # По убыванию веса; префикс совпадает и с первым, и со вторым словом
+    assert texts == ["Строительство / Ремонт", 'ООО "Строительство"']
+    assert [s["text"] for s in index.lookup("ремонт")] == ["Строительство / Ремонт"]
+    assert index.lookup("") == []
+    assert index.lookup("нет такого") == []
+
+
+def test_normalization_and_duplicates(index):
+    assert [s["text"] for s in index.lookup(normalize_label("ЕЛОЧ"))] == ["Ёлочные игрушки"]
+    # Одинаковый текст разных видов - разные подсказки
+    assert [(s["kind"], s["count"]) for s in index.lookup("реклама")] == [("violation_type", 40), ("tag", 5)]
+    assert [s["text"] for s in index.lookup("5 ч 3")] == ["ст. 5 ч. 3 п. 1"]
+    assert index.lookup("реклама", limit=1)[0]["count"] == 40
+
+
+def test_dense_ranges_match_bruteforce():
+    rng = random.Random(4)
+    words = ["реклама", "ремонт", "рекламодатель", "ресторан", "рента", "банк", "бар"]
+    labels = [
+        (f"{rng.choice(words)} {rng.choice(words)} {i}", rng.choice(["tag", "industry"]), rng.randint(1, 50))
+        for i in range(DENSE_RANGE * 4)
+    ]
+    index = SuggestIndex(labels)
+    # Короткие префиксы покрывают больше DENSE_RANGE ключей - ответ вычислен заранее
+    assert "р" in index.dense and "ре" in index.dense
+    for prefix in ("р", "ре", "рек", "реклама р", "б", "ба", "бар б", "1", "10"):
+        for limit in (1, 10, MAX_SUGGESTIONS):
+            assert index.lookup(prefix, limit) == expected(labels, prefix, limit), prefix
+
+
+def test_suggest_replaces_tail_words(index):
+    suggestions, replaced = index.suggest("нарушение: реклама алк")
+    assert replaced == 2
+    assert [s["text"] for s in suggestions] == ["Реклама алкоголя", "реклама алкоголя"]
+    # Целиком запрос не находится - подсказка по последнему слову
+    suggestions, replaced = index.suggest("ремонт кровли строит")
+    assert replaced == 1
+    assert suggestions[0]["text"] == "Строительство / Ремонт"
+    assert index.suggest("") == ([], 0)
+    assert index.suggest("кровли") == ([], 0)
@@ -0,0 +1,62 @@
+"""TagIndex: битовые множества против проверки тегов по спискам."""
+
+import random
+
+import numpy as np
+import pytest
+
+from tag_index import TagIndex, tag_key
+
+TAGS = ["алкоголь", "Финансы", "медицина", "СМС", "недостоверность", "сравнение"]
+
+
+@pytest.fixture(scope="module")
+def case_tags():
+    rng = random.Random(1)
+    # Число кейсов не кратно 8 - последний байт битового множества неполный
+    return [rng.sample(TAGS, rng.randint(0, 3)) for _ in range(203)]
+
+
+@pytest.fixture(scope="module")
+def index(case_tags):
+    return TagIndex(case_tags)
+
+
+def expected(case_tags, tags, mode):
+    keys = {tag_key(tag) for tag in tags}
+    result = []
+    for own in case_tags:
+        own_keys = {tag_key(tag) for tag in own}
+        result.append(keys <= own_keys if mode == "all" else bool(keys & own_keys))
+    return np.array(result)
+
+
+@pytest.mark.parametrize("mode", ["any", "all"])
+@pytest.mark.parametrize("tags", [["алкоголь"], ["финансы", "СМС"], ["Медицина", "сравнение", "алкоголь"]])
+def test_mask_matches_lists(case_tags, index, tags, mode):
+    mask = index.mask(tags, mode)
+    ids = np.arange(len(case_tags))
+    assert (TagIndex.contains(mask, ids) == expected(case_tags, tags, mode)).all()
+
+
+def test_contains_subset_of_ids(case_tags, index):
+    mask = index.mask(["недостоверность"])
+    ids = np.array([202, 0, 17, 8, 7, 201])
+    assert (TagIndex.contains(mask, ids) == expected(case_tags, ["недостоверность"], "any")[ids]).all()
+
+
+def test_unknown_tags(index):
+    ids = np.arange(index.total_cases)
+    assert not TagIndex.contains(index.mask(["нет такого"]), ids).any()
+    # any - неизвестный тег не мешает известным; all - ни один кейс не подходит
+    assert (TagIndex.contains(index.mask(["алкоголь", "нет такого"]), ids)
+            == TagIndex.contains(index.mask(["алкоголь"]), ids)).all()
+    assert not TagIndex.contains(index.mask(["алкоголь", "нет такого"], "all"), ids).any()
+
+
+def test_vocabulary_and_counts():
+    index = TagIndex([["Алкоголь", " алкоголь "], ["АЛКОГОЛЬ", "СМС"], [], ["", "  "]])
+    assert index.names == ["Алкоголь", "СМС"]
+    # Повтор тега в одном кейсе считается один раз
+    assert index.counts.tolist() == [2, 1]
+    assert TagIndex.contains(index.mask(["алкоголь"]), np.arange(4)).tolist() == [True, True, False, False]
@@ -0,0 +1,78 @@
+"""
+Тексты поля на диске (для prepare_data.py).
+
+Тексты пишутся по частям CSV подряд в файл <имя>.txt (UTF-8), смещения
+строк - в <имя>.offsets (int64). Готовая колонка читается как
+последовательность строк через отображение файлов в память: в памяти
+процесса только тексты, которые читаются сейчас, а не вся колонка.
+"""
+
+import mmap
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Iterable, Iterator, List
+
+import numpy as np
+
+# Строк за одно чтение при последовательном обходе
+_ITER_CHUNK = 4096
+
+
+class TextColumnWriter:
+    """Дописывание текстов колонки; close() возвращает колонку для чтения."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._data = open(path.with_suffix(".txt"), "wb")
+        self._offsets = open(path.with_suffix(".offsets"), "wb")
+        self._position = 0
+        self._offsets.write(np.zeros(1, dtype=np.int64).tobytes())
+
+    def extend(self, texts: Iterable[str]):
+        encoded = [text.encode("utf-8") for text in texts]
+        if not encoded:
+            return
+        self._data.write(b"".join(encoded))
+        ends = self._position + np.cumsum([len(chunk) for chunk in encoded], dtype=np.int64)
+        self._offsets.write(ends.tobytes())
+        self._position = int(ends[-1])
+
+    def close(self) -> "TextColumn":
+        self._data.close()
+        self._offsets.close()
+        return TextColumn(self.path)
+
+
+class TextColumn(Sequence):
+    """Колонка текстов, записанная TextColumnWriter (только чтение)."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._offsets = np.memmap(path.with_suffix(".offsets"), dtype=np.int64, mode="r")
+        with open(path.with_suffix(".txt"), "rb") as f:
+            # mmap пустого файла невозможен - колонка из пустых строк
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self._offsets[-1] else b""
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def _text(self, row: int) -> str:
+        return self._data[int(self._offsets[row]):int(self._offsets[row + 1])].decode("utf-8")
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._text(row) for row in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._text(index)
+
+    def __iter__(self) -> Iterator[str]:
+        for start in range(0, len(self), _ITER_CHUNK):
+            yield from self[start:start + _ITER_CHUNK]
+
+    def take(self, rows: Sequence[int]) -> List[str]:
+        """Тексты строк rows."""
+        return [self._text(int(row)) for row in rows]
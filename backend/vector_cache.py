@@ -0,0 +1,80 @@
+"""
+Кэш векторов эмбеддингов с адресацией по содержимому.
+
+Ключ - sha256 от модели, размерности, типа задачи и нормализованного
+текста, поэтому один и тот же текст (в любой строке и любом поле, в любом
+запуске prepare_data.py) запрашивается у Gemini один раз. Смена модели
+или размерности автоматически даёт другие ключи.
+
+Хранится в SQLite-файле в DATA_DIR.
+"""
+
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable
+
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    """Нормализовать текст перед эмбеддингом: схлопнуть пробелы и переносы."""
+    return ' '.join(text.split()) if text else ''
+
+
+class VectorCache:
+    """Постоянный кэш векторов {ключ содержимого: вектор}."""
+
+    # Ограничение SQLite на число параметров в запросе
+    _LOOKUP_BATCH = 500
+
+    def __init__(self, path: Path, model: str, dimension: int):
+        self.path = path
+        self.model = model
+        self.dimension = dimension
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL)"
+        )
+
+    def key(self, text: str, task: str) -> str:
+        """Ключ для уже нормализованного текста."""
+        raw = f"{self.model}:{self.dimension}:{task}:{text}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Найти векторы по ключам; отсутствующие ключи в результат не входят."""
+        keys = list(keys)
+        found = {}
+        for start in range(0, len(keys), self._LOOKUP_BATCH):
+            chunk = keys[start:start + self._LOOKUP_BATCH]
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM vectors WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk
+            ).fetchall()
+            for key, blob in rows:
+                vector = np.frombuffer(blob, dtype=np.float64)
+                if vector.shape == (self.dimension,):
+                    found[key] = vector
+        return found
+
+    def put_many(self, vectors: Dict[str, np.ndarray]):
+        """Сохранить векторы одной транзакцией."""
+        if not vectors:
+            return
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vectors (key, vector) VALUES (?, ?)",
+                ((key, np.asarray(vector, dtype=np.float64).tobytes()) for key, vector in vectors.items())
+            )
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
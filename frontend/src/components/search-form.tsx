@@ -1,19 +1,75 @@
 "use client";
 
-import { useState } from "react";
+import { useEffect, useState } from "react";
 import { Input } from "@/components/ui/input";
 import { Button } from "@/components/ui/button";
+import { getSuggestions, SuggestResponse } from "@/lib/api";
 
 interface SearchFormProps {
   onSearch: (query: string) => void;
   isLoading: boolean;
 }
 
+// Подсказка заменяет не больше стольких последних слов запроса (MAX_TAIL_WORDS на сервере);
+// /api/suggest принимает не больше SUGGEST_MAX_LENGTH символов
+const SUGGEST_TAIL_WORDS = 6;
+const SUGGEST_MAX_LENGTH = 200;
+
+// Последние слова запроса - по ним сервер ищет подсказки
+function suggestText(query: string): string {
+  const tail = query.trim().split(/\s+/).slice(-SUGGEST_TAIL_WORDS).join(" ");
+  return tail.slice(-SUGGEST_MAX_LENGTH).trim();
+}
+
+// Подписи видов подсказок
+const suggestionKinds: Record<string, string> = {
+  tag: "тема",
+  violation_type: "нарушение",
+  article: "статья",
+  industry: "отрасль",
+  defendant: "ответчик",
+};
+
 export function SearchForm({ onSearch, isLoading }: SearchFormProps) {
   const [query, setQuery] = useState("");
+  const [suggest, setSuggest] = useState<SuggestResponse | null>(null);
+  const [showSuggestions, setShowSuggestions] = useState(false);
+
+  // Подсказки запрашиваются с небольшой задержкой после ввода;
+  // ответ на устаревший текст отменяется, подсказки прежнего текста
+  // сбрасываются сразу (replace_words относится к тексту, для которого они получены)
+  useEffect(() => {
+    setSuggest(null);
+    const text = suggestText(query);
+    if (!text) {
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(() => {
+      getSuggestions(text, 8, controller.signal)
+        .then(setSuggest)
+        .catch(() => {
+          if (!controller.signal.aborted) {
+            setSuggest(null);
+          }
+        });
+    }, 150);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [query]);
+
+  const applySuggestion = (text: string) => {
+    const words = query.trim().split(/\s+/);
+    const kept = words.slice(0, words.length - (suggest?.replace_words ?? 0));
+    setQuery([...kept, text].join(" ") + " ");
+    setShowSuggestions(false);
+  };
 
   const handleSubmit = (e: React.FormEvent) => {
     e.preventDefault();
+    setShowSuggestions(false);
     if (query.trim() && query.trim().split(/\s+/).length >= 3) {
       onSearch(query.trim());
     }
@@ -39,14 +95,43 @@ export function SearchForm({ onSearch, isLoading }: SearchFormProps) {
   return (
     <div className="w-full space-y-4">
       <form onSubmit={handleSubmit} className="flex gap-2">
-        <Input
-          type="text"
-          placeholder="Опишите ситуацию или вставьте текст рекламы. Например: «товар №1 в России» или «использование образа врача»"
-          value={query}
-          onChange={(e) => setQuery(e.target.value)}
-          className="flex-1 text-base h-12"
-          disabled={isLoading}
-        />
+        <div className="relative flex-1">
+          <Input
+            type="text"
+            placeholder="Опишите ситуацию или вставьте текст рекламы. Например: «товар №1 в России» или «использование образа врача»"
+            value={query}
+            onChange={(e) => {
+              setQuery(e.target.value);
+              setShowSuggestions(true);
+            }}
+            onBlur={() => setShowSuggestions(false)}
+            onKeyDown={(e) => e.key === "Escape" && setShowSuggestions(false)}
+            className="text-base h-12"
+            disabled={isLoading}
+          />
+          {showSuggestions && suggest && suggest.suggestions.length > 0 && (
+            <ul className="absolute z-10 mt-1 w-full rounded-md border bg-background shadow-md">
+              {suggest.suggestions.map((item) => (
+                <li key={`${item.kind}:${item.text}`}>
+                  <button
+                    type="button"
+                    onMouseDown={(e) => {
+                      // mousedown срабатывает раньше blur поля ввода
+                      e.preventDefault();
+                      applySuggestion(item.text);
+                    }}
+                    className="flex w-full items-center justify-between gap-2 px-3 py-2 text-left text-sm hover:bg-muted"
+                  >
+                    <span className="truncate">{item.text}</span>
+                    <span className="shrink-0 text-xs text-muted-foreground">
+                      {suggestionKinds[item.kind] ?? item.kind} · {item.count}
+                    </span>
+                  </button>
+                </li>
+              ))}
+            </ul>
+          )}
+        </div>
         <Button 
           type="submit" 
           disabled={isLoading || !query.trim() || query.trim().split(/\s+/).length < 3}
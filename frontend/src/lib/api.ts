@@ -50,6 +50,21 @@ export interface FilterOptions {
   article_groups?: { name: string; count: number; parts: { name: string; count: number }[] }[];
   region_groups: { name: string; count: number; regions: string[] }[];
   articles: string[];
+  tags?: { name: string; count: number }[];
+  date_min?: string | null;
+  date_max?: string | null;
+}
+
+export interface Suggestion {
+  text: string;
+  kind: 'tag' | 'violation_type' | 'article' | 'industry' | 'defendant';
+  count: number;
+}
+
+export interface SuggestResponse {
+  query: string;
+  replace_words: number;
+  suggestions: Suggestion[];
 }
 
 const API_BASE = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
@@ -62,6 +77,10 @@ export async function searchCases(
     region?: string[];
     industry?: string[];
     article?: string[];
+    tags?: string[];
+    tags_mode?: 'any' | 'all';
+    date_from?: string;
+    date_to?: string;
   }
 ): Promise<SearchResponse> {
   const response = await fetch(`${API_BASE}/api/search`, {
@@ -96,3 +115,16 @@ export async function getFilterOptions(): Promise<FilterOptions> {
   }
   return response.json();
 }
+
+export async function getSuggestions(
+  query: string,
+  limit: number = 8,
+  signal?: AbortSignal
+): Promise<SuggestResponse> {
+  const params = new URLSearchParams({ q: query, limit: String(limit) });
+  const response = await fetch(`${API_BASE}/api/suggest?${params}`, { signal });
+  if (!response.ok) {
+    throw new Error('Ошибка загрузки подсказок');
+  }
+  return response.json();
+}